@@ -1,11 +1,99 @@
+import collections
 import numpy as np
 import cv2
 import os
 import imutils
 
+# batch_multi_lines reproduces the fixed point cv2.warpAffine of OpenCV 3 and
+# 4, checked on 3.4 to 4.11; OpenCV 5 interpolates in floating point, so
+# outside of those versions the lines are drawn and rotated one by one
+_CV2_VERSION = tuple(int(part) for part in cv2.__version__.split('.')[:2])
+FIXED_POINT_WARP = (3, 4) <= _CV2_VERSION <= (4, 11)
+
+
+def quantize_params(adversary_params, decimals=6):
+    """
+    Returns a copy of adversary_params (possibly nested dictionaries, tuples
+    and numbers) where numpy scalars are converted to python numbers and
+    floats are rounded to the given number of decimals. Patterns are always
+    drawn from the quantized parameters, so equal quantized parameters
+    always give the same pattern.
+    """
+    if isinstance(adversary_params, dict):
+        return {quantize_params(key, decimals): quantize_params(value, decimals)
+                for key, value in adversary_params.items()}
+    if isinstance(adversary_params, (list, tuple, np.ndarray)):
+        return tuple(quantize_params(value, decimals) for value in adversary_params)
+    if isinstance(adversary_params, (bool, np.bool_)):
+        return bool(adversary_params)
+    if isinstance(adversary_params, (int, np.integer)):
+        return int(adversary_params)
+    if isinstance(adversary_params, (float, np.floating)):
+        return round(float(adversary_params), decimals)
+    return adversary_params
+
+
+def params_key(adversary_params):
+    """
+    Returns a hashable key for (quantized) adversary_params, where
+    dictionaries are compared regardless of their insertion order.
+    """
+    if isinstance(adversary_params, dict):
+        return tuple(sorted(((key, params_key(value)) for key, value in adversary_params.items()),
+                            key=lambda item: repr(item[0])))
+    if isinstance(adversary_params, (list, tuple)):
+        return tuple(params_key(value) for value in adversary_params)
+    return adversary_params
+
+
+class PatternCache(object):
+    def __init__(self, max_entries=256):
+        """
+        Least recently used cache from a pattern key (see 'params_key') to
+        the rendered canvas and its png encoding, holding at most max_entries
+        patterns. hits and misses count the lookups.
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Returns the (canvas, png) stored for key, or None.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries[key] = entry
+        return entry
+
+    def put(self, key, canvas, png):
+        if self.max_entries <= 0:
+            return
+        canvas = canvas.copy()
+        canvas.flags.writeable = False
+        self._entries.pop(key, None)
+        self._entries[key] = (canvas, png)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._entries), 'max_entries': self.max_entries}
+
+
 class AdversaryGenerator:
     def __init__(self, city_name, sizeX=200, sizeY=200, transparency=True,
-                path='adversary/', record=False):
+                path='adversary/', record=False, server=None, cache_size=256):
         """
         Library containing different shapes, along with the ability
         to create .png images with the shapes.
@@ -17,6 +105,10 @@ class AdversaryGenerator:
         WIDTH_RANGE = (0, 50)
         LENGTH_RANGE = (0, 200)
         COLOR_TUPLE_RANGE = (0, 255)
+        If server (an AdversaryServer) is given, the adversary is published to
+        it in memory instead of being written to the png file.
+        The last cache_size rendered patterns are kept, with their png
+        encoding, in self.cache so repeated attacks skip drawing and encoding.
         """
         self.city_name = city_name
         self.sizeX = sizeX
@@ -29,6 +121,8 @@ class AdversaryGenerator:
 
         self.path = path
         self.record = record
+        self.server = server
+        self.cache = PatternCache(cache_size)
         self.counter = 0
 
         if self.record:
@@ -47,19 +141,56 @@ class AdversaryGenerator:
         """
         self.canvas = np.zeros((self.sizeX, self.sizeY, self.channels), dtype=np.uint8)
 
-    def draw_image(self):
+    def encode_canvas(self):
+        """
+        Returns the canvas encoded as png bytes.
+        """
+        success, png = cv2.imencode('.png', self.canvas)
+        if not success:
+            raise RuntimeError('failed to encode the adversary canvas')
+        return png.tobytes()
+
+    def draw_image(self, png=None):
         """
-        Writes the canvas to a png file.
+        Writes the canvas to a png file, or publishes it to the adversary
+        server when there is one. png is the already encoded canvas, if known.
         Uncomment below code to save patterns at every 'draw_image' call in a
         separate directory
         """
+        if png is None:
+            png = self.encode_canvas()
         if self.record:
             if self.counter == 0:
-                cv2.imwrite("{}adversaries/baseline.png".format(self.path, self.counter), self.canvas)
+                self._write_png("{}adversaries/baseline.png".format(self.path, self.counter), png)
             else:
-                cv2.imwrite("{}adversaries/adversary_{:04}.png".format(self.path, self.counter), self.canvas)
+                self._write_png("{}adversaries/adversary_{:04}.png".format(self.path, self.counter), png)
             self.counter += 1
-        cv2.imwrite("{}{}".format(self.path, self.image_label), self.canvas)
+        if self.server is not None:
+            self.server.publish("{}{}".format(self.path, self.image_label), self.canvas, png=png)
+        else:
+            self._write_png("{}{}".format(self.path, self.image_label), png)
+
+    def _write_png(self, filename, png):
+        with open(filename, 'wb') as png_file:
+            png_file.write(png)
+
+    def _draw_cached(self, key):
+        """
+        Draws the pattern stored under key, if it was rendered before.
+        Returns whether it was.
+        """
+        entry = self.cache.get(key)
+        if entry is None:
+            return False
+        canvas, png = entry
+        self.canvas = canvas.copy()
+        self.draw_image(png)
+        return True
+
+    def _draw_and_cache(self, key):
+        png = self.encode_canvas()
+        self.cache.put(key, self.canvas, png)
+        self.draw_image(png)
 
     def lines_adversary(self, adversary_params):
         """
@@ -71,6 +202,11 @@ class AdversaryGenerator:
                     'color': (0, 0, 0, 255) -> int tuple (0->255)
                     }
         """
+        adversary_params = quantize_params(adversary_params)
+        key = ('lines_adversary', params_key(adversary_params))
+        if self._draw_cached(key):
+            return
+
         self.clear_canvas()
 
         pos = adversary_params['pos']
@@ -81,7 +217,7 @@ class AdversaryGenerator:
         cv2.rectangle(self.canvas, (pos, 0),
                         (pos + width, self.sizeY), color, -1)
         self.canvas = imutils.rotate(self.canvas, angle=rot)
-        self.draw_image()
+        self._draw_and_cache(key)
         # cv2.imwrite("{}{}".format(self.path, self.image_label), self.canvas)
 
     def multi_lines(self, adversary_params):
@@ -106,24 +242,168 @@ class AdversaryGenerator:
                     'color': (0, 255, 0, 255)
                 }
             }
+        Patterns are drawn from the quantized parameters (see
+        'quantize_params') and cached, so the same attack is only drawn and
+        encoded once.
         """
+        adversary_params = quantize_params(adversary_params)
+        key = ('multi_lines', params_key(adversary_params))
+        if self._draw_cached(key):
+            return
+
         self.clear_canvas()
 
         for line_id in sorted(adversary_params.keys()):
-            overlay = np.zeros((self.sizeX, self.sizeY, self.channels), dtype=np.uint8)
             pos = adversary_params[line_id]['pos']
             rot = adversary_params[line_id]['rot']
             width = adversary_params[line_id]['width']
             length = adversary_params[line_id]['length']
             color = adversary_params[line_id]['color']
-            cv2.rectangle(overlay, (pos, 0),
-                            (pos + width, length), color, -1)
-            overlay = imutils.rotate(overlay, angle=rot)
-            overlay_pos = (0, 0)
-            self.canvas = self.overlay_image_alpha(self.canvas, overlay, 0, 0)
-        self.draw_image()
+            self.canvas = self._draw_line(self.canvas, pos, rot, width, length, color)
+        self._draw_and_cache(key)
         # cv2.imwrite("{}{}".format(self.path, self.image_label), self.canvas)
 
+    def _draw_line(self, canvas, pos, rot, width, length, color):
+        """
+        Draws a line of 'multi_lines' over canvas and returns it.
+        """
+        overlay = np.zeros((self.sizeX, self.sizeY, self.channels), dtype=np.uint8)
+        cv2.rectangle(overlay, (pos, 0),
+                        (pos + width, length), color, -1)
+        overlay = imutils.rotate(overlay, angle=rot)
+        return self.overlay_image_alpha(canvas, overlay, 0, 0)
+
+    def batch_multi_lines(self, lines, chunk_size=16):
+        """
+        Rasterizes N candidate multi-line patterns at once, without touching
+        the canvas or writing any png. Gives the same patterns as calling
+        'multi_lines' on each candidate, but every line is rasterized
+        directly in its rotated frame instead of drawing a full overlay and
+        rotating it (only with OpenCV 3.4 to 4.11, see FIXED_POINT_WARP).
+        lines is an array of shape (N, L, 8) (or (L, 8) for a single
+        candidate) where each row is:
+            [pos, rot, width, length, color0, color1, color2, color3]
+        with lines drawn in increasing L order, like the sorted keys of the
+        adversary_params dictionary. Use 'lines_to_array' to convert
+        adversary_params dictionaries into this format.
+        Returns a uint8 array of shape (N, sizeX, sizeY, 4).
+        """
+        if self.channels != 4:
+            raise ValueError('batch_multi_lines requires a transparent (4 channel) canvas')
+
+        lines = np.asarray(lines, dtype=np.float64)
+        if lines.ndim == 2:
+            lines = lines[np.newaxis]
+        if lines.ndim != 3 or lines.shape[2] != 8:
+            raise ValueError('lines must have shape (N, L, 8), got {}'.format(lines.shape))
+        # drawn from the quantized parameters, as 'multi_lines' does
+        lines = np.array(quantize_params(lines.tolist()), dtype=np.float64).reshape(lines.shape)
+
+        canvases = np.zeros((lines.shape[0], self.sizeX, self.sizeY, self.channels),
+                            dtype=np.uint8)
+        if not FIXED_POINT_WARP:
+            for canvas, candidate in zip(canvases, lines):
+                for pos, rot, width, length, *color in candidate:
+                    self._draw_line(canvas, int(pos), rot, int(width), int(length),
+                                    tuple(int(value) for value in color))
+            return canvases
+
+        # every pixel is handled as a single uint32 holding its four channels
+        packed = canvases.view(np.uint32)[..., 0]
+
+        # coverage goes from 0 to 1024, this is the rounding cv2.warpAffine
+        # applies with its 15 bit weights on uint8 images
+        coverage_range = np.arange(1025, dtype=np.uint32)[:, np.newaxis]
+        for start in range(0, lines.shape[0], chunk_size):
+            chunk = lines[start:start + chunk_size]
+            out = packed[start:start + chunk_size]
+            offsets = (1025 * np.arange(len(chunk), dtype=np.intp))[:, np.newaxis, np.newaxis]
+            for line_id in range(chunk.shape[1]):
+                color = chunk[:, line_id, 4:].astype(np.uint32)
+                # lookup table from coverage to the packed color of each line
+                table = (coverage_range * color[:, np.newaxis, :] + 512) >> 10
+                table = np.ascontiguousarray(table.astype(np.uint8)).view(np.uint32).ravel()
+                # pixels whose alpha rounds to zero are left untouched
+                alpha = np.maximum(color[:, 3], 1).astype(np.int32)
+                min_coverage = np.where(color[:, 3] > 0, (511 + alpha) // alpha, 1025)
+
+                coverage = self._rasterize_rotated_rectangles(chunk[:, line_id])
+                mask = coverage >= min_coverage[:, np.newaxis, np.newaxis]
+                overlay = table.take(coverage + offsets)
+                np.copyto(out, overlay, where=mask)
+        return canvases
+
+    def _rasterize_rotated_rectangles(self, lines):
+        """
+        Returns the (N, sizeX, sizeY) coverage (0 -> 1024) of the rectangles
+        described by lines (N, 8) after rotating them around the canvas
+        center. Reproduces the fixed point bilinear interpolation that
+        cv2.warpAffine (used by imutils.rotate) applies in OpenCV 3 and 4,
+        which samples with 5 bit sub-pixel precision, so results match
+        'multi_lines' exactly.
+        """
+        rows, cols = self.sizeX, self.sizeY
+        center_x, center_y = cols // 2, rows // 2
+
+        pos = lines[:, 0].astype(np.int64)
+        width = lines[:, 2].astype(np.int64)
+        length = lines[:, 3].astype(np.int64)
+
+        # filled pixels of cv2.rectangle((pos, 0), (pos + width, length)),
+        # clipped to the canvas
+        x_lo = np.maximum(np.minimum(pos, pos + width), 0)
+        x_hi = np.minimum(np.maximum(pos, pos + width), cols - 1)
+        y_lo = np.maximum(np.minimum(0, length), 0)
+        y_hi = np.minimum(np.maximum(0, length), rows - 1)
+
+        # the matrix of imutils.rotate, inverted the way cv2.warpAffine does
+        # it, so the source coordinates round exactly like its own
+        matrices = np.array([cv2.getRotationMatrix2D((center_x, center_y), float(rot), 1.0)
+                             for rot in lines[:, 1]])
+        m = matrices.reshape(-1, 6).T[:, :, np.newaxis, np.newaxis]
+        inv_det = 1.0 / (m[0] * m[4] - m[1] * m[3])
+        inv = [m[4] * inv_det, m[1] * -inv_det, None, m[3] * -inv_det, m[0] * inv_det]
+        inv[2] = -inv[0] * m[2] - inv[1] * m[5]
+        inv.append(-inv[3] * m[2] - inv[4] * m[5])
+
+        # source coordinates in 1/32 pixel units, rounded like cv2 does. The
+        # bilinear weight of a [lo, hi] run of filled pixels is a ramp that
+        # rises over the pixel before lo and falls over the pixel after hi,
+        # computed as half - |x - (lo - 1) - half| clipped to (0, 32).
+        def ramp(row_term, col_term, lo, hi):
+            half = (16 * (hi - lo + 2))[:, np.newaxis, np.newaxis]
+            shift = 1024 * (lo[:, np.newaxis, np.newaxis] - 1) + 32 * half
+            weight = (np.rint(row_term * 1024) + 16 - shift).astype(np.int32)
+            weight = weight + np.rint(col_term * 1024).astype(np.int32)
+            weight >>= 5
+            np.abs(weight, out=weight)
+            np.subtract(half.astype(np.int32), weight, out=weight)
+            return np.clip(weight, 0, 32, out=weight)
+
+        dst_y = np.arange(rows, dtype=np.float64)[np.newaxis, :, np.newaxis]
+        dst_x = np.arange(cols, dtype=np.float64)[np.newaxis, np.newaxis, :]
+        coverage = ramp(inv[1] * dst_y + inv[2], inv[0] * dst_x, x_lo, x_hi)
+        coverage *= ramp(inv[4] * dst_y + inv[5], inv[3] * dst_x, y_lo, y_hi)
+        coverage[(x_lo > x_hi) | (y_lo > y_hi)] = 0
+        return coverage
+
+    @staticmethod
+    def lines_to_array(adversary_params_list):
+        """
+        Converts a list of 'multi_lines' adversary_params dictionaries, all
+        with the same number of lines, into the (N, L, 8) array expected by
+        'batch_multi_lines'.
+        """
+        lines = []
+        for adversary_params in adversary_params_list:
+            lines.append([[adversary_params[line_id]['pos'],
+                           adversary_params[line_id]['rot'],
+                           adversary_params[line_id]['width'],
+                           adversary_params[line_id]['length']]
+                          + list(adversary_params[line_id]['color'])
+                          for line_id in sorted(adversary_params.keys())])
+        return np.array(lines, dtype=np.float64)
+
     def overlay_image_alpha(self, background, foreground, x=0, y=0):
         """
         Overlay img_overlay on top of img at the position specified by
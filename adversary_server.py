@@ -0,0 +1,164 @@
+import collections
+import hashlib
+import logging
+import threading
+
+import cv2
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class AdversaryServer(object):
+    def __init__(self, host='', port=8000, max_encoded=32):
+        """
+        HTTP server that hands the adversary canvases to CARLA straight from
+        memory, replacing `python3 -m http.server` (see run_adv_server.sh).
+        Canvases are published under the same path CARLA requests them from,
+        e.g. 'adversary/adversary_Town01_nemesisA.png'.
+        PNG encodings are cached by the hash of the canvas contents (up to
+        max_encoded of them), so publishing a pattern that was already seen
+        skips the encoding. Every response carries the content hash as ETag,
+        honouring If-None-Match, and the number of times the content under
+        that path changed in the X-Adversary-Version header.
+        """
+        self.host = host
+        self.port = port
+        self.max_encoded = max_encoded
+
+        self._lock = threading.Lock()
+        # path -> (png, etag, version)
+        self._published = {}
+        # content hash -> png, least recently used first
+        self._encoded = collections.OrderedDict()
+
+        self._httpd = None
+        self._thread = None
+
+    def start(self):
+        """
+        Starts serving on a background thread. Returns self so it can be
+        chained with the constructor.
+        """
+        if self._httpd is not None:
+            return self
+        self._httpd = _ThreadingHTTPServer((self.host, self.port), _make_handler(self))
+        # the port may have been picked by the OS when created with port=0
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        logging.info('Adversary server listening on port %d', self.port)
+        return self
+
+    def stop(self):
+        """
+        Stops serving and releases the port.
+        """
+        if self._httpd is None:
+            return
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+        self._httpd = None
+        self._thread = None
+
+    def publish(self, path, canvas, png=None):
+        """
+        Makes canvas (a numpy image, as written by cv2.imwrite) available
+        under path. png is the canvas already encoded, if the caller has it.
+        Returns the version of the content under path, which only increases
+        when the content actually changes.
+        """
+        digest = hashlib.sha1(str((canvas.shape, canvas.dtype.str)).encode())
+        digest.update(canvas.tobytes())
+        etag = '"{}"'.format(digest.hexdigest())
+
+        with self._lock:
+            cached = self._encoded.pop(etag, None)
+        if cached is not None:
+            png = cached
+        elif png is None:
+            success, png = cv2.imencode('.png', canvas)
+            if not success:
+                raise RuntimeError('failed to encode the adversary canvas')
+            png = png.tobytes()
+
+        path = _normalize(path)
+        with self._lock:
+            self._encoded[etag] = png
+            while len(self._encoded) > self.max_encoded:
+                self._encoded.popitem(last=False)
+
+            _, current_etag, version = self._published.get(path, (None, None, 0))
+            if current_etag != etag:
+                version += 1
+            self._published[path] = (png, etag, version)
+        return version
+
+    def get(self, path):
+        """
+        Returns the (png, etag, version) published under path, or None.
+        """
+        with self._lock:
+            return self._published.get(_normalize(path))
+
+    def version(self, path):
+        """
+        Returns the version of the content published under path, 0 if
+        nothing was published there yet.
+        """
+        published = self.get(path)
+        return published[2] if published is not None else 0
+
+
+def _normalize(path):
+    path = path.split('?', 1)[0].split('#', 1)[0].lstrip('/')
+    while path.startswith('./'):
+        path = path[2:].lstrip('/')
+    return path
+
+
+def _make_handler(server):
+
+    class AdversaryRequestHandler(BaseHTTPRequestHandler):
+
+        def do_HEAD(self):
+            self._respond(send_body=False)
+
+        def do_GET(self):
+            self._respond(send_body=True)
+
+        def _respond(self, send_body):
+            published = server.get(self.path)
+            if published is None:
+                self.send_error(404, 'No adversary published at this path')
+                return
+            png, etag, version = published
+
+            if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('X-Adversary-Version', str(version))
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(png)))
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('ETag', etag)
+            self.send_header('X-Adversary-Version', str(version))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(png)
+
+        def log_message(self, format, *args):
+            logging.debug('Adversary server: ' + format, *args)
+
+    return AdversaryRequestHandler
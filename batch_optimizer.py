@@ -0,0 +1,123 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+from bayes_opt import BayesianOptimization, UtilityFunction
+from bayes_opt.util import ensure_rng
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import Matern
+
+STRATEGIES = ('constant_liar', 'kriging_believer')
+LIARS = {'min': min, 'max': max, 'mean': lambda targets: sum(targets) / len(targets)}
+
+
+class BatchBayesianOptimization(object):
+    def __init__(self, f, pbounds, num_workers, strategy='constant_liar', liar='min',
+                 random_state=None):
+        """
+        Bayesian optimization of f (as bayes_opt.BayesianOptimization) that
+        keeps num_workers evaluations of f running at the same time, e.g.
+        one per server of an EvaluationPool.
+        Every time an evaluation finishes, its result is registered and a
+        new point is proposed as if the points still being evaluated had
+        already given a made up target: the min, max or mean of the targets
+        registered for 'constant_liar', or the prediction of the gaussian
+        process for 'kriging_believer'. The proposals then spread over the
+        space instead of all landing on the maximum of the acquisition.
+        The predictions come from a gaussian process of its own, configured
+        as the one of BayesianOptimization and fit once per proposal.
+        The results are in self.optimizer (res, max) as with a sequential
+        BayesianOptimization.
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError('unknown batch strategy {}, expected one of {}'.format(
+                strategy, ', '.join(STRATEGIES)))
+        self._f = f
+        self._pbounds = pbounds
+        self.num_workers = num_workers
+        self.strategy = strategy
+        self._liar = LIARS[liar]
+        self._random_state = ensure_rng(random_state)
+        self.optimizer = BayesianOptimization(f, pbounds, random_state=self._random_state)
+        self._gp = GaussianProcessRegressor(kernel=Matern(nu=2.5), alpha=1e-6,
+                                            normalize_y=True, n_restarts_optimizer=25,
+                                            random_state=self._random_state)
+
+    @property
+    def max(self):
+        return self.optimizer.max
+
+    @property
+    def res(self):
+        return self.optimizer.res
+
+    def maximize(self, init_points=5, n_iter=25, acq='ucb', kappa=2.576, xi=0.0):
+        """
+        Evaluates init_points random points and n_iter points proposed by the
+        acquisition function, num_workers at a time, and returns the best
+        target and parameters found.
+        """
+        utility = UtilityFunction(kind=acq, kappa=kappa, xi=xi)
+        proposed = 0
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            while proposed < init_points + n_iter or pending:
+                while proposed < init_points + n_iter and len(pending) < self.num_workers:
+                    if proposed < init_points:
+                        params = self._random_params()
+                    else:
+                        params = self.suggest(utility, list(pending.values()))
+                    pending[executor.submit(self._f, **params)] = params
+                    proposed += 1
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    params = pending.pop(future)
+                    self.register(params, future.result())
+        return self.optimizer.max
+
+    def register(self, params, target):
+        """
+        Registers the target of the evaluation of params.
+        """
+        logging.info('iteration %d: target %.4f at %s',
+                     len(self.optimizer.space) + 1, target, params)
+        try:
+            self.optimizer.register(params, target)
+        except KeyError:
+            # the same point was proposed and evaluated twice
+            pass
+
+    def suggest(self, utility, pending):
+        """
+        Returns the next point to evaluate, given the parameters of the
+        evaluations still running.
+        """
+        if len(self.optimizer.space) == 0:
+            return self._random_params()
+        if not pending:
+            return self.optimizer.suggest(utility)
+
+        space = self.optimizer.space
+        if self.strategy == 'kriging_believer':
+            # believing the prediction at a point hardly moves the ones at
+            # the others, so all the pending points are predicted by one fit
+            self._gp.fit(space.params, space.target)
+            lies = self._gp.predict(np.array([space.params_to_array(params)
+                                              for params in pending]))
+        else:
+            lies = [self._liar(space.target)] * len(pending)
+
+        believer = BayesianOptimization(None, self._pbounds, random_state=self._random_state)
+        for result in self.optimizer.res:
+            believer.register(result['params'], result['target'])
+        for params, lie in zip(pending, lies):
+            try:
+                believer.register(params, lie)
+            except KeyError:
+                pass
+        return believer.suggest(utility)
+
+    def _random_params(self):
+        space = self.optimizer.space
+        return space.array_to_params(space.random_sample())
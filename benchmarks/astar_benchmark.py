@@ -0,0 +1,73 @@
+"""
+Compares the routes and timings of AStar and ArrayAStar on the planner grids.
+
+Usage (from the repository root):
+    python benchmarks/astar_benchmark.py [--cities Town01 Town02] [--routes 500]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from carla.planner.astar import AStar, ArrayAStar
+from carla.planner.map import get_city_map
+
+ORIENTATIONS = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+
+
+def solve(astar_class, resolution, walls, source, target):
+    astar = astar_class()
+    start = time.time()
+    astar.init_grid(resolution[0], resolution[1], walls, source, target)
+    route = astar.solve()
+    return route, time.time() - start
+
+
+def benchmark_city(city, routes, seed):
+    city_map = get_city_map(city, 0.1643, 50.0)
+    resolution = city_map.get_graph_resolution()
+    base_walls = city_map.get_walls()
+    free = [(x, y) for x in range(resolution[0]) for y in range(resolution[1])
+            if (x, y) not in base_walls]
+
+    rng = random.Random(seed)
+    times = {AStar: 0.0, ArrayAStar: 0.0}
+    mismatches = 0
+    for _ in range(routes):
+        source, target = rng.sample(free, 2)
+        # the walls as used by CityTrack.compute_route
+        walls = city_map.get_walls_directed(source, rng.choice(ORIENTATIONS),
+                                            target, rng.choice(ORIENTATIONS))
+        results = {}
+        for astar_class in times:
+            results[astar_class], elapsed = solve(astar_class, resolution, walls,
+                                                  source, target)
+            times[astar_class] += elapsed
+        if results[AStar] != results[ArrayAStar]:
+            mismatches += 1
+
+    print('{}: {} routes, {} mismatches'.format(city, routes, mismatches))
+    for astar_class, elapsed in times.items():
+        print('  {:<11} {:8.3f} ms/route'.format(astar_class.__name__,
+                                                1000.0 * elapsed / routes))
+    print('  speedup     {:8.2f}x'.format(times[AStar] / times[ArrayAStar]))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', nargs='+', default=['Town01', 'Town02'])
+    parser.add_argument('--routes', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    mismatches = sum(benchmark_city(city, args.routes, args.seed) for city in args.cities)
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
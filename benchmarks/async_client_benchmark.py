@@ -0,0 +1,112 @@
+"""
+Drives several fake CARLA servers (carla.fake_server, one process each) for
+an episode of --frames frames, one after the other with CarlaClient, then
+all at once from a single event loop with AsyncCarlaClient.
+
+The fake servers answer as fast as they can unless --realtime is given, in
+which case they take 1 / --fps seconds per frame as a rendering server
+would. Only then is there waiting for the event loop to overlap; otherwise
+this measures the overhead of the asyncio streams.
+
+Usage (from the repository root):
+    python benchmarks/async_client_benchmark.py [--servers 4] [--frames 200] [--realtime]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from carla.async_client import AsyncCarlaClient
+from carla.client import CarlaClient
+from carla.sensor import Camera
+from carla.settings import CarlaSettings
+
+
+def make_settings(width, height):
+    settings = CarlaSettings()
+    settings.set(SynchronousMode=True, SendNonPlayerAgentsInfo=False,
+                 NumberOfVehicles=0, NumberOfPedestrians=0)
+    camera = Camera('CameraRGB')
+    camera.set_image_size(width, height)
+    settings.add_sensor(camera)
+    return settings
+
+
+def drive(port, settings, frames):
+    client = CarlaClient('127.0.0.1', port)
+    client.connect()
+    try:
+        client.load_settings(settings)
+        client.start_episode(0)
+        for _ in range(frames):
+            client.read_data()
+            client.send_control(throttle=0.5)
+    finally:
+        client.disconnect()
+
+
+async def drive_async(port, settings, frames):
+    async with AsyncCarlaClient('127.0.0.1', port) as client:
+        await client.load_settings(settings)
+        await client.start_episode(0)
+        for _ in range(frames):
+            await client.read_data()
+            await client.send_control(throttle=0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--servers', type=int, default=4)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--city', default='Town01')
+    parser.add_argument('-p', '--port', type=int, default=2000,
+                        help='world port of the first server, the others follow every 3')
+    parser.add_argument('--realtime', action='store_true',
+                        help='pace the frames of the servers to --fps')
+    parser.add_argument('--fps', type=float, default=10.0)
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    args = parser.parse_args()
+
+    ports = [args.port + 3 * index for index in range(args.servers)]
+    command = [sys.executable, '-m', 'carla.fake_server', '--city', args.city,
+               '--fps', str(args.fps)]
+    if args.realtime:
+        command.append('--realtime')
+    servers = [subprocess.Popen(command + ['-p', str(port)], cwd=ROOT) for port in ports]
+    settings = make_settings(args.width, args.height)
+    try:
+        # Wait for the servers to load the city
+        for port in ports:
+            drive(port, settings, 1)
+
+        start = time.time()
+        for port in ports:
+            drive(port, settings, args.frames)
+        serial = time.time() - start
+
+        loop = asyncio.get_event_loop()
+        start = time.time()
+        loop.run_until_complete(asyncio.gather(
+            *[drive_async(port, settings, args.frames) for port in ports]))
+        concurrent = time.time() - start
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+    frames = args.servers * args.frames
+    print('{} servers x {} frames'.format(args.servers, args.frames))
+    print('CarlaClient, one after the other {:8.1f} fps'.format(frames / serial))
+    print('AsyncCarlaClient, one event loop {:8.1f} fps'.format(frames / concurrent))
+    print('speedup {:.2f}x'.format(serial / concurrent))
+
+
+if __name__ == '__main__':
+    main()
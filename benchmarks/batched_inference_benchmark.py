@@ -0,0 +1,82 @@
+"""
+Measures the frames per second an agent model serves to several episodes
+running at the same time (one thread each, a frame at a time as in
+synchronous mode), with one forward pass per frame against batches
+collected by an InferenceServer.
+
+The model is a synthetic one by default (the SyntheticModel of
+tests/test_batched_inference.py): a dense layer over the 88x200x3 input,
+which like the network costs less per frame in batches. With
+--imitation the imitation learning agent is used (needs TensorFlow and
+the model checkpoint).
+
+Usage (from the repository root):
+    python benchmarks/batched_inference_benchmark.py [--episodes 4] [--frames 200] [--imitation]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from imitation.batched_inference import InferenceServer
+from tests.test_batched_inference import SyntheticModel
+
+COMMANDS = [2.0, 3.0, 4.0, 5.0]
+
+
+def run(name, step, episodes, frames, images):
+    def episode(index):
+        for frame in range(frames):
+            step(images[(index + frame) % len(images)], 5.0, COMMANDS[frame % len(COMMANDS)])
+
+    threads = [threading.Thread(target=episode, args=(index,)) for index in range(episodes)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    print('{:<22} {:8.1f} frames/s'.format(name, episodes * frames / elapsed))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--episodes', type=int, default=4, help='episodes run at the same time')
+    parser.add_argument('--frames', type=int, default=200, help='frames per episode')
+    parser.add_argument('--max-latency', type=float, default=0.005)
+    parser.add_argument('--imitation', action='store_true')
+    args = parser.parse_args()
+
+    if args.imitation:
+        from imitation.imitation_learning import ImitationLearning
+        model = ImitationLearning('Town01', avoid_stopping=True)
+    else:
+        model = SyntheticModel()
+    rng = np.random.RandomState(0)
+    images = rng.randint(0, 256, (8, 600, 800, 3)).astype(np.uint8)
+
+    lock = threading.Lock()
+
+    def step_one(image, speed, direction):
+        image_input = model.preprocess(image)
+        with lock:
+            return model.predict_batch([image_input], [speed], [direction])[0]
+
+    before = run('one frame per pass', step_one, args.episodes, args.frames, images)
+    with InferenceServer(model, max_batch_size=args.episodes,
+                         max_latency=args.max_latency) as server:
+        after = run('InferenceServer', lambda *frame: server.submit(*frame).result(),
+                    args.episodes, args.frames, images)
+        print('mean batch size {:.2f}'.format(server.stats()['mean_batch_size']))
+    print('speedup {:.2f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+    main()
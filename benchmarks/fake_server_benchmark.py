@@ -0,0 +1,76 @@
+"""
+Runs the driving benchmark client stack against carla.fake_server, so its
+throughput and per frame latency can be measured without an Unreal CARLA
+instance or a GPU.
+
+The time spent on each stage of the episode loop is printed after the
+runs. The inference of a model can be emulated with --agent-ms.
+
+The results are written to _benchmarks_results in the working directory.
+
+Usage (from the repository root):
+    python benchmarks/fake_server_benchmark.py [--city Town01_nemesisA] [--runs 5] [--agent-ms 0]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from carla.agent import ForwardAgent
+from carla.client import VehicleControl
+from carla.driving_benchmark import DrivingBenchmarkSession
+from carla.driving_benchmark.experiment_suites import AdversarySuite
+from carla.fake_server import FakeCarlaServer
+
+
+class SleepingAgent(ForwardAgent):
+    """Drives forward, taking seconds per step as a model would."""
+
+    def __init__(self, seconds):
+        self._seconds = seconds
+
+    def run_step(self, measurements, sensor_data, directions, target):
+        time.sleep(self._seconds)
+        control = VehicleControl()
+        control.throttle = 0.9
+        return control
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--city', default='Town01_nemesisA')
+    parser.add_argument('--task', default='turn-right')
+    parser.add_argument('--runs', type=int, default=5, help='benchmark runs on one connection')
+    parser.add_argument('--save-images', action='store_true')
+    parser.add_argument('--agent-ms', type=float, default=0.0,
+                        help='time the agent takes per step (default 0)')
+    args = parser.parse_args()
+
+    if not os.path.exists('_benchmarks_results'):
+        os.mkdir('_benchmarks_results')
+
+    server = FakeCarlaServer(args.city, port=0).start()
+    suite = AdversarySuite(args.city, args.task, 1, 1, 1)
+    try:
+        with DrivingBenchmarkSession(args.city, port=server.port) as session:
+            agent = SleepingAgent(args.agent_ms / 1000.0)
+            for run in range(args.runs):
+                frames_before = server.frames
+                start = time.time()
+                session.run(agent, suite, log_name='fake_server_benchmark_{}'.format(run),
+                            save_images=args.save_images)
+                elapsed = time.time() - start
+                frames = server.frames - frames_before
+                print('run {}: {} frames {:7.1f} fps {:7.3f} ms/frame'.format(
+                    run, frames, frames / elapsed, 1000.0 * elapsed / frames))
+                print(session.stage_timings)
+    finally:
+        server.stop()
+    print('{} episodes, {} frames served'.format(server.episodes, server.frames))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Measures the startup time and per frame latency of the imitation learning
+agent built from its checkpoint against the frozen graph exported with
+imitation/frozen_graph.py, and checks they return the same controls on
+random frames.
+
+Needs TensorFlow, the model checkpoint and the exported graph.
+
+Usage (from the repository root):
+    python -m imitation.frozen_graph
+    python benchmarks/frozen_graph_benchmark.py [--frames 500] [--batch 1]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from imitation.frozen_graph import FrozenImitationLearning
+from imitation.imitation_learning import ImitationLearning
+
+COMMANDS = [2.0, 3.0, 4.0, 5.0]
+
+
+def load(name, agent_class, gpu):
+    start = time.time()
+    agent = agent_class('Town01', avoid_stopping=True, gpu_num=gpu)
+    print('{:<12} startup {:8.3f} s'.format(name, time.time() - start))
+    return agent
+
+
+def run(name, agent, inputs):
+    # warm up
+    agent.predict_batch(*inputs[0])
+    start = time.time()
+    controls = [agent.predict_batch(*batch) for batch in inputs]
+    elapsed = time.time() - start
+    frames = sum(len(batch[0]) for batch in inputs)
+    print('{:<12} {:8.3f} ms/frame'.format(name, 1000.0 * elapsed / frames))
+    return elapsed, controls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=1, help='frames per forward pass')
+    parser.add_argument('--gpu', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    agent = load('checkpoint', ImitationLearning, args.gpu)
+    frozen = load('frozen', FrozenImitationLearning, args.gpu)
+
+    rng = np.random.RandomState(args.seed)
+    inputs = [(list(rng.rand(args.batch, *agent._image_size).astype(np.float32)),
+               list(rng.uniform(0, 10, args.batch)),
+               [COMMANDS[rng.randint(len(COMMANDS))] for _ in range(args.batch)])
+              for _ in range(args.frames // args.batch)]
+
+    before, controls = run('checkpoint', agent, inputs)
+    after, frozen_controls = run('frozen', frozen, inputs)
+    for batch, frozen_batch in zip(controls, frozen_controls):
+        for control, frozen_control in zip(batch, frozen_batch):
+            assert np.allclose([control.steer, control.throttle, control.brake],
+                               [frozen_control.steer, frozen_control.throttle,
+                                frozen_control.brake], atol=1e-4)
+    print('speedup {:.2f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Measures the per frame inference latency of the imitation learning agent
+with avoid_stopping on, fetching the control branch and the speed branch
+in one session run, against the two runs it used to do. Inputs are random
+images, speeds and commands; the outputs of both are checked to match.
+
+Needs TensorFlow and the model checkpoint in imitation/model.
+
+Usage (from the repository root):
+    python benchmarks/imitation_inference_benchmark.py [--frames 500] [--gpu 0]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from imitation.imitation_learning import BRANCH_BY_COMMAND, SPEED_BRANCH, ImitationLearning
+
+COMMANDS = [2.0, 3.0, 4.0, 5.0]
+
+
+def two_runs(agent, image_input, speed, control_input):
+    """The outputs of the control and speed branches, one session run each."""
+    branches = agent._network_tensor
+    feed_dict = {agent._input_images: image_input,
+                 agent._input_data[1]: speed,
+                 agent._dout: [1] * len(agent.dropout_vec)}
+    output = agent._sess.run(branches[BRANCH_BY_COMMAND.get(control_input, 1)],
+                             feed_dict=feed_dict)
+    predicted_speed = agent._sess.run(branches[SPEED_BRANCH], feed_dict=feed_dict)
+    return output, predicted_speed
+
+
+def one_run(agent, image_input, speed, control_input):
+    """The outputs of the control and speed branches in a single session run."""
+    branches = agent._network_tensor
+    feed_dict = {agent._input_images: image_input,
+                 agent._input_data[1]: speed,
+                 agent._dout: [1] * len(agent.dropout_vec)}
+    return agent._sess.run([branches[BRANCH_BY_COMMAND.get(control_input, 1)],
+                            branches[SPEED_BRANCH]], feed_dict=feed_dict)
+
+
+def run(name, function, agent, inputs):
+    # warm up
+    function(agent, *inputs[0])
+    start = time.time()
+    outputs = [function(agent, *frame) for frame in inputs]
+    elapsed = time.time() - start
+    print('{:<10} {:8.3f} ms/frame'.format(name, 1000.0 * elapsed / len(inputs)))
+    return elapsed, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--gpu', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    agent = ImitationLearning('Town01', avoid_stopping=True, gpu_num=args.gpu)
+    rng = np.random.RandomState(args.seed)
+    height, width, channels = agent._image_size
+    inputs = [(rng.rand(1, height, width, channels).astype(np.float32),
+               rng.uniform(0, 10, (1, 1)) / 25.0,
+               COMMANDS[rng.randint(len(COMMANDS))])
+              for _ in range(args.frames)]
+
+    before, before_outputs = run('two runs', two_runs, agent, inputs)
+    after, after_outputs = run('one run', one_run, agent, inputs)
+    for (output, speed), (output_after, speed_after) in zip(before_outputs, after_outputs):
+        assert np.allclose(output, output_after, atol=1e-5)
+        assert np.allclose(speed, speed_after, atol=1e-5)
+    print('speedup {:.2f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Measures the per frame time of the preprocessing of the camera images of
+the imitation learning agent: the previous one (cut of the RGB view of the
+frame, scipy.misc.imresize, conversion to float and scaling) against
+preprocess_image, which resizes the BGRA buffer of the frame into the
+network input with PIL (the default) or cv2, and checks how far apart
+their outputs are.
+
+scipy.misc.imresize is the bilinear resize of PIL, which is used directly
+when scipy does not have it any more. The 'pil' output must be the same,
+the 'cv2' one is compared on the images in media/ scaled to the 800x600
+of the camera, on which the mean difference must be under
+MAX_MEAN_DIFFERENCE levels of 255, or random ones with --random (noise,
+which the two resizes average differently).
+
+Usage (from the repository root):
+    python benchmarks/preprocess_benchmark.py [--frames 500] [--random]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image as PILImage
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from carla import sensor
+from imitation.preprocessing import preprocess_image
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+IMAGE_CUT = (115, 510)
+SIZE = (88, 200)
+MAX_MEAN_DIFFERENCE = 2.5
+
+
+def imresize(rgb_image, size):
+    try:
+        from scipy.misc import imresize as scipy_imresize
+    except ImportError:
+        return np.array(PILImage.fromarray(np.ascontiguousarray(rgb_image))
+                        .resize((size[1], size[0]), PILImage.BILINEAR))
+    return scipy_imresize(rgb_image, size)
+
+
+def previous_preprocess(image):
+    rgb_image = image.data[IMAGE_CUT[0]:IMAGE_CUT[1], :]
+    image_input = imresize(rgb_image, SIZE)
+    image_input = image_input.astype(np.float32)
+    return np.multiply(image_input, 1.0 / 255.0)
+
+
+def make_frames(count, random):
+    if random:
+        rng = np.random.RandomState(0)
+        arrays = [rng.randint(0, 256, (600, 800, 4)).astype(np.uint8) for _ in range(4)]
+    else:
+        arrays = [cv2.cvtColor(cv2.resize(cv2.imread(path), (800, 600), interpolation=cv2.INTER_AREA),
+                               cv2.COLOR_BGR2BGRA)
+                  for path in sorted(glob.glob(os.path.join(ROOT, 'media', '*')))]
+    # frames as the client gets them, the Image.data view is converted lazily
+    return [sensor.Image(index, 800, 600, 'SceneFinal', 90, arrays[index % len(arrays)].tobytes())
+            for index in range(count)]
+
+
+def run(name, function, frames):
+    function(frames[0])
+    start = time.time()
+    outputs = [function(frame) for frame in frames]
+    elapsed = time.time() - start
+    print('{:<24} {:8.3f} ms/frame'.format(name, 1000.0 * elapsed / len(frames)))
+    return elapsed, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--random', action='store_true', help='random frames instead of media/')
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames, args.random)
+    out = np.empty(SIZE + (3,), dtype=np.float32)
+
+    before, reference = run('previous', previous_preprocess, frames)
+    for method in ('pil', 'cv2'):
+        after, outputs = run('preprocess_image ' + method,
+                             lambda frame: preprocess_image(frame, IMAGE_CUT, SIZE, method=method),
+                             frames)
+        run('  out=', lambda frame: preprocess_image(frame, IMAGE_CUT, SIZE, out, method=method),
+            frames)
+        run('  of RGB', lambda frame: preprocess_image(frame.data, IMAGE_CUT, SIZE, method=method),
+            frames)
+
+        difference = np.abs(np.stack(outputs) - np.stack(reference)) * 255.0
+        print('  difference to the previous output (in 0-255 levels): '
+              'mean {:.3f}, 99th percentile {:.1f}, max {:.1f}'.format(
+                  difference.mean(), np.percentile(difference, 99), difference.max()))
+        print('  speedup {:.2f}x'.format(before / after))
+        assert outputs[0].shape == reference[0].shape and outputs[0].dtype == reference[0].dtype
+        if method == 'pil':
+            assert difference.max() == 0
+        elif not args.random:
+            assert difference.mean() < MAX_MEAN_DIFFERENCE
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Measures CarlaClient.read_data on camera frames replayed by a local loopback
+server, from the socket to the RGB numpy array the agents use, against the
+previous path that received into bytes and copied the message slices.
+
+Usage (from the repository root):
+    python benchmarks/sensor_decode_benchmark.py [--frames images.npy] [--count 300]
+"""
+
+import argparse
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from carla import carla_server_pb2 as carla_protocol
+from carla import client as carla_client
+from carla import sensor
+from carla import tcp
+
+from tcp_benchmark import ConcatenatingClient, make_messages, serve
+
+
+class CopyingCarlaClient(carla_client.CarlaClient):
+    """The sensor parsing CarlaClient had before, slicing copies of the message."""
+
+    def _parse_sensor_data(self, data):
+        sensor_id = struct.unpack('<L', data[0:4])[0]
+        parser = self._sensors[sensor_id]
+        data = data[4:]
+        if parser.type != carla_protocol.Sensor.CAMERA:
+            return parser.name, parser.parse_raw_data(data)
+        frame_number = struct.unpack('<Q', data[0:8])[0]
+        width = struct.unpack('<L', data[8:12])[0]
+        height = struct.unpack('<L', data[12:16])[0]
+        fov = struct.unpack('<f', data[20:24])[0]
+        return parser.name, sensor.Image(frame_number, width, height, 'SceneFinal',
+                                         fov, data[24:])
+
+
+def make_client(client_class, stream_class, port, cameras, buffer_pool=None):
+    client = client_class('127.0.0.1', port - 1, 15)
+    client._stream_client = stream_class('127.0.0.1', port, 15, buffer_pool) \
+        if buffer_pool is not None else stream_class('127.0.0.1', port, 15)
+    scene = carla_protocol.SceneDescription()
+    for sensor_id in range(cameras):
+        definition = scene.sensors.add()
+        definition.id = sensor_id
+        definition.type = carla_protocol.Sensor.CAMERA
+        definition.name = 'Camera{}'.format(sensor_id)
+    client._sensors = dict((parser.id, parser) for parser in
+                           carla_client._make_sensor_parsers(scene.sensors))
+    client._stream_client.connect()
+    return client
+
+
+def run(name, client_factory, frames, count, cameras, images):
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(('127.0.0.1', 0))
+    server_socket.listen(1)
+    port = server_socket.getsockname()[1]
+    thread = threading.Thread(target=serve, args=(server_socket, frames, count))
+    thread.daemon = True
+    thread.start()
+
+    client = client_factory(port)
+    start = time.time()
+    for index in range(count):
+        measurements, sensor_data = client.read_data()
+        for sensor_id in range(cameras):
+            rgb = sensor_data['Camera{}'.format(sensor_id)].data
+        assert measurements.frame_number == index % len(images)
+    elapsed = time.time() - start
+    # the last frame decoded as the one sent
+    assert np.array_equal(rgb, images[(count - 1) % len(images)][:, :, 2::-1])
+    client._stream_client.disconnect()
+    thread.join()
+    server_socket.close()
+
+    print('{:<24} {:8.3f} ms/frame'.format(name, 1000.0 * elapsed / count))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', help='.npy file with the images to replay')
+    parser.add_argument('--count', type=int, default=300, help='number of frames to read')
+    parser.add_argument('--cameras', type=int, default=1)
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    args = parser.parse_args()
+
+    if args.frames:
+        images = np.load(args.frames)
+    else:
+        rng = np.random.RandomState(0)
+        images = rng.randint(0, 256, (8, args.height, args.width, 4)).astype(np.uint8)
+    frames = make_messages(images, args.cameras)
+    print('{} frames of {:.2f} MB'.format(args.count, len(frames[0]) / 1e6))
+
+    before = run('bytes + slice copies',
+                 lambda port: make_client(CopyingCarlaClient, ConcatenatingClient,
+                                          port, args.cameras),
+                 frames, args.count, args.cameras, images)
+    run('memoryview',
+        lambda port: make_client(carla_client.CarlaClient, tcp.TCPClient,
+                                 port, args.cameras),
+        frames, args.count, args.cameras, images)
+    after = run('memoryview + pool',
+                lambda port: make_client(carla_client.CarlaClient, tcp.TCPClient,
+                                         port, args.cameras, tcp.BufferPool()),
+                frames, args.count, args.cameras, images)
+    print('speedup {:.2f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Measures how fast carla.tcp.TCPClient receives camera frames from a local
+loopback server replaying them, with and without a BufferPool, against the
+previous receive loop that concatenated bytes.
+
+The frames replayed are a measurements message followed by one image per
+camera and the empty message closing the frame, as the CARLA stream port
+sends them. They are synthetic unless --frames points to a file written by
+numpy.save with an array of shape (frames, height, width, 4).
+
+Usage (from the repository root):
+    python benchmarks/tcp_benchmark.py [--frames images.npy] [--count 300]
+"""
+
+import argparse
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from carla import carla_server_pb2 as carla_protocol
+from carla import tcp
+
+
+def make_messages(images, cameras):
+    """
+    The messages of the stream port for each frame: the measurements, one
+    image message per camera and the empty message ending the frame.
+    """
+    frames = []
+    for frame_number, image in enumerate(images):
+        height, width = image.shape[:2]
+        measurements = carla_protocol.Measurements()
+        measurements.frame_number = frame_number
+        measurements.game_timestamp = 100 * frame_number
+        measurements.player_measurements.forward_speed = 10.0
+        messages = [measurements.SerializeToString()]
+        for sensor_id in range(cameras):
+            header = struct.pack('<LQLLLf', sensor_id, frame_number, width, height, 1, 90.0)
+            messages.append(header + image.tobytes())
+        messages.append(b'')
+        frames.append(b''.join(struct.pack('<L', len(m)) + m for m in messages))
+    return frames
+
+
+def serve(server_socket, frames, count):
+    connection, _ = server_socket.accept()
+    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    try:
+        for index in range(count):
+            connection.sendall(frames[index % len(frames)])
+    finally:
+        connection.close()
+
+
+class ConcatenatingClient(tcp.TCPClient):
+    """The receive loop TCPClient had before, appending to bytes."""
+
+    def read(self):
+        header = self._read_bytes(4)
+        return self._read_bytes(struct.unpack('<L', header)[0])
+
+    def release(self, message):
+        pass
+
+    def _read_bytes(self, length):
+        buf = bytes()
+        while length > 0:
+            data = self._socket.recv(length)
+            if not data:
+                raise tcp.TCPConnectionError('connection closed')
+            buf += data
+            length -= len(data)
+        return buf
+
+
+def run(name, make_client, frames, count, messages_per_frame, frame_bytes):
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(('127.0.0.1', 0))
+    server_socket.listen(1)
+    port = server_socket.getsockname()[1]
+    thread = threading.Thread(target=serve, args=(server_socket, frames, count))
+    thread.daemon = True
+    thread.start()
+
+    client = make_client(port)
+    client.connect()
+    start = time.time()
+    for _ in range(count):
+        messages = [client.read() for _ in range(messages_per_frame)]
+        for message in messages:
+            client.release(message)
+    elapsed = time.time() - start
+    client.disconnect()
+    thread.join()
+    server_socket.close()
+
+    print('{:<20} {:8.3f} ms/frame {:9.1f} MB/s'.format(
+        name, 1000.0 * elapsed / count, count * frame_bytes / elapsed / 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', help='.npy file with the images to replay')
+    parser.add_argument('--count', type=int, default=300, help='number of frames to read')
+    parser.add_argument('--cameras', type=int, default=1)
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    args = parser.parse_args()
+
+    if args.frames:
+        images = np.load(args.frames)
+    else:
+        rng = np.random.RandomState(0)
+        images = rng.randint(0, 256, (8, args.height, args.width, 4)).astype(np.uint8)
+
+    frames = make_messages(images, args.cameras)
+    messages_per_frame = args.cameras + 2
+    frame_bytes = len(frames[0])
+    print('{} frames of {:.2f} MB'.format(args.count, frame_bytes / 1e6))
+
+    pool = tcp.BufferPool()
+    run('bytes concatenation', lambda port: ConcatenatingClient('127.0.0.1', port, 15),
+        frames, args.count, messages_per_frame, frame_bytes)
+    run('recv_into', lambda port: tcp.TCPClient('127.0.0.1', port, 15),
+        frames, args.count, messages_per_frame, frame_bytes)
+    run('recv_into + pool', lambda port: tcp.TCPClient('127.0.0.1', port, 15, pool),
+        frames, args.count, messages_per_frame, frame_bytes)
+    print('pool allocations: {}'.format(pool.allocations))
+
+
+if __name__ == '__main__':
+    main()
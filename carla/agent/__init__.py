@@ -1,2 +1,4 @@
 from .forward_agent import ForwardAgent
 from .agent import Agent
+from .prefix_replay_agent import PrefixReplayAgent
+from .action_repeat_agent import ActionRepeatAgent
@@ -0,0 +1,58 @@
+import numpy as np
+
+from carla.agent.agent import Agent
+
+
+class ActionRepeatAgent(Agent):
+    """
+    Wraps an agent to run it only on some frames of an episode and hold its
+    last control on the others, so every frame still gets a control.
+
+    The wrapped agent is run at least every repeat frames, and whenever the
+    planner command changes. If threshold is set, it is also run as soon as
+    the camera image differs from the one it last ran on by more than
+    threshold (mean absolute difference of the pixels, sampled every
+    stride pixels, in levels of 0-255).
+
+    inferred tells for every frame of the episode whether the agent ran on
+    it. Runs a single episode, call reset() before starting another one.
+    """
+
+    def __init__(self, agent, repeat=1, threshold=None, sensor='CameraRGB', stride=8):
+        super(ActionRepeatAgent, self).__init__()
+        self.agent = agent
+        self.repeat = repeat
+        self.threshold = threshold
+        self.sensor = sensor
+        self.stride = stride
+        self.reset()
+
+    def reset(self):
+        self.inferred = []
+        self._control = None
+        self._directions = None
+        self._thumbnail = None
+        self._held = 0
+
+    def run_step(self, measurements, sensor_data, directions, target):
+        thumbnail = None
+        if self.threshold is not None:
+            thumbnail = self._make_thumbnail(sensor_data[self.sensor])
+        infer = (self._control is None or self._held + 1 >= self.repeat or
+                 directions != self._directions or
+                 (thumbnail is not None and
+                  bool(np.abs(thumbnail - self._thumbnail).mean() > self.threshold)))
+        self.inferred.append(infer)
+        if not infer:
+            self._held += 1
+            return self._control
+        self._control = self.agent.run_step(measurements, sensor_data, directions, target)
+        self._directions = directions
+        self._thumbnail = thumbnail
+        self._held = 0
+        return self._control
+
+    def _make_thumbnail(self, image):
+        array = np.frombuffer(image.raw_data, dtype=np.uint8)
+        array = array.reshape((image.height, image.width, 4))
+        return array[::self.stride, ::self.stride, :3].astype(np.int16)
@@ -0,0 +1,30 @@
+from carla.agent.agent import Agent
+
+
+class PrefixReplayAgent(Agent):
+    """
+    Wraps an agent to drive the first frames of an episode with the controls
+    recorded on a previous run of it, e.g. the baseline of an attack, without
+    running the agent. In synchronous mode the simulation then goes through
+    the same states as in that run, as long as nothing the agent would have
+    reacted to differs before the end of the prefix. From there on the
+    wrapped agent drives.
+
+    Runs a single episode, call reset() before starting another one.
+    """
+
+    def __init__(self, agent, controls, prefix_frames):
+        super(PrefixReplayAgent, self).__init__()
+        self.agent = agent
+        self._controls = list(controls[:prefix_frames])
+        self.frame = 0
+
+    def reset(self):
+        self.frame = 0
+
+    def run_step(self, measurements, sensor_data, directions, target):
+        frame = self.frame
+        self.frame += 1
+        if frame < len(self._controls):
+            return self._controls[frame]
+        return self.agent.run_step(measurements, sensor_data, directions, target)
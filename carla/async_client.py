@@ -0,0 +1,239 @@
+# Copyright (c) 2017 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+CARLA client on asyncio streams, so a single event loop can drive several
+CARLA servers at the same time:
+
+    async def drive(port):
+        async with AsyncCarlaClient('localhost', port) as client:
+            scene = await client.load_settings(settings)
+            await client.start_episode(0)
+            for frame in range(100):
+                measurements, sensor_data = await client.read_data()
+                await client.send_control(steer=0.0, throttle=0.5)
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(asyncio.gather(drive(2000), drive(2003)))
+"""
+
+import asyncio
+import logging
+import struct
+
+from . import carla_server_pb2 as carla_protocol
+from .client import CarlaClient
+from .client import _make_sensor_parsers
+from .tcp import TCPConnectionError
+
+
+# Size of the stream buffers, large enough for a camera frame so reading one
+# does not pause the transport
+STREAM_LIMIT = 2 ** 23
+
+
+class AsyncTCPClient(object):
+    """
+    The asyncio counterpart of tcp.TCPClient: messages prepended by their
+    int32 size, errors and timeouts raised as TCPConnectionError.
+    """
+
+    def __init__(self, host, port, timeout):
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._logprefix = '(%s:%s) ' % (self._host, self._port)
+
+    async def connect(self, connection_attempts=10):
+        """Try to establish a connection to the given host:port."""
+        connection_attempts = max(1, connection_attempts)
+        error = None
+        for attempt in range(1, connection_attempts + 1):
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self._host, self._port, limit=STREAM_LIMIT),
+                    self._timeout)
+                logging.debug('%sconnected', self._logprefix)
+                return
+            except (OSError, asyncio.TimeoutError) as exception:
+                error = exception
+                logging.debug('%sconnection attempt %d: %s', self._logprefix, attempt, error)
+                await asyncio.sleep(1)
+        raise TCPConnectionError('%sfailed to connect: %s' % (self._logprefix, error))
+
+    def disconnect(self):
+        """Disconnect any active connection."""
+        if self._writer is not None:
+            logging.debug('%sdisconnecting', self._logprefix)
+            self._writer.close()
+            self._reader = None
+            self._writer = None
+
+    def connected(self):
+        """Return whether there is an active connection."""
+        return self._writer is not None
+
+    async def write(self, message):
+        """Send message to the server."""
+        if self._writer is None:
+            raise TCPConnectionError(self._logprefix + 'not connected')
+        self._writer.write(struct.pack('<L', len(message)) + message)
+        try:
+            await asyncio.wait_for(self._writer.drain(), self._timeout)
+        except (OSError, asyncio.TimeoutError) as exception:
+            raise TCPConnectionError('%sfailed to write data: %s' % (self._logprefix, exception))
+
+    async def read(self):
+        """Read a message from the server, as bytes."""
+        header = await self._read_n(4)
+        return await self._read_n(struct.unpack('<L', header)[0])
+
+    async def _read_n(self, length):
+        if self._reader is None:
+            raise TCPConnectionError(self._logprefix + 'not connected')
+        try:
+            return await asyncio.wait_for(self._reader.readexactly(length), self._timeout)
+        except asyncio.IncompleteReadError:
+            raise TCPConnectionError(self._logprefix + 'connection closed')
+        except (OSError, asyncio.TimeoutError) as exception:
+            raise TCPConnectionError('%sfailed to read data: %s' % (self._logprefix, exception))
+
+
+class AsyncCarlaClient(object):
+    """
+    The CARLA client on asyncio streams. It has the methods of CarlaClient,
+    as coroutines except for disconnect and connected.
+    """
+
+    def __init__(self, host, world_port, timeout=15):
+        self._world_client = AsyncTCPClient(host, world_port, timeout)
+        self._stream_client = AsyncTCPClient(host, world_port + 1, timeout)
+        self._control_client = AsyncTCPClient(host, world_port + 2, timeout)
+        self._current_settings = None
+        self._is_episode_requested = False
+        self._sensors = {}
+
+    async def connect(self, connection_attempts=10):
+        """
+        Try to establish a connection to a CARLA server at the given host:port.
+        """
+        await self._world_client.connect(connection_attempts)
+
+    def disconnect(self):
+        """Disconnect from server."""
+        self._control_client.disconnect()
+        self._stream_client.disconnect()
+        self._world_client.disconnect()
+
+    def connected(self):
+        """Return whether there is an active connection."""
+        return self._world_client.connected()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *args):
+        self.disconnect()
+
+    async def load_settings(self, carla_settings):
+        """
+        Load new settings and request a new episode based on these settings.
+        Return a protobuf object holding the scene description.
+        """
+        self._current_settings = carla_settings
+        return await self._request_new_episode(carla_settings)
+
+    async def start_episode(self, player_start_index):
+        """
+        Start the new episode at the player start given by the
+        player_start_index, and wait until the server answers with an
+        EpisodeReady.
+        """
+        if self._current_settings is None:
+            raise RuntimeError('no settings loaded, cannot start episode')
+
+        # if no new settings are loaded, request new episode with previous
+        if not self._is_episode_requested:
+            await self._request_new_episode(self._current_settings)
+
+        try:
+            pb_message = carla_protocol.EpisodeStart()
+            pb_message.player_start_spot_index = player_start_index
+            await self._world_client.write(pb_message.SerializeToString())
+            # Wait for EpisodeReady.
+            data = await self._world_client.read()
+            if not data:
+                raise RuntimeError('failed to read data from server')
+            pb_message = carla_protocol.EpisodeReady()
+            pb_message.ParseFromString(data)
+            if not pb_message.ready:
+                raise RuntimeError('cannot start episode: server failed to start episode')
+            # We can start the agent clients now.
+            await self._stream_client.connect()
+            await self._control_client.connect()
+        finally:
+            self._is_episode_requested = False
+
+    async def read_data(self):
+        """
+        Read the data sent from the server this frame. Return a pair
+        containing the protobuf object containing the measurements followed
+        by the raw data of the sensors.
+        """
+        data = await self._stream_client.read()
+        if not data:
+            raise RuntimeError('failed to read data from server')
+        pb_message = carla_protocol.Measurements()
+        pb_message.ParseFromString(data)
+        sensor_data = {}
+        while True:
+            data = await self._stream_client.read()
+            if not data:
+                break
+            name, value = self._parse_sensor_data(data)
+            sensor_data[name] = value
+        return pb_message, sensor_data
+
+    async def send_control(self, *args, **kwargs):
+        """
+        Send the VehicleControl to be applied this frame, as
+        CarlaClient.send_control.
+        """
+        if isinstance(args[0] if args else None, carla_protocol.Control):
+            pb_message = args[0]
+        else:
+            pb_message = carla_protocol.Control()
+            pb_message.steer = kwargs.get('steer', 0.0)
+            pb_message.throttle = kwargs.get('throttle', 0.0)
+            pb_message.brake = kwargs.get('brake', 0.0)
+            pb_message.hand_brake = kwargs.get('hand_brake', False)
+            pb_message.reverse = kwargs.get('reverse', False)
+        await self._control_client.write(pb_message.SerializeToString())
+
+    async def _request_new_episode(self, carla_settings):
+        # Disconnect agent clients.
+        self._stream_client.disconnect()
+        self._control_client.disconnect()
+        # Send new episode request.
+        pb_message = carla_protocol.RequestNewEpisode()
+        pb_message.ini_file = str(carla_settings)
+        await self._world_client.write(pb_message.SerializeToString())
+        # Read scene description.
+        data = await self._world_client.read()
+        if not data:
+            raise RuntimeError('failed to read data from server')
+        pb_message = carla_protocol.SceneDescription()
+        pb_message.ParseFromString(data)
+        self._sensors = dict((sensor.id, sensor)
+                             for sensor in _make_sensor_parsers(pb_message.sensors))
+        self._is_episode_requested = True
+        return pb_message
+
+    # The sensors are parsed as CarlaClient does, over views of the message
+    _parse_sensor_data = CarlaClient._parse_sensor_data
@@ -30,22 +30,29 @@ VehicleControl = carla_protocol.Control
 
 
 @contextmanager
-def make_carla_client(host, world_port, timeout=15):
+def make_carla_client(host, world_port, timeout=15, buffer_pool=None):
     """Context manager for creating and connecting a CarlaClient."""
-    with util.make_connection(CarlaClient, host, world_port, timeout) as client:
+    with util.make_connection(CarlaClient, host, world_port, timeout, buffer_pool) as client:
         yield client
 
 
 class CarlaClient(object):
     """The CARLA client. Manages communications with the CARLA server."""
 
-    def __init__(self, host, world_port, timeout=15):
+    def __init__(self, host, world_port, timeout=15, buffer_pool=None):
+        """
+        If a tcp.BufferPool is given, the sensor data of each frame is
+        received into reused buffers: the data returned by read_data is only
+        valid until the next call to read_data.
+        """
         self._world_client = tcp.TCPClient(host, world_port, timeout)
-        self._stream_client = tcp.TCPClient(host, world_port + 1, timeout)
+        self._stream_client = tcp.TCPClient(host, world_port + 1, timeout, buffer_pool)
         self._control_client = tcp.TCPClient(host, world_port + 2, timeout)
         self._current_settings = None
         self._is_episode_requested = False
         self._sensors = {}
+        # The pooled messages of the last frame read
+        self._frame_messages = []
 
     def connect(self, connection_attempts=10):
         """
@@ -101,7 +108,7 @@ class CarlaClient(object):
             if not data:
                 raise RuntimeError('failed to read data from server')
             pb_message = carla_protocol.EpisodeReady()
-            pb_message.ParseFromString(data)
+            pb_message.ParseFromString(bytes(data))
             if not pb_message.ready:
                 raise RuntimeError('cannot start episode: server failed to start episode')
             # We can start the agent clients now.
@@ -117,12 +124,17 @@ class CarlaClient(object):
         started. Return a pair containing the protobuf object containing the
         measurements followed by the raw data of the sensors.
         """
+        # Give back the buffers of the previous frame.
+        for message in self._frame_messages:
+            self._stream_client.release(message)
+        self._frame_messages = []
         # Read measurements.
         data = self._stream_client.read()
         if not data:
             raise RuntimeError('failed to read data from server')
         pb_message = carla_protocol.Measurements()
-        pb_message.ParseFromString(data)
+        pb_message.ParseFromString(bytes(data))
+        self._stream_client.release(data)
         # Read sensor data.
         return pb_message, dict(x for x in self._read_sensor_data())
 
@@ -161,7 +173,7 @@ class CarlaClient(object):
         if not data:
             raise RuntimeError('failed to read data from server')
         pb_message = carla_protocol.SceneDescription()
-        pb_message.ParseFromString(data)
+        pb_message.ParseFromString(bytes(data))
         self._sensors = dict((sensor.id, sensor) \
             for sensor in _make_sensor_parsers(pb_message.sensors))
         self._is_episode_requested = True
@@ -171,11 +183,16 @@ class CarlaClient(object):
         while True:
             data = self._stream_client.read()
             if not data:
-                raise StopIteration
+                self._stream_client.release(data)
+                return
+            self._frame_messages.append(data)
             yield self._parse_sensor_data(data)
 
     def _parse_sensor_data(self, data):
-        sensor_id = struct.unpack('<L', data[0:4])[0]
+        # Sensors are parsed over views of the message, the image pixels are
+        # never copied out of the receive buffer.
+        data = memoryview(data)
+        sensor_id = struct.unpack_from('<L', data, 0)[0]
         parser = self._sensors[sensor_id]
         return parser.name, parser.parse_raw_data(data[4:])
 
@@ -183,9 +200,9 @@ class CarlaClient(object):
 def _make_sensor_parsers(sensors):
     image_types = ['None', 'SceneFinal', 'Depth', 'SemanticSegmentation']
     getimgtype = lambda id: image_types[id] if len(image_types) > id else 'Unknown'
-    getint32 = lambda data, index: struct.unpack('<L', data[index*4:index*4+4])[0]
-    getint64 = lambda data, index: struct.unpack('<Q', data[index*4:index*4+8])[0]
-    getfloat = lambda data, index: struct.unpack('<f', data[index*4:index*4+4])[0]
+    getint32 = lambda data, index: struct.unpack_from('<L', data, index*4)[0]
+    getint64 = lambda data, index: struct.unpack_from('<Q', data, index*4)[0]
+    getfloat = lambda data, index: struct.unpack_from('<f', data, index*4)[0]
 
     def parse_image(data):
         frame_number = getint64(data, 0)
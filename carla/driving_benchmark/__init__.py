@@ -1 +1,2 @@
 from .driving_benchmark import run_driving_benchmark
+from .driving_benchmark import DrivingBenchmarkSession
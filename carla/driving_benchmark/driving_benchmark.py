@@ -10,15 +10,19 @@ import logging
 import math
 import time
 
+from carla.client import CarlaClient
 from carla.client import VehicleControl
 from carla.client import make_carla_client
 from carla.driving_benchmark.metrics import Metrics
 from carla.planner.planner import Planner
 from carla.settings import CarlaSettings
+from carla.tcp import BufferPool
 from carla.tcp import TCPConnectionError
 
 from . import results_printer
+from .episode_result import EpisodeResult
 from .recording import Recording
+from .stage_timings import StageTimings
 
 
 def sldist(c1, c2):
@@ -41,7 +45,11 @@ class DrivingBenchmark(object):
             name_to_save='Test',
             continue_experiment=False,
             save_images=False,
-            distance_for_success=2.0
+            distance_for_success=2.0,
+            save_measurements=True,
+            planner=None,
+            early_stop=None,
+            measurements_format='csv'
     ):
 
         self.__metaclass__ = abc.ABCMeta
@@ -55,15 +63,26 @@ class DrivingBenchmark(object):
         self._recording = Recording(dir_to_save=city_name,
                                     name_to_save=name_to_save,
                                     continue_experiment=continue_experiment,
-                                    save_images=save_images
+                                    save_images=save_images,
+                                    save_measurements=save_measurements,
+                                    measurements_format=measurements_format
                                     )
+        # The measurements and controls of the episodes run, kept in memory
+        self._episode_result = EpisodeResult()
 
-        # We have a default planner instantiated that produces high level commands
-        self._planner = Planner(city_name)
+        # We have a default planner instantiated that produces high level commands,
+        # unless one for this city is given to be reused
+        self._planner = planner if planner is not None else Planner(city_name)
 
         self._episode_number = 0
 
-    def benchmark_agent(self, experiment_suite, agent, client):
+        # The time spent on each stage of the episodes run
+        self._stage_timings = StageTimings()
+
+        # The predicates ending an episode early, see early_stop.py
+        self._early_stop = list(early_stop) if early_stop else []
+
+    def benchmark_agent(self, experiment_suite, agent, client, compute_metrics=True):
         """
         Function to benchmark the agent.
         It first check the log file for this benchmark.
@@ -74,11 +93,15 @@ class DrivingBenchmark(object):
             experiment_suite
             agent: an agent object with the run step class implemented.
             client:
+            compute_metrics: if False the metrics are not computed from the
+            log files, the episodes run are still available with
+            get_episode_result.
 
 
         Return:
             A dictionary with all the metrics computed from the
-            agent running the set of experiments.
+            agent running the set of experiments, or None if
+            compute_metrics is False.
         """
 
         # Instantiate a metric object that will be used to compute the metrics for
@@ -92,65 +115,76 @@ class DrivingBenchmark(object):
 
         logging.info('START')
 
-        for experiment in experiment_suite.get_experiments()[int(start_experiment):]:
-
-            positions = client.load_settings(
-                experiment.conditions).player_start_spots
-
-            self._recording.log_start(experiment.task)
-
-            for pose in experiment.poses[start_pose:]:
-                for rep in range(experiment.repetitions):
-
-                    start_index = pose[0]
-                    end_index = pose[1]
-
-                    client.start_episode(start_index)
-                    self._episode_number += 1
-                    # Print information on
-                    logging.info('======== !!!! ==========')
-                    logging.info('Episode Number: %d', self._episode_number)
-                    logging.info(' Start Position %d End Position %d ',
-                                 start_index, end_index)
-
-                    self._recording.log_poses(start_index, end_index,
-                                              experiment.Conditions.WeatherId)
-
-                    # Calculate the initial distance for this episode
-                    initial_distance = \
-                        sldist(
-                            [positions[start_index].location.x, positions[start_index].location.y],
-                            [positions[end_index].location.x, positions[end_index].location.y])
-
-                    time_out = experiment_suite.calculate_time_out(
-                        self._get_shortest_path(positions[start_index], positions[end_index]))
-
-                    # running the agent
-                    (result, reward_vec, control_vec, final_time, remaining_distance) = \
-                        self._run_navigation_episode(
-                            agent, client, time_out, positions[end_index],
-                            str(experiment.Conditions.WeatherId) + '_'
-                            + str(experiment.task) + '_' + str(start_index)
-                            + '.' + str(end_index))
-
-                    # Write the general status of the just ran episode
-                    self._recording.write_summary_results(
-                        experiment, pose, rep, initial_distance,
-                        remaining_distance, final_time, time_out, result)
-
-                    # Write the details of this episode.
-                    self._recording.write_measurements_results(experiment, rep, pose, reward_vec,
-                                                               control_vec)
-                    if result > 0:
-                        logging.info('+++++ Target achieved in %f seconds! +++++',
-                                     final_time)
-                    else:
-                        logging.info('----- Timeout! -----')
-
-            start_pose = 0
-
-        self._recording.log_end()
-
+        # The logs are written and closed even if an episode fails, e.g. when
+        # the connection is lost and the run is started again
+        try:
+            for experiment in experiment_suite.get_experiments()[int(start_experiment):]:
+
+                positions = client.load_settings(
+                    experiment.conditions).player_start_spots
+
+                self._recording.log_start(experiment.task)
+
+                for pose in experiment.poses[start_pose:]:
+                    for rep in range(experiment.repetitions):
+
+                        start_index = pose[0]
+                        end_index = pose[1]
+
+                        client.start_episode(start_index)
+                        self._episode_number += 1
+                        # Print information on
+                        logging.info('======== !!!! ==========')
+                        logging.info('Episode Number: %d', self._episode_number)
+                        logging.info(' Start Position %d End Position %d ',
+                                     start_index, end_index)
+
+                        self._recording.log_poses(start_index, end_index,
+                                                  experiment.Conditions.WeatherId)
+
+                        # Calculate the initial distance for this episode
+                        initial_distance = \
+                            sldist(
+                                [positions[start_index].location.x, positions[start_index].location.y],
+                                [positions[end_index].location.x, positions[end_index].location.y])
+
+                        time_out = experiment_suite.calculate_time_out(
+                            self._get_shortest_path(positions[start_index], positions[end_index]))
+
+                        # running the agent
+                        (result, reward_vec, control_vec, final_time, remaining_distance) = \
+                            self._run_navigation_episode(
+                                agent, client, time_out, positions[end_index],
+                                str(experiment.Conditions.WeatherId) + '_'
+                                + str(experiment.task) + '_' + str(start_index)
+                                + '.' + str(end_index))
+
+                        # Write the general status of the just ran episode
+                        self._recording.write_summary_results(
+                            experiment, pose, rep, initial_distance,
+                            remaining_distance, final_time, time_out, result)
+
+                        # Write the details of this episode.
+                        self._recording.write_measurements_results(experiment, rep, pose, reward_vec,
+                                                                   control_vec)
+                        self._episode_result.add_episode(experiment, rep, pose, reward_vec,
+                                                         control_vec)
+                        if result > 0:
+                            logging.info('+++++ Target achieved in %f seconds! +++++',
+                                         final_time)
+                        elif final_time < time_out:
+                            logging.info('----- Stopped early! -----')
+                        else:
+                            logging.info('----- Timeout! -----')
+
+                start_pose = 0
+
+            self._recording.log_end()
+        finally:
+            self._recording.close()
+
+        if not compute_metrics:
+            return None
         return metrics_object.compute(self._recording.path)
 
     def get_path(self):
@@ -159,6 +193,19 @@ class DrivingBenchmark(object):
         """
         return self._recording.path
 
+    def get_episode_result(self):
+        """
+        Returns the EpisodeResult with the frames of all the episodes run.
+        """
+        return self._episode_result
+
+    def get_stage_timings(self):
+        """
+        Returns the StageTimings of the episodes run: the reading of the
+        frames ('read'), 'planner', 'agent', 'control' and 'record'.
+        """
+        return self._stage_timings
+
     def _get_directions(self, current_point, end_point):
         """
         Class that should return the directions to reach a certain goal
@@ -206,6 +253,10 @@ class DrivingBenchmark(object):
             episode_name: The name for saving images of this episode
 
         """
+        timings = self._stage_timings
+
+        for predicate in self._early_stop:
+            predicate.reset()
 
         # Send an initial command.
         measurements, sensor_data = client.read_data()
@@ -221,21 +272,33 @@ class DrivingBenchmark(object):
         frame = 0
         distance = 10000
         success = False
+        stopped = False
 
-        while (current_timestamp - initial_timestamp) < (time_out * 1000) and not success:
+        while (current_timestamp - initial_timestamp) < (time_out * 1000) and not success \
+                and not stopped:
 
             # Read data from server with the client
+            start = time.time()
             measurements, sensor_data = client.read_data()
+            timings.add('read', time.time() - start)
             # The directions to reach the goal are calculated.
+            start = time.time()
             directions = self._get_directions(measurements.player_measurements.transform, target)
+            timings.add('planner', time.time() - start)
             # Agent process the data.
             # control = agent.run_step(measurements, sensor_data, directions, target)
+            start = time.time()
             control = agent.run_step(measurements, sensor_data, directions, target)
+            timings.add('agent', time.time() - start)
             # Send the control commands to the vehicle
+            start = time.time()
             client.send_control(control)
+            timings.add('control', time.time() - start)
 
             # save images if the flag is activated
+            start = time.time()
             self._recording.save_images(sensor_data, episode_name, frame)
+            timings.add('record', time.time() - start)
 
             current_x = measurements.player_measurements.transform.location.x
             current_y = measurements.player_measurements.transform.location.y
@@ -263,8 +326,12 @@ class DrivingBenchmark(object):
             measurement_vec.append(measurements.player_measurements)
             control_vec.append(control)
 
-        if success:
-            return 1, measurement_vec, control_vec, float(
+            # Check if the rest of the episode is not needed
+            stopped = any([predicate(frame, measurements.player_measurements, control)
+                           for predicate in self._early_stop])
+
+        if success or stopped:
+            return int(success), measurement_vec, control_vec, float(
                 current_timestamp - initial_timestamp) / 1000.0, distance
         return 0, measurement_vec, control_vec, time_out, distance
 
@@ -277,11 +344,32 @@ def run_driving_benchmark(agent,
                           host='127.0.0.1',
                           port=2000,
                           save_images=False,
+                          save_measurements=True,
+                          compute_metrics=False,
+                          early_stop=None,
+                          measurements_format='csv',
+                          max_retries=None,
+                          buffer_pool=None
                           ):
+    """
+    Runs the experiment suite with the agent and returns the EpisodeResult
+    with the frames of the episodes run. The measurements.csv log is only
+    written if save_measurements is set, and the benchmark metrics (which
+    are read back from the logs) only computed if compute_metrics is set.
+    early_stop is a list of predicates ending the
+    episodes early (see early_stop.py). measurements_format is 'csv' or
+    'npz' (see Recording).
+    The run is started again when the connection fails, up to max_retries
+    times (forever if None), after which the TCPConnectionError is raised.
+    If a tcp.BufferPool is given, the sensor data is received into its
+    buffers (see CarlaClient), e.g. one pool kept across the runs of an
+    environment.
+    """
+    attempt = 0
     while True:
         try:
 
-            with make_carla_client(host, port) as client:
+            with make_carla_client(host, port, buffer_pool=buffer_pool) as client:
                 # Hack to fix for the issue 310, we force a reset, so it does not get
                 #  the positions on first server reset.
                 client.load_settings(CarlaSettings())
@@ -295,11 +383,15 @@ def run_driving_benchmark(agent,
                                                           + str(type(experiment_suite).__name__)
                                                           + '_' + str(city_name),
                                                           save_images=save_images,
-                                             continue_experiment=continue_experiment)
+                                             continue_experiment=continue_experiment,
+                                             save_measurements=save_measurements,
+                                             early_stop=early_stop,
+                                             measurements_format=measurements_format)
                 # This function performs the benchmark. It returns a dictionary summarizing
                 # the entire execution.
 
-                benchmark_summary = benchmark.benchmark_agent(experiment_suite, agent, client)
+                benchmark_summary = benchmark.benchmark_agent(experiment_suite, agent, client,
+                                                              compute_metrics=compute_metrics)
 
                 # print("")
                 # print("")
@@ -318,8 +410,128 @@ def run_driving_benchmark(agent,
                 # results_printer.print_summary(benchmark_summary, experiment_suite.test_weathers,
                 #                               benchmark.get_path())
 
-                break
+                return benchmark.get_episode_result()
 
         except TCPConnectionError as error:
             logging.error(error)
+            attempt += 1
+            if max_retries is not None and attempt > max_retries:
+                raise
             time.sleep(1)
+
+
+class DrivingBenchmarkSession(object):
+    """
+    Runs experiment suites over a connection to the CARLA server that is kept
+    open between runs, along with the planner of the city and the scene of
+    the last settings loaded. Running the same suite again (e.g. once per
+    adversary evaluated) then only costs the start_episode of each pose,
+    instead of connecting, forcing a reset and loading the map as
+    run_driving_benchmark does on every call.
+
+    It can be used in place of the client given to
+    DrivingBenchmark.benchmark_agent.
+
+    The sensor data of every frame is received into the buffers of one
+    tcp.BufferPool, the given one or its own, so the data read is only valid
+    until the next frame is read.
+    """
+
+    def __init__(self, city_name='Town01', host='127.0.0.1', port=2000, timeout=15,
+                 buffer_pool=None):
+        self._city_name = city_name
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._buffer_pool = buffer_pool if buffer_pool is not None else BufferPool()
+        self._client = None
+        self._planner = Planner(city_name)
+        # The settings last loaded on the server and the scene they produced
+        self._settings = None
+        self._scene = None
+        # The StageTimings of the last run
+        self.stage_timings = None
+
+    def connect(self):
+        """
+        Connects to the server if not connected yet.
+        """
+        if self._client is not None:
+            return
+        client = CarlaClient(self._host, self._port, self._timeout, self._buffer_pool)
+        client.connect()
+        self._client = client
+        # Hack to fix for the issue 310, we force a reset, so it does not get
+        #  the positions on first server reset.
+        self._client.load_settings(CarlaSettings())
+        self._client.start_episode(0)
+
+    def disconnect(self):
+        if self._client is not None:
+            self._client.disconnect()
+        self._client = None
+        self._settings = None
+        self._scene = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *args):
+        self.disconnect()
+
+    def load_settings(self, carla_settings):
+        """
+        Loads the settings on the server, unless they are the ones already
+        loaded. Returns the scene description, as CarlaClient.load_settings.
+        """
+        settings = str(carla_settings)
+        if settings != self._settings:
+            self._scene = self._client.load_settings(carla_settings)
+            self._settings = settings
+        return self._scene
+
+    def start_episode(self, player_start_index):
+        self._client.start_episode(player_start_index)
+
+    def read_data(self):
+        return self._client.read_data()
+
+    def send_control(self, *args, **kwargs):
+        self._client.send_control(*args, **kwargs)
+
+    def run(self, agent, experiment_suite, log_name='Test', save_images=False,
+            save_measurements=True, compute_metrics=False, early_stop=None, measurements_format='csv', max_retries=None):
+        """
+        Runs the experiment suite with the agent, like run_driving_benchmark,
+        and returns the EpisodeResult of the episodes run. The connection is
+        reopened if it was lost, up to max_retries times (forever if None),
+        after which the TCPConnectionError is raised.
+        """
+        attempt = 0
+        while True:
+            try:
+                self.connect()
+
+                benchmark = DrivingBenchmark(city_name=self._city_name,
+                                             name_to_save=str(log_name) + '_'
+                                                          + str(type(experiment_suite).__name__)
+                                                          + '_' + str(self._city_name),
+                                             save_images=save_images,
+                                             save_measurements=save_measurements,
+                                             planner=self._planner,
+                                             early_stop=early_stop,
+                                             measurements_format=measurements_format)
+
+                benchmark.benchmark_agent(experiment_suite, agent, self,
+                                          compute_metrics=compute_metrics)
+                self.stage_timings = benchmark.get_stage_timings()
+                return benchmark.get_episode_result()
+
+            except TCPConnectionError as error:
+                logging.error(error)
+                self.disconnect()
+                attempt += 1
+                if max_retries is not None and attempt > max_retries:
+                    raise
+                time.sleep(1)
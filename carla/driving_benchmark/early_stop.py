@@ -0,0 +1,96 @@
+# Copyright (c) 2017 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Predicates ending a benchmark episode before its success or time out, once
+the rest of it would not change what it is run for.
+
+A predicate is called after every frame of the episode with the number of
+frames run so far and the player measurements and control of the last one,
+and returns True to end the episode. reset() is called before each episode.
+"""
+
+
+class EarlyStop(object):
+
+    def reset(self):
+        pass
+
+    def __call__(self, frames, player_measurements, control):
+        raise NotImplementedError
+
+
+class FrameBudget(EarlyStop):
+    """
+    Ends the episode after max_frames frames.
+    """
+
+    def __init__(self, max_frames):
+        self.max_frames = max_frames
+
+    def __call__(self, frames, player_measurements, control):
+        return frames >= self.max_frames
+
+
+class CollisionThreshold(EarlyStop):
+    """
+    Ends the episode once the accumulated intensity of the collisions with
+    vehicles, pedestrians and other objects reaches intensity.
+    """
+
+    def __init__(self, intensity):
+        self.intensity = intensity
+
+    def __call__(self, frames, player_measurements, control):
+        return (player_measurements.collision_vehicles +
+                player_measurements.collision_pedestrians +
+                player_measurements.collision_other) >= self.intensity
+
+
+class Stuck(EarlyStop):
+    """
+    Ends the episode once the player has been slower than min_speed (m/s)
+    for max_frames frames in a row, not counting the first grace_frames
+    frames the car takes to start moving.
+    """
+
+    def __init__(self, max_frames=50, min_speed=0.1, grace_frames=30):
+        self.max_frames = max_frames
+        self.min_speed = min_speed
+        self.grace_frames = grace_frames
+        self._still_frames = 0
+
+    def reset(self):
+        self._still_frames = 0
+
+    def __call__(self, frames, player_measurements, control):
+        if frames <= self.grace_frames or abs(player_measurements.forward_speed) >= self.min_speed:
+            self._still_frames = 0
+            return False
+        self._still_frames += 1
+        return self._still_frames >= self.max_frames
+
+
+class ObjectiveBound(EarlyStop):
+    """
+    Ends the episode once the sum over its frames of
+    term(player_measurements, control) exceeds bound, e.g. the offroad sum
+    of an objective that is already decided past it:
+
+        ObjectiveBound(lambda measurements, control: measurements.intersection_offroad, 20)
+    """
+
+    def __init__(self, term, bound):
+        self.term = term
+        self.bound = bound
+        self.value = 0.0
+
+    def reset(self):
+        self.value = 0.0
+
+    def __call__(self, frames, player_measurements, control):
+        self.value += self.term(player_measurements, control)
+        return self.value > self.bound
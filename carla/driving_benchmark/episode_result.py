@@ -0,0 +1,104 @@
+import csv
+
+import numpy as np
+
+
+# The per frame columns of an episode, the same ones written to measurements.csv
+MEASUREMENT_COLUMNS = ('exp_id', 'rep', 'weather', 'start_point', 'end_point',
+                       'collision_other', 'collision_pedestrians', 'collision_vehicles',
+                       'intersection_otherlane', 'intersection_offroad',
+                       'pos_x', 'pos_y', 'steer', 'throttle', 'brake')
+
+
+class EpisodeResult(object):
+    """
+        The measurements and controls of the episodes run by a benchmark,
+        kept in memory as one numpy array per column of measurements.csv.
+        Built straight from the measurement and control vectors of the
+        episodes, so the metrics can be computed without reading back the
+        csv written by the Recording.
+
+    """
+
+    def __init__(self):
+        self._chunks = {name: [] for name in MEASUREMENT_COLUMNS}
+        self._columns = None
+
+    def add_episode(self, experiment, rep, pose, measurement_vec, control_vec):
+        """
+        Appends the frames of an episode, as given to
+        Recording.write_measurements_results.
+        """
+        frames = len(measurement_vec)
+        constants = {'exp_id': experiment.task,
+                     'rep': rep,
+                     'weather': experiment.Conditions.WeatherId,
+                     'start_point': pose[0],
+                     'end_point': pose[1]}
+        for name, value in constants.items():
+            self._chunks[name].append(np.full(frames, value, dtype=np.float64))
+
+        def column(values):
+            return np.fromiter(values, dtype=np.float64, count=frames)
+
+        self._chunks['collision_other'].append(
+            column(m.collision_other for m in measurement_vec))
+        self._chunks['collision_pedestrians'].append(
+            column(m.collision_pedestrians for m in measurement_vec))
+        self._chunks['collision_vehicles'].append(
+            column(m.collision_vehicles for m in measurement_vec))
+        self._chunks['intersection_otherlane'].append(
+            column(m.intersection_otherlane for m in measurement_vec))
+        self._chunks['intersection_offroad'].append(
+            column(m.intersection_offroad for m in measurement_vec))
+        self._chunks['pos_x'].append(
+            column(m.transform.location.x for m in measurement_vec))
+        self._chunks['pos_y'].append(
+            column(m.transform.location.y for m in measurement_vec))
+        self._chunks['steer'].append(column(c.steer for c in control_vec))
+        self._chunks['throttle'].append(column(c.throttle for c in control_vec))
+        self._chunks['brake'].append(column(c.brake for c in control_vec))
+        self._columns = None
+
+    @classmethod
+    def from_csv(cls, path):
+        """
+        Loads the frames stored in a measurements.csv file.
+        """
+        result = cls()
+        with open(path) as f:
+            rows = list(csv.DictReader(f))
+        for name in MEASUREMENT_COLUMNS:
+            result._chunks[name].append(
+                np.array([float(row[name]) for row in rows], dtype=np.float64))
+        return result
+
+    @classmethod
+    def from_npz(cls, path):
+        """
+        Loads the frames stored in a measurements.npz file.
+        """
+        result = cls()
+        with np.load(path) as measurements:
+            for name in MEASUREMENT_COLUMNS:
+                result._chunks[name].append(measurements[name].astype(np.float64))
+        return result
+
+    @property
+    def columns(self):
+        """
+        Dictionary from column name to the numpy array of its values
+        over all the frames.
+        """
+        if self._columns is None:
+            self._columns = {name: np.concatenate(chunks) if chunks else np.zeros(0)
+                             for name, chunks in self._chunks.items()}
+            # keep a single chunk so later episodes are appended to it
+            self._chunks = {name: [values] for name, values in self._columns.items()}
+        return self._columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.columns['steer'])
@@ -9,6 +9,8 @@ import numpy as np
 import math
 import os
 
+from .episode_result import MEASUREMENT_COLUMNS
+
 sldist = lambda c1, c2: math.sqrt((c2[0] - c1[0]) ** 2 + (c2[1] - c1[1]) ** 2)
 flatten = lambda l: [item for sublist in l for item in sublist]
 
@@ -218,16 +220,26 @@ class Metrics(object):
 
         """
 
-        with open(os.path.join(path, 'summary.csv'), "rU") as f:
+        with open(os.path.join(path, 'summary.csv'), "r") as f:
             header = f.readline()
             header = header.split(',')
             header[-1] = header[-1][:-1]
 
-        with open(os.path.join(path, 'measurements.csv'), "rU") as f:
+        measurements_npz = os.path.join(path, 'measurements.npz')
+        if os.path.exists(measurements_npz):
+            with np.load(measurements_npz) as measurements:
+                header_metrics = list(MEASUREMENT_COLUMNS)
+                measurements_matrix = np.column_stack(
+                    [measurements[name].astype(np.float64) for name in header_metrics])
+        else:
+            with open(os.path.join(path, 'measurements.csv'), "r") as f:
+
+                header_metrics = f.readline()
+                header_metrics = header_metrics.split(',')
+                header_metrics[-1] = header_metrics[-1][:-1]
 
-            header_metrics = f.readline()
-            header_metrics = header_metrics.split(',')
-            header_metrics[-1] = header_metrics[-1][:-1]
+            measurements_matrix = np.loadtxt(os.path.join(path, 'measurements.csv'),
+                                             delimiter=",", skiprows=1)
 
         result_matrix = np.loadtxt(os.path.join(path, 'summary.csv'), delimiter=",", skiprows=1)
 
@@ -239,8 +251,6 @@ class Metrics(object):
 
         all_weathers = np.unique(result_matrix[:, header.index('weather')])
 
-        measurements_matrix = np.loadtxt(os.path.join(path, 'measurements.csv'), delimiter=",",
-                                         skiprows=1)
 
         metrics_dictionary = {'episodes_completion': {w: [0] * len(tasks) for w in all_weathers},
                               'intersection_offroad': {w: [[] for i in range(len(tasks))] for w in
@@ -2,43 +2,51 @@ import csv
 import datetime
 import os
 
+import numpy as np
+
+from .episode_result import EpisodeResult
+from .episode_result import MEASUREMENT_COLUMNS
+
+
+SUMMARY_COLUMNS = ('exp_id', 'rep', 'weather', 'start_point', 'end_point', 'result',
+                   'initial_distance', 'final_distance', 'final_time', 'time_out')
+
+# The columns of measurements.npz stored as integers, the others are floats
+INTEGER_COLUMNS = ('exp_id', 'rep', 'weather', 'start_point', 'end_point')
+
+MEASUREMENTS_FORMATS = ('csv', 'npz')
+
+# Size of the write buffer of measurements.csv
+BUFFER_SIZE = 1 << 20
+
 
 class Recording(object):
 
     def __init__(self, dir_to_save, name_to_save,
-                 continue_experiment, save_images):
-
-        self._dict_summary = {'exp_id': -1,
-                              'rep': -1,
-                              'weather': -1,
-                              'start_point': -1,
-                              'end_point': -1,
-                              'result': -1,
-                              'initial_distance': -1,
-                              'final_distance': -1,
-                              'final_time': -1,
-                              'time_out': -1
-                              }
-        self._dict_measurements = {'exp_id': -1,
-                                   'rep': -1,
-                                   'weather': -1,
-                                   'start_point': -1,
-                                   'end_point': -1,
-                                   'collision_other': -1,
-                                   'collision_pedestrians': -1,
-                                   'collision_vehicles': -1,
-                                   'intersection_otherlane': -1,
-                                   'intersection_offroad': -1,
-                                   'pos_x': -1,
-                                   'pos_y': -1,
-                                   'steer': -1,
-                                   'throttle': -1,
-                                   'brake': -1
-                                   }
-
-        # Just in the case is the first time and there is no benchmark results folder
-        if not os.path.exists('_benchmarks_results/'+dir_to_save):
-            os.mkdir('_benchmarks_results/'+dir_to_save)
+                 continue_experiment, save_images, save_measurements=True,
+                 measurements_format='csv'):
+        """
+        The log files of a benchmark. They are kept open until close() is
+        called, measurements.csv written through a large buffer.
+        With measurements_format 'npz', the measurements are instead kept in
+        memory and written on close() to measurements.npz, one typed array
+        per column, which loads without parsing text (see
+        EpisodeResult.from_npz).
+        """
+        if measurements_format not in MEASUREMENTS_FORMATS:
+            raise ValueError('unknown measurements format {}, expected one of {}'.format(
+                measurements_format, ', '.join(MEASUREMENTS_FORMATS)))
+        self._measurements_format = measurements_format
+
+        # measurements.csv is only written if the flag is activated
+        self._save_measurements = save_measurements
+        self._summary_file = None
+        self._measurements_file = None
+        self._measurements = EpisodeResult() if measurements_format == 'npz' else None
+
+        # Just in the case is the first time and there is no benchmark results folder,
+        # other benchmarks running at the same time may be creating it too
+        os.makedirs(os.path.join('_benchmarks_results', dir_to_save), exist_ok=True)
 
         # Generate the full path for the log files
         self._path = os.path.join('_benchmarks_results', dir_to_save
@@ -82,6 +90,32 @@ class Recording(object):
     def log_end(self):
         with open(self._internal_log_name, 'a+') as log:
             log.write('====== Finished Entire Benchmark ======')
+        self.flush()
+
+    def flush(self):
+        """
+        Writes the rows buffered, measurements.npz is only written by close.
+        """
+        if self._summary_file is not None:
+            self._summary_file.flush()
+        if self._measurements_file is not None:
+            self._measurements_file.flush()
+
+    def close(self):
+        """
+        Writes everything buffered and closes the log files.
+        """
+        if self._summary_file is not None:
+            self._summary_file.close()
+            self._summary_file = None
+        if self._measurements_file is not None:
+            self._measurements_file.close()
+            self._measurements_file = None
+        if self._measurements is not None and self._save_measurements:
+            columns = self._measurements.columns
+            np.savez(os.path.join(self._path, 'measurements.npz'),
+                     **{name: values.astype(np.int64) if name in INTEGER_COLUMNS else values
+                        for name, values in columns.items()})
 
     def write_summary_results(self, experiment, pose, rep,
                               path_distance, remaining_distance,
@@ -89,59 +123,44 @@ class Recording(object):
         """
         Method to record the summary of an episode(pose) execution
         """
+        if self._summary_file is None:
+            self._summary_file = open(os.path.join(self._path, 'summary.csv'), 'a+')
+            self._summary_writer = csv.writer(self._summary_file)
 
-        self._dict_summary['exp_id'] = experiment.task
-        self._dict_summary['rep'] = rep
-        self._dict_summary['weather'] = experiment.Conditions.WeatherId
-        self._dict_summary['start_point'] = pose[0]
-        self._dict_summary['end_point'] = pose[1]
-        self._dict_summary['result'] = result
-        self._dict_summary['initial_distance'] = path_distance
-        self._dict_summary['final_distance'] = remaining_distance
-        self._dict_summary['final_time'] = final_time
-        self._dict_summary['time_out'] = time_out
-
-        with open(os.path.join(self._path, 'summary.csv'), 'a+') as ofd:
-            w = csv.DictWriter(ofd, self._dict_summary.keys())
-
-            w.writerow(self._dict_summary)
+        self._summary_writer.writerow([experiment.task, rep, experiment.Conditions.WeatherId,
+                                       pose[0], pose[1], result, path_distance,
+                                       remaining_distance, final_time, time_out])
+        # The summary tells where to continue from, keep it on disk
+        self._summary_file.flush()
 
     def write_measurements_results(self, experiment, rep, pose, reward_vec, control_vec):
         """
         Method to record the measurements, sensors,
         controls and status of the entire benchmark.
         """
-        with open(os.path.join(self._path, 'measurements.csv'), 'a+') as rfd:
-            rw = csv.DictWriter(rfd, self._dict_measurements.keys())
-
-            for i in range(len(reward_vec)):
-                self._dict_measurements['exp_id'] = experiment.task
-                self._dict_measurements['rep'] = rep
-                self._dict_measurements['start_point'] = pose[0]
-                self._dict_measurements['end_point'] = pose[1]
-                self._dict_measurements['weather'] = experiment.Conditions.WeatherId
-                self._dict_measurements['collision_other'] = reward_vec[
-                    i].collision_other
-                self._dict_measurements['collision_pedestrians'] = reward_vec[
-                    i].collision_pedestrians
-                self._dict_measurements['collision_vehicles'] = reward_vec[
-                    i].collision_vehicles
-                self._dict_measurements['intersection_otherlane'] = reward_vec[
-                    i].intersection_otherlane
-                self._dict_measurements['intersection_offroad'] = reward_vec[
-                    i].intersection_offroad
-                self._dict_measurements['pos_x'] = reward_vec[
-                    i].transform.location.x
-                self._dict_measurements['pos_y'] = reward_vec[
-                    i].transform.location.y
-                self._dict_measurements['steer'] = control_vec[
-                    i].steer
-                self._dict_measurements['throttle'] = control_vec[
-                    i].throttle
-                self._dict_measurements['brake'] = control_vec[
-                    i].brake
-
-                rw.writerow(self._dict_measurements)
+        if not self._save_measurements:
+            return
+        if self._measurements is not None:
+            self._measurements.add_episode(experiment, rep, pose, reward_vec, control_vec)
+            return
+        if self._measurements_file is None:
+            self._measurements_file = open(os.path.join(self._path, 'measurements.csv'), 'a+',
+                                           buffering=BUFFER_SIZE)
+            self._measurements_writer = csv.writer(self._measurements_file)
+
+        episode = (experiment.task, rep, experiment.Conditions.WeatherId, pose[0], pose[1])
+        self._measurements_writer.writerows(
+            episode + (measurements.collision_other,
+                       measurements.collision_pedestrians,
+                       measurements.collision_vehicles,
+                       measurements.intersection_otherlane,
+                       measurements.intersection_offroad,
+                       measurements.transform.location.x,
+                       measurements.transform.location.y,
+                       control.steer,
+                       control.throttle,
+                       control.brake)
+            for measurements, control in zip(reward_vec, control_vec))
 
     def _create_log_files(self):
         """
@@ -152,12 +171,11 @@ class Recording(object):
             os.mkdir(self._path)
 
             with open(os.path.join(self._path, 'summary.csv'), 'w') as ofd:
-                w = csv.DictWriter(ofd, self._dict_summary.keys())
-                w.writeheader()
+                csv.writer(ofd).writerow(SUMMARY_COLUMNS)
 
-            with open(os.path.join(self._path, 'measurements.csv'), 'w') as rfd:
-                rw = csv.DictWriter(rfd, self._dict_measurements.keys())
-                rw.writeheader()
+            if self._measurements_format == 'csv':
+                with open(os.path.join(self._path, 'measurements.csv'), 'w') as rfd:
+                    csv.writer(rfd).writerow(MEASUREMENT_COLUMNS)
 
     def _continue_experiment(self, continue_experiment):
         """
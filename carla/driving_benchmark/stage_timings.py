@@ -0,0 +1,51 @@
+# Copyright (c) 2017 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Time spent on each stage of the episode loop of DrivingBenchmark.
+"""
+
+import threading
+
+
+class StageTimings(object):
+    """
+    Accumulates the time spent on each stage of the episode loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._counts = {}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self._totals[stage] = self._totals.get(stage, 0.0) + seconds
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._totals.clear()
+            self._counts.clear()
+
+    def summary(self):
+        """
+        Returns a dictionary with the count, total and mean seconds of each
+        stage.
+        """
+        with self._lock:
+            return dict((stage, {'count': self._counts[stage],
+                                 'total': total,
+                                 'mean': total / self._counts[stage]})
+                        for stage, total in self._totals.items())
+
+    def __str__(self):
+        lines = []
+        for stage, stats in sorted(self.summary().items()):
+            lines.append('{:<10} {:8d} x {:8.3f} ms = {:9.3f} s'.format(
+                stage, stats['count'], 1000.0 * stats['mean'], stats['total']))
+        return '\n'.join(lines)
+
@@ -0,0 +1,524 @@
+# Copyright (c) 2017 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Stand-in for the CARLA 0.8 server, to run the client, the driving benchmark
+and CarlaEnv without Unreal or a GPU.
+
+It speaks the same protocol on the world, stream and control ports
+(RequestNewEpisode/SceneDescription, EpisodeStart/EpisodeReady, then the
+Measurements and sensor messages of every frame and the Control answers),
+but the world is much simpler:
+
+ - The player start spots are laid along the lanes of the planner graph of
+   the city, every node of every edge, heading along the edge on the lane
+   of that direction.
+ - The player vehicle follows a kinematic bicycle model driven by the
+   controls received. There are no other agents.
+ - Leaving the road counts as off-road and driving against the lane
+   orientation as other lane, both read from the 'Lanes' planner image.
+   Hitting the curb stops the vehicle and adds to collision_other.
+ - Cameras send a synthetic BGRA frame, a sky and ground gradient shifted
+   with the vehicle heading. Lidars send no data.
+
+Run from the command line with
+
+    python -m carla.fake_server --city Town01 --port 2000
+"""
+
+import argparse
+import configparser
+import logging
+import math
+import select
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from google.protobuf.message import DecodeError
+
+from . import carla_server_pb2 as carla_protocol
+from .planner.map import get_city_map
+
+
+# Distance from the lane graph to the center of the lanes
+LANE_OFFSET = 2.0
+
+# Vehicle model constants
+WHEELBASE = 2.9
+MAX_STEER_ANGLE = math.radians(35.0)
+MAX_ACCELERATION = 4.0
+MAX_DECELERATION = 8.0
+DRAG = 0.05
+MAX_REVERSE_SPEED = 5.0
+VEHICLE_EXTENT = (2.3, 1.0)
+
+IMAGE_TYPES = {'None': 0, 'SceneFinal': 1, 'Depth': 2, 'SemanticSegmentation': 3}
+
+
+def _recv_exactly(connection, length):
+    buffer = bytearray(length)
+    view = memoryview(buffer)
+    received = 0
+    while received < length:
+        count = connection.recv_into(view[received:])
+        if not count:
+            return None
+        received += count
+    return bytes(buffer)
+
+
+def _recv_message(connection):
+    """Returns the next message, or None if the connection was closed."""
+    header = _recv_exactly(connection, 4)
+    if header is None:
+        return None
+    return _recv_exactly(connection, struct.unpack('<L', header)[0])
+
+
+def _pack_message(message):
+    return struct.pack('<L', len(message)) + message
+
+
+class _SensorSettings(object):
+    def __init__(self, sensor_id, name, options):
+        self.id = sensor_id
+        self.name = name
+        self.type = options.get('SensorType', 'CAMERA')
+        self.width = int(options.get('ImageSizeX', 720))
+        self.height = int(options.get('ImageSizeY', 512))
+        self.fov = float(options.get('FOV', 90.0))
+        self.image_type = IMAGE_TYPES.get(options.get('PostProcessing', 'SceneFinal'), 1)
+        self.base_image = None
+        if self.type == 'CAMERA':
+            self.base_image = _make_base_image(self.width, self.height)
+
+
+def _parse_settings(ini_file):
+    """Returns the synchronous mode and the sensors of a CarlaSettings ini."""
+    ini = configparser.ConfigParser()
+    ini.optionxform = str
+    ini.read_string(ini_file)
+
+    synchronous = ini.get('CARLA/Server', 'SynchronousMode', fallback='True') == 'True'
+    names = ini.get('CARLA/Sensor', 'Sensors', fallback='')
+    sensors = []
+    for name in [name for name in names.split(',') if name]:
+        section = 'CARLA/Sensor/' + name
+        options = dict(ini.items(section)) if ini.has_section(section) else {}
+        sensors.append(_SensorSettings(len(sensors), name, options))
+    return synchronous, sensors
+
+
+def _parse_request(message, expected):
+    """
+    Parses a message of the world client as the first of RequestNewEpisode
+    and EpisodeStart that reads it without unknown fields, starting with the
+    expected one: both serialize to nothing when empty (an empty ini, start
+    index 0), and protobuf reads either as the other with unknown fields.
+    """
+    message_types = [carla_protocol.RequestNewEpisode, carla_protocol.EpisodeStart]
+    if expected is carla_protocol.EpisodeStart:
+        message_types.reverse()
+    for message_type in message_types:
+        request = message_type()
+        try:
+            request.ParseFromString(message)
+        except DecodeError:
+            continue
+        if not len(request.UnknownFields()):
+            return request
+    raise ValueError('unknown message from the client')
+
+
+def _make_base_image(width, height):
+    """
+    The synthetic camera image, twice as wide as the frames so it can be
+    shifted with the heading: a sky gradient above the horizon and a darker
+    ground with a vertical stripe pattern below it, in BGRA.
+    """
+    image = np.empty((height, 2 * width, 4), dtype=np.uint8)
+    horizon = height // 2
+    rows = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    image[:, :, 0] = np.where(np.arange(height)[:, None] < horizon, 235, 90)
+    image[:, :, 1] = (np.where(np.arange(height)[:, None] < horizon, 200, 95)
+                      - 40 * rows).astype(np.uint8)
+    image[:, :, 2] = np.where(np.arange(height)[:, None] < horizon, 150, 100)
+    stripes = ((np.arange(2 * width) // 40) % 2 == 0)[None, :]
+    ground = np.arange(height)[:, None] >= horizon
+    image[:, :, 1] = np.where(stripes & ground, 160, image[:, :, 1])
+    image[:, :, 3] = 255
+    return image
+
+
+class _Vehicle(object):
+    """Kinematic bicycle model of the player vehicle."""
+
+    def __init__(self, x, y, yaw):
+        self.x = x
+        self.y = y
+        self.yaw = yaw
+        self.speed = 0.0
+        self.acceleration = 0.0
+
+    def step(self, control, dt):
+        throttle = min(max(control.throttle, 0.0), 1.0)
+        brake = 1.0 if control.hand_brake else min(max(control.brake, 0.0), 1.0)
+        steer = min(max(control.steer, -1.0), 1.0)
+
+        direction = -1.0 if control.reverse else 1.0
+        acceleration = direction * throttle * MAX_ACCELERATION - DRAG * self.speed
+        speed = self.speed + acceleration * dt
+        # braking never reverses the direction of motion
+        braking = brake * MAX_DECELERATION * dt
+        if speed > 0:
+            speed = max(0.0, speed - braking)
+        else:
+            speed = min(0.0, speed + braking)
+        speed = min(max(speed, -MAX_REVERSE_SPEED), 1e3)
+
+        self.acceleration = (speed - self.speed) / dt
+        self.speed = speed
+        self.yaw += speed / WHEELBASE * math.tan(steer * MAX_STEER_ANGLE) * dt
+        self.x += speed * math.cos(self.yaw) * dt
+        self.y += speed * math.sin(self.yaw) * dt
+
+    def corners(self):
+        cos_yaw, sin_yaw = math.cos(self.yaw), math.sin(self.yaw)
+        return [(self.x + cos_yaw * dx - sin_yaw * dy, self.y + sin_yaw * dx + cos_yaw * dy)
+                for dx in (-VEHICLE_EXTENT[0], VEHICLE_EXTENT[0])
+                for dy in (-VEHICLE_EXTENT[1], VEHICLE_EXTENT[1])]
+
+
+class FakeCarlaServer(object):
+    """
+    Serves one client at a time on port (world), port + 1 (stream) and
+    port + 2 (control), like CarlaUE4 -carla-server. With port=0 three
+    consecutive free ports are picked, see the port attribute after start.
+
+    fps is the simulated frame rate, which sets the game timestamps. If
+    realtime is set, frames are also paced to that rate, otherwise they are
+    produced as fast as the client consumes them.
+    """
+
+    def __init__(self, city_name='Town01', host='127.0.0.1', port=2000, fps=10.0,
+                 realtime=False):
+        self.city_name = city_name
+        self.host = host
+        self.port = port
+        self.fps = fps
+        self.realtime = realtime
+        self.episodes = 0
+        self.frames = 0
+
+        self._map = get_city_map(city_name, 0.1643, 50.0)
+        self._player_start_spots = self._make_player_start_spots()
+
+        self._listeners = None
+        self._connections = []
+        self._thread = None
+        self._stopped = threading.Event()
+
+    @property
+    def player_start_spots(self):
+        return self._player_start_spots
+
+    def start(self):
+        """Starts serving on a background thread. Returns self."""
+        self._listeners = self._listen()
+        self.port = self._listeners[0].getsockname()[1]
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+        logging.info('Fake CARLA server for %s listening on ports %d-%d',
+                     self.city_name, self.port, self.port + 2)
+        return self
+
+    def stop(self):
+        """Closes every connection and stops serving."""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        for connection in list(self._connections):
+            self._close(connection)
+        self._thread.join()
+        for listener in self._listeners:
+            listener.close()
+        self._thread = None
+        self._listeners = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _listen(self):
+        attempts = 20 if self.port == 0 else 1
+        for _ in range(attempts):
+            listeners = []
+            try:
+                base_port = self.port
+                for offset in range(3):
+                    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                    listeners.append(listener)
+                    listener.bind((self.host, base_port + offset if base_port else 0))
+                    if not base_port:
+                        base_port = listener.getsockname()[1]
+                    listener.listen(1)
+                return listeners
+            except socket.error as error:
+                for listener in listeners:
+                    listener.close()
+                last_error = error
+        raise last_error
+
+    def _make_player_start_spots(self):
+        """
+        One start spot for every node of every lane of the graph, heading
+        along the lane, in a fixed order.
+        """
+        spots = []
+        edges = self._map.get_graph_edges()
+        for source in sorted(edges):
+            for target in sorted(edges[source]):
+                steps = max(abs(target[0] - source[0]), abs(target[1] - source[1]))
+                if steps == 0:
+                    continue
+                yaw = math.atan2(
+                    self._map.convert_to_world(target)[1] - self._map.convert_to_world(source)[1],
+                    self._map.convert_to_world(target)[0] - self._map.convert_to_world(source)[0])
+                heading = (math.cos(yaw), math.sin(yaw))
+                for step in range(steps):
+                    node = (source[0] + (target[0] - source[0]) * step // steps,
+                            source[1] + (target[1] - source[1]) * step // steps)
+                    world = self._map.convert_to_world(node)
+                    # move to the side of the graph where the lane goes our way
+                    x, y = world[0] - heading[1] * LANE_OFFSET, world[1] + heading[0] * LANE_OFFSET
+                    if not self._on_lane(x, y, heading):
+                        x, y = world[0] + heading[1] * LANE_OFFSET, world[1] - heading[0] * LANE_OFFSET
+                    spot = carla_protocol.Transform()
+                    spot.location.x, spot.location.y, spot.location.z = x, y, 0.22
+                    spot.orientation.x = math.cos(yaw)
+                    spot.orientation.y = math.sin(yaw)
+                    spot.rotation.yaw = math.degrees(yaw)
+                    spots.append(spot)
+        return spots
+
+    def _accept(self, listener):
+        """Waits for a connection, returns None when stopped."""
+        while not self._stopped.is_set():
+            readable, _, _ = select.select([listener], [], [], 0.1)
+            if readable:
+                connection, _ = listener.accept()
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._connections.append(connection)
+                return connection
+        return None
+
+    def _close(self, connection):
+        if connection is None:
+            return
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        connection.close()
+        if connection in self._connections:
+            self._connections.remove(connection)
+
+    def _serve(self):
+        while not self._stopped.is_set():
+            world = self._accept(self._listeners[0])
+            if world is None:
+                return
+            try:
+                self._serve_client(world)
+            except (socket.error, ValueError) as error:
+                logging.debug('Fake CARLA server: client dropped: %s', error)
+            finally:
+                self._close(world)
+
+    def _serve_client(self, world):
+        # the settings of the last RequestNewEpisode, none before the first
+        settings = None
+        expected = carla_protocol.RequestNewEpisode
+        message = _recv_message(world)
+        while message is not None and not self._stopped.is_set():
+            request = _parse_request(message, expected)
+            if isinstance(request, carla_protocol.RequestNewEpisode):
+                settings = synchronous, sensors = _parse_settings(request.ini_file)
+                scene = carla_protocol.SceneDescription()
+                scene.player_start_spots.extend(self._player_start_spots)
+                for sensor_settings in sensors:
+                    definition = scene.sensors.add()
+                    definition.id = sensor_settings.id
+                    definition.name = sensor_settings.name
+                    definition.type = getattr(carla_protocol.Sensor, sensor_settings.type,
+                                              carla_protocol.Sensor.UNKNOWN)
+                world.sendall(_pack_message(scene.SerializeToString()))
+                # episodes can then be started one after the other
+                expected = carla_protocol.EpisodeStart
+            else:
+                index = request.player_start_spot_index
+                ready = carla_protocol.EpisodeReady()
+                # without settings loaded the episode is refused
+                ready.ready = (settings is not None and
+                               0 <= index < len(self._player_start_spots))
+                world.sendall(_pack_message(ready.SerializeToString()))
+                if ready.ready:
+                    self._run_episode(index, *settings)
+            message = _recv_message(world)
+
+    def _run_episode(self, index, synchronous, sensors):
+        stream = self._accept(self._listeners[1])
+        control_connection = self._accept(self._listeners[2])
+        if stream is None or control_connection is None:
+            self._close(stream)
+            self._close(control_connection)
+            return
+        self.episodes += 1
+
+        spot = self._player_start_spots[index]
+        vehicle = _Vehicle(spot.location.x, spot.location.y, math.radians(spot.rotation.yaw))
+        control = carla_protocol.Control()
+        collision_other = 0.0
+        dt = 1.0 / self.fps
+        frame = 0
+        next_frame_time = time.time()
+        try:
+            while not self._stopped.is_set():
+                stream.sendall(self._make_frame(frame, vehicle, collision_other, sensors))
+                self.frames += 1
+
+                if synchronous:
+                    message = _recv_message(control_connection)
+                    if message is None:
+                        return
+                    control.ParseFromString(message)
+                else:
+                    # apply the last control received, if any
+                    while select.select([control_connection], [], [], 0)[0]:
+                        message = _recv_message(control_connection)
+                        if message is None:
+                            return
+                        control.ParseFromString(message)
+
+                if self.realtime:
+                    next_frame_time += dt
+                    time.sleep(max(0.0, next_frame_time - time.time()))
+
+                previous = (vehicle.x, vehicle.y)
+                vehicle.step(control, dt)
+                if not self._on_road(vehicle.x, vehicle.y):
+                    # hit the curb
+                    collision_other += 100.0 * abs(vehicle.speed)
+                    vehicle.x, vehicle.y = previous
+                    vehicle.speed = 0.0
+                frame += 1
+        except socket.error as error:
+            logging.debug('Fake CARLA server: episode ended: %s', error)
+        finally:
+            self._close(stream)
+            self._close(control_connection)
+
+    def _on_road(self, x, y):
+        pixel = self._map.convert_to_pixel([x, y, 0.22])
+        lanes = self._map.map_image_lanes
+        row, column = int(pixel[1]), int(pixel[0])
+        if not (0 <= row < lanes.shape[0] and 0 <= column < lanes.shape[1]):
+            return False
+        return lanes[row, column, 1] > 0
+
+    def _on_lane(self, x, y, heading):
+        if not self._on_road(x, y):
+            return False
+        lane = self._map.get_lane_orientation([x, y, 0.22])
+        return lane[0] * heading[0] + lane[1] * heading[1] > 0.5
+
+    def _intersections(self, vehicle):
+        """The fractions of the vehicle off road and in the other lane."""
+        offroad = 0
+        otherlane = 0
+        corners = vehicle.corners()
+        heading = (math.cos(vehicle.yaw), math.sin(vehicle.yaw))
+        for x, y in corners:
+            if not self._on_road(x, y):
+                offroad += 1
+            elif not self._on_lane(x, y, heading):
+                otherlane += 1
+        return offroad / float(len(corners)), otherlane / float(len(corners))
+
+    def _make_frame(self, frame, vehicle, collision_other, sensors):
+        game_timestamp = int(round(1000.0 * frame / self.fps))
+        measurements = carla_protocol.Measurements()
+        measurements.frame_number = frame
+        measurements.platform_timestamp = int(time.time() * 1000) & 0xffffffff
+        measurements.game_timestamp = game_timestamp
+
+        player = measurements.player_measurements
+        player.transform.location.x = vehicle.x
+        player.transform.location.y = vehicle.y
+        player.transform.location.z = 0.22
+        player.transform.orientation.x = math.cos(vehicle.yaw)
+        player.transform.orientation.y = math.sin(vehicle.yaw)
+        player.transform.rotation.yaw = math.degrees(vehicle.yaw)
+        player.bounding_box.extent.x = VEHICLE_EXTENT[0]
+        player.bounding_box.extent.y = VEHICLE_EXTENT[1]
+        player.acceleration.x = vehicle.acceleration * math.cos(vehicle.yaw)
+        player.acceleration.y = vehicle.acceleration * math.sin(vehicle.yaw)
+        player.forward_speed = vehicle.speed
+        player.collision_other = collision_other
+        player.intersection_offroad, player.intersection_otherlane = \
+            self._intersections(vehicle)
+
+        messages = [_pack_message(measurements.SerializeToString())]
+        for sensor_settings in sensors:
+            if sensor_settings.base_image is None:
+                continue
+            width = sensor_settings.width
+            shift = int(round(math.degrees(vehicle.yaw) * width / sensor_settings.fov)) % width
+            image = sensor_settings.base_image[:, shift:shift + width]
+            header = struct.pack('<LQLLLf', sensor_settings.id, frame, width,
+                                 sensor_settings.height, sensor_settings.image_type,
+                                 sensor_settings.fov)
+            messages.append(struct.pack('<L', len(header) + image.nbytes) + header)
+            messages.append(np.ascontiguousarray(image).data)
+        messages.append(_pack_message(b''))
+        return b''.join(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--city', default='Town01', help='planner city (default Town01)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=2000,
+                        help='world port, stream and control use the next two (default 2000)')
+    parser.add_argument('--fps', type=float, default=10.0)
+    parser.add_argument('--realtime', action='store_true', help='pace the frames to fps')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s',
+                        level=logging.DEBUG if args.verbose else logging.INFO)
+    server = FakeCarlaServer(args.city, args.host, args.port, args.fps, args.realtime).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,8 @@
 
 import heapq
 
+import numpy as np
+
 
 class Cell(object):
     def __init__(self, x, y, reachable):
@@ -154,3 +156,167 @@ class AStar(object):
                         self.update_cell(adj_cell, cell)
                         # add adj cell to open list
                         heapq.heappush(self.opened, (adj_cell.f, adj_cell))
+
+
+class ArrayAStar(object):
+    """
+    Same search as AStar, over flat arrays indexed by x * grid_height + y
+    instead of Cell objects: the walls are a bitmap, and the g, f, parent
+    and closed state of the cells are flat lists (faster to index one
+    element at a time than numpy arrays). The heuristic is only computed
+    for the cells reached, and the open heap is indexed by (f, cell) so
+    membership checks do not scan it.
+
+    The heap is ordered exactly like the AStar one, ties on f broken by
+    the current g of the cells, so both return the same routes.
+    """
+
+    def __init__(self):
+        self.grid_height = None
+        self.grid_width = None
+        self.start = None
+        self.end = None
+        self._reachable = None
+        self._g = None
+        self._parent = None
+
+    def init_grid(self, width, height, walls, start, end):
+        """Prepare the wall bitmap.
+
+        @param width grid's width.
+        @param height grid's height.
+        @param walls collection of wall x,y tuples, or a (width, height)
+               boolean array that is True on the walls.
+        @param start grid starting point x,y tuple.
+        @param end grid ending point x,y tuple.
+        """
+        self.grid_height = height
+        self.grid_width = width
+
+        if isinstance(walls, np.ndarray):
+            self._reachable = np.logical_not(walls).ravel().tolist()
+        else:
+            self._reachable = [True] * (width * height)
+            for x, y in walls:
+                if 0 <= x < width and 0 <= y < height:
+                    self._reachable[x * height + y] = False
+
+        self.start = start[0] * height + start[1]
+        self.end = end[0] * height + end[1]
+
+    def get_path(self):
+        height = self.grid_height
+        cell = self.end
+        path = [divmod(cell, height)]
+        while self._parent[cell] != self.start and self._parent[cell] != -1:
+            cell = self._parent[cell]
+            path.append(divmod(cell, height))
+
+        path.append(divmod(self.start, height))
+        path.reverse()
+        return path
+
+    def solve(self):
+        """Solve maze, find path to ending cell.
+
+        @returns path or None if not found.
+        """
+        width, height = self.grid_width, self.grid_height
+        reachable = self._reachable
+        end_x, end_y = divmod(self.end, height)
+        size = width * height
+        g = [0] * size
+        f = [0] * size
+        parent = [-1] * size
+        closed = [False] * size
+        self._g, self._parent = g, parent
+
+        # The open heap holds (f when pushed, cell) entries, as the AStar one.
+        # opened counts the entries of each (cell, f) pair.
+        heap = []
+        opened = {}
+
+        def heuristic(cell):
+            # Distance between the cell and the ending cell multiply by 10.
+            x, y = divmod(cell, height)
+            return 10 * (abs(x - end_x) + abs(y - end_y))
+
+        def less(a, b):
+            # tuple comparison of AStar, where cells compare by their g
+            if a[0] != b[0]:
+                return a[0] < b[0]
+            return a[1] != b[1] and g[a[1]] < g[b[1]]
+
+        def sift_down(pos):
+            new_entry = heap[pos]
+            while pos > 0:
+                parent_pos = (pos - 1) >> 1
+                if less(new_entry, heap[parent_pos]):
+                    heap[pos] = heap[parent_pos]
+                    pos = parent_pos
+                    continue
+                break
+            heap[pos] = new_entry
+
+        def sift_up(pos):
+            end_pos = len(heap)
+            new_entry = heap[pos]
+            child_pos = 2 * pos + 1
+            while child_pos < end_pos:
+                right_pos = child_pos + 1
+                if right_pos < end_pos and not less(heap[child_pos], heap[right_pos]):
+                    child_pos = right_pos
+                heap[pos] = heap[child_pos]
+                pos = child_pos
+                child_pos = 2 * pos + 1
+            heap[pos] = new_entry
+            sift_down(pos)
+
+        def push(entry):
+            heap.append(entry)
+            sift_down(len(heap) - 1)
+            opened[entry] = opened.get(entry, 0) + 1
+
+        def pop():
+            last = heap.pop()
+            if heap:
+                entry = heap[0]
+                heap[0] = last
+                sift_up(0)
+            else:
+                entry = last
+            opened[entry] -= 1
+            return entry
+
+        push((f[self.start], self.start))
+        while heap:
+            _, cell = pop()
+            closed[cell] = True
+            if cell == self.end:
+                return self.get_path()
+
+            x, y = divmod(cell, height)
+            # Clockwise starting from the one on the right.
+            adj_cells = []
+            if x < width - 1:
+                adj_cells.append(cell + height)
+            if y > 0:
+                adj_cells.append(cell - 1)
+            if x > 0:
+                adj_cells.append(cell - height)
+            if y < height - 1:
+                adj_cells.append(cell + 1)
+
+            for adj in adj_cells:
+                if reachable[adj] and not closed[adj]:
+                    if opened.get((f[adj], adj), 0):
+                        if g[adj] > g[cell] + 10:
+                            g[adj] = g[cell] + 10
+                            parent[adj] = cell
+                            f[adj] = g[adj] + heuristic(adj)
+                    else:
+                        g[adj] = g[cell] + 10
+                        parent[adj] = cell
+                        f[adj] = g[adj] + heuristic(adj)
+                        push((f[adj], adj))
+        return None
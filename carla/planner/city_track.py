@@ -4,23 +4,103 @@
 # This work is licensed under the terms of the MIT license.
 # For a copy, see <https://opensource.org/licenses/MIT>.
 
+import collections
+import math
+import threading
+
 from carla.planner.graph import sldist
 
-from carla.planner.astar import AStar
-from carla.planner.map import CarlaMap
+from carla.planner.astar import ArrayAStar
+from carla.planner.map import get_city_map
+
+
+class RouteCache(object):
+    def __init__(self, max_entries=4096, orientation_step=1.0):
+        """
+        Least recently used cache of the routes computed by the city tracks,
+        keyed by (city, source node, source orientation, target node, target
+        orientation), holding at most max_entries routes. Orientations are
+        quantized to angles multiple of orientation_step degrees, and the
+        routes are computed with the quantized orientations, so a route only
+        depends on its key. hits and misses count the lookups. It can be
+        shared between threads.
+        """
+        self.max_entries = max_entries
+        self.orientation_step = orientation_step
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def quantize_orientation(self, orientation):
+        """
+        Returns the quantized angle of the orientation in degrees, and the
+        unit orientation with that angle. Null orientations are kept as they
+        are, with angle None.
+        """
+        if orientation[0] == 0 and orientation[1] == 0:
+            return None, orientation
+        angle = math.degrees(math.atan2(orientation[1], orientation[0]))
+        angle = (round(angle / self.orientation_step) * self.orientation_step) % 360.0
+        return angle, (math.cos(math.radians(angle)), math.sin(math.radians(angle)))
+
+    def get(self, key, default=None):
+        """
+        Returns the route stored for key (None if no route was found), or
+        default if it is not stored.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            route = self._entries.pop(key)
+            self._entries[key] = route
+            return route
+
+    def put(self, key, route):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = route
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._entries), 'max_entries': self.max_entries}
+
+
+# Routes shared by all the city tracks of the process
+shared_route_cache = RouteCache()
+
+# Marks a route missing from the cache, as None is a cached result
+_NOT_CACHED = object()
 
 
 class CityTrack(object):
 
-    def __init__(self, city_name):
+    def __init__(self, city_name, route_cache=None):
+
+        self._city_name = city_name
 
         # These values are fixed for every city.
         self._node_density = 50.0
         self._pixel_density = 0.1643
 
-        self._map = CarlaMap(city_name, self._pixel_density, self._node_density)
+        # The map is shared with the other tracks of the city, only the route
+        # state below belongs to this track
+        self._map = get_city_map(city_name, self._pixel_density, self._node_density)
 
-        self._astar = AStar()
+        self._astar = ArrayAStar()
 
         # Refers to the start position of the previous route computation
         self._previous_node = []
@@ -28,6 +108,9 @@ class CityTrack(object):
         # The current computed route
         self._route = None
 
+        # Routes already computed, shared with the other tracks by default
+        self._route_cache = route_cache if route_cache is not None else shared_route_cache
+
     def project_node(self, position):
         """
             Projecting the graph node into the city road
@@ -78,10 +161,30 @@ class CityTrack(object):
                                                          self._route) > 4
 
     def compute_route(self, node_source, source_ori, node_target, target_ori):
+        """
+        Computes the route between the nodes, or returns it from the route
+        cache when it was already computed. The orientations are quantized
+        by the cache. The route returned must not be modified.
+        """
 
         self._previous_node = node_source
 
-        a_star = AStar()
+        source_angle, source_ori = self._route_cache.quantize_orientation(source_ori)
+        target_angle, target_ori = self._route_cache.quantize_orientation(target_ori)
+        key = (self._city_name, node_source, source_angle, node_target, target_angle)
+
+        route = self._route_cache.get(key, _NOT_CACHED)
+        if route is _NOT_CACHED:
+            route = self._search_route(node_source, source_ori, node_target, target_ori)
+            self._route_cache.put(key, route)
+
+        self._route = route
+
+        return route
+
+    def _search_route(self, node_source, source_ori, node_target, target_ori):
+
+        a_star = ArrayAStar()
         a_star.init_grid(self._map.get_graph_resolution()[0],
                          self._map.get_graph_resolution()[1],
                          self._map.get_walls_directed(node_source, source_ori,
@@ -93,15 +196,13 @@ class CityTrack(object):
         # JuSt a Corner Case
         # Clean this to avoid having to use this function
         if route is None:
-            a_star = AStar()
+            a_star = ArrayAStar()
             a_star.init_grid(self._map.get_graph_resolution()[0],
                              self._map.get_graph_resolution()[1], self._map.get_walls(),
                              node_source, node_target)
 
             route = a_star.solve()
 
-        self._route = route
-
         return route
 
     def get_distance_closest_node_route(self, pos, route):
@@ -14,11 +14,11 @@ def angle_between(v1, v2):
 
 class Grid(object):
 
-    def __init__(self, graph):
-
+    def __init__(self, graph, structure=None, walls=None):
+        # structure and walls can be given when already computed for the graph
         self._graph = graph
-        self._structure = self._make_structure()
-        self._walls = self._make_walls()
+        self._structure = structure if structure is not None else self._make_structure()
+        self._walls = walls if walls is not None else self._make_walls()
 
     def search_on_grid(self, x, y):
         visit = [[0, 1], [0, -1], [1, 0], [1, 1],
@@ -38,6 +38,10 @@ class Grid(object):
             scale += 1
 
         return c_x, c_y
+
+    def get_structure(self):
+        return self._structure
+
     def get_walls(self):
         return self._walls
 
@@ -8,6 +8,7 @@
 
 import math
 import os
+import threading
 
 try:
     import numpy as np
@@ -23,50 +24,121 @@ from carla.planner.graph import Graph
 from carla.planner.graph import sldist
 from carla.planner.grid import Grid
 from carla.planner.converter import Converter
+from carla.planner import map_artifacts
 
 
 def color_to_angle(color):
     return (float(color) / 255.0) * 2 * math.pi
 
 
+# CarlaMap instances shared by the whole process, see get_city_map
+_city_maps = {}
+_city_maps_lock = threading.Lock()
+
+
+def get_city_map(city, pixel_density, node_density):
+    """
+    Returns the CarlaMap of the city, loading it only the first time it is
+    requested in this process. A CarlaMap is never modified after it is
+    built, so the same instance can be shared by every planner of the city.
+    """
+    key = (city, pixel_density, node_density)
+    with _city_maps_lock:
+        if key not in _city_maps:
+            _city_maps[key] = CarlaMap(city, pixel_density, node_density)
+        return _city_maps[key]
+
+
+def clear_city_maps():
+    """
+    Releases the maps loaded by get_city_map.
+    """
+    with _city_maps_lock:
+        _city_maps.clear()
+
+
+def _load_image(file_name):
+    image = Image.open(file_name)
+    image.load()
+    return np.asarray(image, dtype="uint8")
+
+
 class CarlaMap(object):
 
-    def __init__(self, city, pixel_density, node_density):
+    def __init__(self, city, pixel_density, node_density, use_artifacts=True):
+        """
+        The images, grid walls and intersections of the city are read from
+        its precomputed artifacts when they are up to date (see
+        map_artifacts), otherwise they are computed from the source files
+        and the artifacts stored for the next time, if use_artifacts is set.
+        """
         dir_path = os.path.dirname(__file__)
         city_file = os.path.join(dir_path, city + '.txt')
 
-        city_map_file = os.path.join(dir_path, city + '.png')
-        city_map_file_lanes = os.path.join(dir_path, city + 'Lanes.png')
-        city_map_file_center = os.path.join(dir_path, city + 'Central.png')
-
         # The built graph. This is the exact same graph that unreal builds. This
         # is a generic structure used for many cases
         self._graph = Graph(city_file, node_density)
 
         self._pixel_density = pixel_density
-        self._grid = Grid(self._graph)
         # The number of game units per pixel. For now this is fixed.
 
         self._converter = Converter(city_file, pixel_density, node_density)
 
-        # Load the lanes image
-        self.map_image_lanes = Image.open(city_map_file_lanes)
-        self.map_image_lanes.load()
-        self.map_image_lanes = np.asarray(self.map_image_lanes, dtype="int32")
-        # Load the image
-        self.map_image = Image.open(city_map_file)
-        self.map_image.load()
-        self.map_image = np.asarray(self.map_image, dtype="int32")
-
-        # Load the lanes image
-        self.map_image_center = Image.open(city_map_file_center)
-        self.map_image_center.load()
-        self.map_image_center = np.asarray(self.map_image_center, dtype="int32")
+        artifacts = map_artifacts.load_artifacts(city) if use_artifacts else None
+        if artifacts is None:
+            self._grid = Grid(self._graph)
+            self._intersection_nodes = sorted(self._graph.intersection_nodes())
+            # The map, lanes and center images, as uint8
+            self._images = {name: _load_image(os.path.join(dir_path, city + suffix))
+                            for name, suffix in map_artifacts.IMAGES.items()}
+            if use_artifacts:
+                map_artifacts.save_artifacts(city, self.to_arrays())
+        else:
+            walls = set(tuple(wall) for wall in artifacts['walls'].tolist())
+            self._grid = Grid(self._graph, structure=artifacts['structure'], walls=walls)
+            self._intersection_nodes = [tuple(node) for node in
+                                        artifacts['intersection_nodes'].tolist()]
+            self._images = {name: artifacts[name] for name in map_artifacts.IMAGES}
+
+        # The int32 copies of the images, made when first used
+        self._int32_images = {}
+
+    def to_arrays(self):
+        """
+        Returns the arrays stored as the artifacts of the city.
+        """
+        arrays = dict(self._images)
+        arrays['structure'] = self._grid.get_structure()
+        arrays['walls'] = np.array(sorted(self._grid.get_walls()), dtype=np.int64).reshape(-1, 2)
+        arrays['intersection_nodes'] = np.array(
+            sorted(self._intersection_nodes), dtype=np.int64).reshape(-1, 2)
+        return arrays
+
+    def _int32_image(self, name):
+        if name not in self._int32_images:
+            self._int32_images[name] = np.asarray(self._images[name], dtype="int32")
+        return self._int32_images[name]
+
+    @property
+    def map_image(self):
+        return self._int32_image('map')
+
+    @property
+    def map_image_lanes(self):
+        return self._int32_image('lanes')
+
+    @property
+    def map_image_center(self):
+        return self._int32_image('center')
 
     def get_graph_resolution(self):
 
         return self._graph.get_resolution()
 
+    def get_graph_edges(self):
+        """The lanes of the graph, as a dict of node -> list of nodes."""
+        return self._graph.get_edges()
+
     def get_map(self, height=None):
         if height is not None:
             img = Image.fromarray(self.map_image.astype(np.uint8))
@@ -90,7 +162,7 @@ class CarlaMap(object):
         """Get the lane orientation of a certain world position."""
         pixel = self.convert_to_pixel(world)
 
-        ori = self.map_image_lanes[int(pixel[1]), int(pixel[0]), 2]
+        ori = self._images['lanes'][int(pixel[1]), int(pixel[0]), 2]
         ori = color_to_angle(ori)
 
         return (-math.cos(ori), -math.sin(ori))
@@ -140,13 +212,13 @@ class CarlaMap(object):
     def get_distance_closest_node(self, pos):
 
         distance = []
-        for node_iter in self._graph.intersection_nodes():
+        for node_iter in self._intersection_nodes:
             distance.append(sldist(node_iter, pos))
 
         return sorted(distance)[0]
 
     def get_intersection_nodes(self):
-        return self._graph.intersection_nodes()
+        return self._intersection_nodes
 
     def search_on_grid(self,node):
         return self._grid.search_on_grid(node[0], node[1])
@@ -0,0 +1,131 @@
+# Copyright (c) 2017 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Precomputed city map artifacts, so a CarlaMap can be built without decoding
+the town images or walking the grid.
+
+The artifacts of a city are stored in a '<city>.artifacts' directory next to
+the '<city>.txt' graph file, one .npy file per array so the images can be
+memory mapped. They record a version and the hash of the files they were
+built from, and are ignored when either does not match.
+
+To build them ahead of time (CarlaMap also builds them on first use):
+
+    python -m carla.planner.map_artifacts Town01 Town02
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+
+# Increase when the content or layout of the artifacts changes
+ARTIFACTS_VERSION = 1
+
+IMAGES = {'map': '.png', 'lanes': 'Lanes.png', 'center': 'Central.png'}
+
+
+def artifacts_path(city):
+    return os.path.join(os.path.dirname(__file__), city + '.artifacts')
+
+
+def source_files(city):
+    """
+    The files the artifacts of the city are derived from.
+    """
+    dir_path = os.path.dirname(__file__)
+    files = [os.path.join(dir_path, city + '.txt')]
+    files += [os.path.join(dir_path, city + suffix) for suffix in sorted(IMAGES.values())]
+    return files
+
+
+def _sources_digest(city):
+    digest = hashlib.sha1()
+    for file_name in source_files(city):
+        with open(file_name, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_artifacts(city):
+    """
+    Returns a dictionary with the arrays of the city, the images memory
+    mapped, or None if they were not built or are out of date.
+    """
+    path = artifacts_path(city)
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if meta.get('version') != ARTIFACTS_VERSION or meta.get('sources') != _sources_digest(city):
+        return None
+
+    artifacts = {}
+    for name in meta['arrays']:
+        mmap_mode = 'r' if name in IMAGES else None
+        artifacts[name] = np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+    return artifacts
+
+
+def save_artifacts(city, arrays):
+    """
+    Stores the arrays as the artifacts of the city. The directory is written
+    aside and moved in place, so concurrent processes never see it half
+    written.
+    """
+    path = artifacts_path(city)
+    meta = {'version': ARTIFACTS_VERSION,
+            'sources': _sources_digest(city),
+            'arrays': sorted(arrays.keys())}
+
+    tmp_path = None
+    try:
+        tmp_path = tempfile.mkdtemp(prefix=city + '.', dir=os.path.dirname(path))
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, name + '.npy'), np.ascontiguousarray(array))
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        # mkdtemp makes the directory private, the other users of a shared
+        # install must be able to read the artifacts
+        os.chmod(tmp_path, 0o755 & ~_umask())
+        if os.path.exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+        os.rename(tmp_path, path)
+    except OSError as error:
+        # Another process may have just stored them, or the directory is read only
+        logging.debug('Could not store the map artifacts of %s: %s', city, error)
+        if tmp_path is not None:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def build_artifacts(city):
+    """
+    Builds the artifacts of the city from its source files and stores them.
+    """
+    from carla.planner.map import CarlaMap
+    # the densities only matter to the converter, which is not stored
+    carla_map = CarlaMap(city, 0.1643, 50.0, use_artifacts=False)
+    save_artifacts(city, carla_map.to_arrays())
+
+
+if __name__ == '__main__':
+    for city_name in sys.argv[1:]:
+        build_artifacts(city_name)
+        print('Built the map artifacts of {} in {}'.format(city_name, artifacts_path(city_name)))
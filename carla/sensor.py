@@ -142,7 +142,10 @@ class SensorData(object):
 
 
 class Image(SensorData):
-    """Data generated by a Camera."""
+    """
+    Data generated by a Camera. raw_data is a bytes-like object with the
+    BGRA pixels, usually a memoryview on the message received.
+    """
 
     def __init__(self, frame_number, width, height, image_type, fov, raw_data):
         super(Image, self).__init__(frame_number=frame_number)
@@ -184,7 +187,7 @@ class Image(SensorData):
         image = PImage.frombytes(
             mode='RGBA',
             size=(self.width, self.height),
-            data=self.raw_data,
+            data=bytes(self.raw_data),
             decoder_name='raw')
         color = image.split()
         image = PImage.merge("RGB", color[2::-1])
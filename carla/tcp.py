@@ -9,12 +9,51 @@
 import logging
 import socket
 import struct
+import threading
 import time
 
 class TCPConnectionError(Exception):
     pass
 
 
+class BufferPool(object):
+    """
+    Pool of receive buffers, so that reading messages of similar sizes (e.g.
+    the camera frames of an episode) reuses the same memory instead of
+    allocating it for every message. Keeps at most max_buffers released
+    buffers.
+    """
+
+    def __init__(self, max_buffers=8):
+        self.max_buffers = max_buffers
+        self.allocations = 0
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self, size):
+        """Return a bytearray of at least size bytes."""
+        with self._lock:
+            best = None
+            for index, buffer in enumerate(self._free):
+                if len(buffer) >= size and (best is None or len(buffer) < len(self._free[best])):
+                    best = index
+            if best is not None:
+                return self._free.pop(best)
+            self.allocations += 1
+        return bytearray(size)
+
+    def release(self, buffer):
+        """
+        Give back a buffer returned by acquire, or a memoryview on it. Its
+        content may be overwritten by the next message read.
+        """
+        if isinstance(buffer, memoryview):
+            buffer = buffer.obj
+        with self._lock:
+            if len(self._free) < self.max_buffers:
+                self._free.append(buffer)
+
+
 class TCPClient(object):
     """
     Basic networking client for TCP connections. Errors occurred during
@@ -22,13 +61,19 @@ class TCPClient(object):
 
     Received messages are expected to be prepended by a int32 defining the
     message size. Messages are sent following this convention.
+
+    Messages are received in place into a buffer of the announced size. If
+    a BufferPool is given, the buffers are taken from it and the messages
+    read are memoryviews that must be given back with release().
     """
 
-    def __init__(self, host, port, timeout):
+    def __init__(self, host, port, timeout, buffer_pool=None):
         self._host = host
         self._port = port
         self._timeout = timeout
+        self._buffer_pool = buffer_pool
         self._socket = None
+        self._header = bytearray(4)
         self._logprefix = '(%s:%s) ' % (self._host, self._port)
 
     def connect(self, connection_attempts=10):
@@ -69,29 +114,43 @@ class TCPClient(object):
             self._reraise_exception_as_tcp_error('failed to write data', exception)
 
     def read(self):
-        """Read a message from the server."""
-        header = self._read_n(4)
-        if not header:
-            raise TCPConnectionError(self._logprefix + 'connection closed')
-        length = struct.unpack('<L', header)[0]
-        data = self._read_n(length)
+        """
+        Read a message from the server. Returns a bytearray, or a memoryview
+        on a pooled buffer if the client has a buffer pool.
+        """
+        self._read_n(4, self._header)
+        length = struct.unpack('<L', self._header)[0]
+        if self._buffer_pool is None:
+            data = bytearray(length)
+            self._read_n(length, data)
+            return data
+        data = memoryview(self._buffer_pool.acquire(length))[:length]
+        try:
+            self._read_n(length, data)
+        except TCPConnectionError:
+            self._buffer_pool.release(data)
+            raise
         return data
 
-    def _read_n(self, length):
-        """Read n bytes from the socket."""
+    def release(self, message):
+        """Give back the buffer of a message read, if pooled."""
+        if self._buffer_pool is not None and isinstance(message, memoryview):
+            self._buffer_pool.release(message)
+
+    def _read_n(self, length, buffer):
+        """Read n bytes from the socket into buffer."""
         if self._socket is None:
             raise TCPConnectionError(self._logprefix + 'not connected')
-        buf = bytes()
-        while length > 0:
+        view = memoryview(buffer)
+        received = 0
+        while received < length:
             try:
-                data = self._socket.recv(length)
+                count = self._socket.recv_into(view[received:length])
             except socket.error as exception:
                 self._reraise_exception_as_tcp_error('failed to read data', exception)
-            if not data:
+            if not count:
                 raise TCPConnectionError(self._logprefix + 'connection closed')
-            buf += data
-            length -= len(data)
-        return buf
+            received += count
 
     def _reraise_exception_as_tcp_error(self, message, exception):
         raise TCPConnectionError('%s%s: %s' % (self._logprefix, message, exception))
@@ -1,11 +1,17 @@
+import os
 import time
 import pandas as pd
 import numpy as np
 
+from carla.agent import ActionRepeatAgent, PrefixReplayAgent
+from carla.client import VehicleControl
 from carla.driving_benchmark import run_driving_benchmark
+from carla.driving_benchmark import DrivingBenchmarkSession
 from carla.driving_benchmark.experiment_suites import AdversarySuite
-from imitation.imitation_learning import ImitationLearning
+from carla.tcp import BufferPool
 from adversary_generator import AdversaryGenerator
+from adversary_server import AdversaryServer
+from result_cache import ResultCache
 
 WEATHER_DICT = {
         'Default':         0,
@@ -42,9 +48,55 @@ class CarlaEnv:
     def __init__(self, town='Town01_nemesisA',
                 task='turn-right', scene=1, weather='ClearNoon',
                 port=2000, save_images=False, gpu_num=0,
-                experiment_name='baseline'):
+                experiment_name='baseline', adversary_port=None,
+                cache_results=False, save_measurements=True,
+                persistent_connection=False, agent=None, log_prefix='',
+                prefix_frames=0, early_stop=None, action_repeat=1,
+                repeat_threshold=None, connection_retries=None, preprocessing='pil',
+                frozen_graph=False):
         """
         Adversary environment for Carla Simulator
+        If adversary_port is given, the adversaries are served to CARLA from
+        memory on that port, and run_adv_server.sh must not be running.
+        If cache_results is set, the metrics of every step are stored in a
+        ResultCache under _benchmarks_results/ and steps repeating an attack
+        already simulated with the same town, task, scene, weather and agent
+        settings (see agent_settings) return them without running CARLA.
+        The metrics are computed from the frames of the last run kept in
+        memory, measurements.csv is only written if save_measurements is set.
+        If persistent_connection is set, the connection to CARLA, the loaded
+        settings and the planner are kept between runs (see
+        DrivingBenchmarkSession) instead of being set up again on every step.
+        Call close() to release them.
+        If agent is given, it is used instead of loading the imitation
+        learning model, e.g. to share one model between environments.
+        log_prefix is prepended to the names of the logs of every run, so
+        environments running at the same time do not write to the same ones.
+        If prefix_frames is set, the first prefix_frames frames of every
+        attack are driven with the controls of the baseline run instead of
+        running the agent (see PrefixReplayAgent). It must end before the
+        agent can see the adversary, check_prefix_replay tells where the
+        runs diverge.
+        early_stop is a list of predicates ending the episodes of the attacks
+        early (see carla/driving_benchmark/early_stop.py), e.g.
+        [FrameBudget(n)] when only the first n frames are used.
+        If action_repeat is over 1, the agent runs at least every
+        action_repeat frames and its control is held in between, or until
+        the camera image changes by more than repeat_threshold (see
+        ActionRepeatAgent). self.inferred tells which frames of the last run
+        it ran on.
+        A run losing its connection to CARLA is started again, up to
+        connection_retries times (forever if None), after which the
+        TCPConnectionError is raised.
+        The sensor data of every run is received into the buffers of
+        self.buffer_pool instead of new ones for every frame.
+        preprocessing is the resize of the camera images of the imitation
+        learning model loaded when no agent is given: 'pil', the one the
+        model was run with, or 'cv2', faster but not the same (see
+        imitation/preprocessing.py).
+        If frozen_graph is set, that model is run from its frozen graph,
+        which must have been exported (see imitation/frozen_graph.py),
+        instead of its checkpoint.
         """
         print("Starting CARLA gym environment")
         print("Ensure that CARLA is running on port", port)
@@ -55,10 +107,35 @@ class CarlaEnv:
         self.port = port
         self.save_images = save_images
         self.gpu_num = gpu_num
-        self.experiment_name = experiment_name
+        self.log_prefix = log_prefix
+        self.experiment_name = log_prefix + experiment_name
+        self.save_measurements = save_measurements
         self.counter = 0 # counter if more than 1 experiments are run
-
-        self.agent = None
+        self.measurements = None # frames of the last run, see run_benchmark
+        self.prefix_frames = prefix_frames
+        self.baseline_controls = None # controls of the baseline run
+        self.early_stop = early_stop
+        self.action_repeat = action_repeat
+        self.repeat_threshold = repeat_threshold
+        self.connection_retries = connection_retries
+        self.preprocessing = preprocessing
+        self.frozen_graph = frozen_graph
+        self.inferred = None # frames of the last run the agent ran on
+
+        self.adversary_server = None
+        if adversary_port is not None:
+            self.adversary_server = AdversaryServer(port=adversary_port).start()
+
+        self.result_cache = ResultCache() if cache_results else None
+
+        self.buffer_pool = BufferPool()
+
+        self.session = None
+        if persistent_connection:
+            self.session = DrivingBenchmarkSession(self.town, port=self.port,
+                                                   buffer_pool=self.buffer_pool)
+
+        self.agent = agent
         self.avoid_stopping = False
         self.iterations = 1
 
@@ -71,32 +148,55 @@ class CarlaEnv:
                             self.weather, self.iterations, self.scene)
 
         # load the adversary generator
-        self.adversary = AdversaryGenerator(self.town)
+        self.adversary = AdversaryGenerator(self.town, server=self.adversary_server)
 
         self.log_dir = '_benchmarks_results/' + self.town + '/'
         self.update_csv_file()
 
         print("Running the baseline scenario.")
         # runs the experiment for the baseline case (no attack)
-        run_driving_benchmark(self.agent, self.experiment_suite,
-                            log_name=self.experiment_name, city_name=self.town,
-                            port=self.port, save_images=save_images)
+        self.run_benchmark()
 
         # some metrics that are collected
         self.baseline_steer_grad = self.get_steer_gradient()
         self.baseline_steer = self.get_steer()
         self.positions = self.get_xy()
+        self.baseline_controls = self.get_controls()
 
         # add new metrics here as needed
 
     def _load_agent(self):
         """
-        Loads the imitation learning model
+        Loads the imitation learning model, from its frozen graph if
+        frozen_graph is set
         """
         if not self.agent:
+            if self.frozen_graph:
+                from imitation.frozen_graph import FROZEN_GRAPH_PATH, FrozenImitationLearning
+                if not os.path.exists(FROZEN_GRAPH_PATH):
+                    raise RuntimeError('no frozen graph in {}, export it with '
+                                       'python -m imitation.frozen_graph'.format(FROZEN_GRAPH_PATH))
+                print("Loading frozen Imitation Learning model")
+                self.agent = FrozenImitationLearning(self.town, self.avoid_stopping,
+                                gpu_num=self.gpu_num, preprocessing=self.preprocessing)
+                return
+            from imitation.imitation_learning import ImitationLearning
             print("Loading Imitation Learning model")
             self.agent = ImitationLearning(self.town, self.avoid_stopping,
-                                gpu_num=self.gpu_num)
+                                gpu_num=self.gpu_num, preprocessing=self.preprocessing)
+
+    def agent_settings(self):
+        """
+        Everything about the agent that changes the episodes it drives, which
+        the result cache keys the metrics by.
+        """
+        return {
+                'checkpoint': getattr(self.agent, 'checkpoint_path', None),
+                'prefix_frames': self.prefix_frames,
+                'action_repeat': self.action_repeat,
+                'repeat_threshold': self.repeat_threshold,
+                'preprocessing': getattr(self.agent, 'preprocessing', None)
+                }
 
     def step(self, adversary_parameters):
         """
@@ -121,17 +221,29 @@ class CarlaEnv:
                 'color': (0, 0, 0, 255)
             }
         }
+        On a cache hit no episode runs, so self.measurements and self.inferred
+        are None.
         """
         self.counter += 1
-        self.experiment_name = 'adversary_{}'.format(self.counter)
+        self.experiment_name = '{}adversary_{}'.format(self.log_prefix, self.counter)
         self.update_csv_file()
 
+        if self.result_cache is not None:
+            result_key = ResultCache.make_key(self.town, self.task, self.scene, self.weather,
+                                              self.agent_settings(), adversary_parameters)
+            metrics = self.result_cache.get(result_key)
+            if metrics is not None:
+                print("Attack already simulated, using the cached metrics.")
+                # the frames of the previous run do not belong to this attack
+                self.measurements = None
+                self.inferred = None
+                return metrics
+
         # generate a multi-line attack using the adversary_parameters dictionary
         self.adversary.multi_lines(adversary_parameters)
 
         # runs a particular scenario
-        run_driving_benchmark(self.agent, self.experiment_suite, log_name=self.experiment_name,
-                            city_name=self.town, port=self.port, save_images=self.save_images)
+        self.run_benchmark(attack=True)
 
         # below is a dictionary of metrics that would be returned for each step
         # modify it as required
@@ -145,8 +257,104 @@ class CarlaEnv:
                     'intersection_otherlane': self.get_intersection_otherlane(),
                     'collision_other': self.get_collision_other()
                     }
+
+        # the metrics of an episode ended early are not those of the attack
+        if self.result_cache is not None and not self.early_stop:
+            self.result_cache.put(result_key, metrics)
         return metrics
 
+    def run_benchmark(self, attack=False):
+        """
+        runs the experiment suite and loads the frames of the run into
+        self.measurements, a dataframe with the columns of measurements.csv,
+        from which all the metrics are computed.
+        If attack is set, the controls of the baseline are replayed for the
+        first prefix_frames frames and the episode is ended by the early_stop
+        predicates, if any.
+        """
+        agent = self.agent
+        repeat_agent = None
+        if self.action_repeat > 1:
+            agent = repeat_agent = ActionRepeatAgent(self.agent, self.action_repeat,
+                                                     self.repeat_threshold)
+        early_stop = None
+        if attack:
+            if self.prefix_frames and self.baseline_controls is not None:
+                agent = PrefixReplayAgent(agent, self.baseline_controls,
+                                          self.prefix_frames)
+            early_stop = self.early_stop
+        if self.session is not None:
+            episode_result = self.session.run(agent, self.experiment_suite,
+                                log_name=self.experiment_name, save_images=self.save_images,
+                                save_measurements=self.save_measurements,
+                                early_stop=early_stop,
+                                max_retries=self.connection_retries)
+        else:
+            episode_result = run_driving_benchmark(agent, self.experiment_suite,
+                                log_name=self.experiment_name, city_name=self.town,
+                                port=self.port, save_images=self.save_images,
+                                save_measurements=self.save_measurements,
+                                early_stop=early_stop,
+                                max_retries=self.connection_retries,
+                                buffer_pool=self.buffer_pool)
+        self.measurements = pd.DataFrame(episode_result.columns)
+        self.inferred = None
+        if repeat_agent is not None:
+            # the replayed prefix is not inferred
+            self.inferred = ([False] * (len(self.measurements) - len(repeat_agent.inferred)) +
+                             repeat_agent.inferred)
+
+    def check_prefix_replay(self, adversary_parameters, tolerance=1e-4):
+        """
+        runs the attack in full and replaying the prefix of the baseline, and
+        returns the largest differences of steer and position between the
+        two runs (which should be 0), the number of frames of each and the
+        first frame where the full run steers differently from the baseline
+        by more than tolerance: prefix_frames must stay below it.
+        """
+        self.adversary.multi_lines(adversary_parameters)
+        self.run_benchmark()
+        full = self.measurements
+        self.run_benchmark(attack=True)
+        replayed = self.measurements
+
+        frames = min(len(full), len(replayed))
+        check = {}
+        for column in ('steer', 'pos_x', 'pos_y'):
+            check[column] = float(np.max(np.abs(full[column].values[:frames] -
+                                                replayed[column].values[:frames])))
+        check['frames'] = (len(full), len(replayed))
+
+        baseline_steer = np.asarray(self.baseline_steer)
+        frames = min(len(full), len(baseline_steer))
+        differs = np.abs(full['steer'].values[:frames] - baseline_steer[:frames]) > tolerance
+        check['divergence'] = int(np.argmax(differs)) if differs.any() else frames
+        return check
+
+    def get_controls(self):
+        """
+        returns the list of VehicleControl sent on every frame of the last run.
+        """
+        df = self.measurements
+        controls = []
+        for steer, throttle, brake in zip(df['steer'], df['throttle'], df['brake']):
+            control = VehicleControl()
+            control.steer = steer
+            control.throttle = throttle
+            control.brake = brake
+            controls.append(control)
+        return controls
+
+    def close(self):
+        """
+        closes the connection kept to CARLA and stops the adversary server,
+        if any.
+        """
+        if self.session is not None:
+            self.session.disconnect()
+        if self.adversary_server is not None:
+            self.adversary_server.stop()
+
     def update_csv_file(self):
         """
         updates csv file name with new parameters including experiment name
@@ -160,7 +368,7 @@ class CarlaEnv:
         """
         returns the sum of steering angles over all frames for the last run.
         """
-        df = pd.read_csv(self.csv_file)
+        df = self.measurements
         steersum = df['steer'].sum()
         return steersum
 
@@ -169,7 +377,7 @@ class CarlaEnv:
         returns a numpy array containing the percentage of the vehicle that was
         offroad for each frame.
         """
-        df = pd.read_csv(self.csv_file)
+        df = self.measurements
         return df['intersection_offroad']
 
     def get_intersection_otherlane(self):
@@ -177,7 +385,7 @@ class CarlaEnv:
         returns a numpy array containing the percentage of the vehicle that was
         in the otherlane for each frame.
         """
-        df = pd.read_csv(self.csv_file)
+        df = self.measurements
         return df['intersection_otherlane']
 
     def get_collision_other(self):
@@ -187,14 +395,14 @@ class CarlaEnv:
         by CARLA are accumulated over the frames so this number may be quite
         large toward the end of the array.
         """
-        df = pd.read_csv(self.csv_file)
+        df = self.measurements
         return df['collision_other']
 
     def get_steer_gradient(self):
         """
         return a numpy array of the gradient of the steering angles over all frames
         """
-        df = pd.read_csv(self.csv_file)
+        df = self.measurements
         steergrad = np.gradient(df['steer'])
         return steergrad
 
@@ -202,7 +410,7 @@ class CarlaEnv:
         """
         return a numpy array of the steering angles over all frames
         """
-        df = pd.read_csv(self.csv_file)
+        df = self.measurements
         steer = df['steer']
         return steer
 
@@ -211,7 +419,7 @@ class CarlaEnv:
         return numpy array of x and y GPS coordinates of the agent over
         an episode
         """
-        df = pd.read_csv(self.csv_file)
+        df = self.measurements
         x, y = df['pos_x'], df['pos_y']
         return x, y
 
@@ -220,7 +428,7 @@ class CarlaEnv:
         Get infraction information including a weighted sum of otherlane and
         offroad violations and collisions.
         """
-        df = pd.read_csv(self.csv_file)
+        df = self.measurements
         c1, c2, c3 = 1, 1, 0.1 # some weighting factors because collision is in terms of intensity
         infraction = df['intersection_otherlane'].mean() * c1 + \
                     df['intersection_offroad'].sum() * c2 + \
@@ -233,7 +441,7 @@ class CarlaEnv:
         scenario
         """
         self.iterations = 1
-        self.experiment_name = experiment_name
+        self.experiment_name = self.log_prefix + experiment_name
         self.counter = 0 # counter if more than 1 experiments are run
 
         # defines what kinds of experiments are going to be run
@@ -241,19 +449,18 @@ class CarlaEnv:
                             self.weather, self.iterations, self.scene)
 
         # load the adversary generator
-        self.adversary = AdversaryGenerator(self.town)
+        self.adversary = AdversaryGenerator(self.town, server=self.adversary_server)
 
         self.log_dir = '_benchmarks_results/' + self.town + '/'
         self.update_csv_file()
         # runs the experiment for the baseline case (no attack)
-        run_driving_benchmark(self.agent, self.experiment_suite,
-                            log_name=self.experiment_name, city_name=self.town,
-                            port=self.port, save_images=self.save_images)
+        self.run_benchmark()
 
         # some metrics that are collected
         self.baseline_steer_grad = self.get_steer_gradient()
         self.baseline_steer = self.get_steer()
         self.positions = self.get_xy()
+        self.baseline_controls = self.get_controls()
 
 if __name__ == "__main__":
     env = CarlaEnv()
@@ -0,0 +1,155 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from carla.tcp import TCPConnectionError
+from carla_env import CarlaEnv
+from imitation.batched_inference import BatchedAgent, InferenceServer
+
+# the port the packaged CARLA build loads the adversaries from
+CARLA_ADVERSARY_PORT = 8000
+
+
+class EvaluationPool(object):
+    def __init__(self, num_servers, base_port=2000, port_step=3,
+                 adversary_ports=None, agent=None, max_retries=3,
+                 connection_retries=1, batched_inference=False, **env_kwargs):
+        """
+        Evaluates adversaries on several CARLA servers at the same time, one
+        CarlaEnv per server. Server i listens on base_port + i * port_step
+        and loads its adversaries from the AdversaryServer of the pool on
+        adversary_ports[i].
+        The packaged CARLA build always loads the adversary from port 8000,
+        which cannot be changed without repackaging it, so every instance
+        would read the adversary of the first one: adversary_ports defaults
+        to [8000] and must be given, one port per instance, to run more than
+        one server (with CARLA builds patched to read them).
+        All the environments share one agent: the given one, or the imitation
+        learning model loaded by the first environment. The other keyword
+        arguments are given to every CarlaEnv (town, task, scene, weather,
+        cache_results, persistent_connection...).
+        With batched_inference, the agent runs the frames of the servers in
+        batches through an InferenceServer once the baselines are run (the
+        agent must have preprocess and predict_batch, as ImitationLearning).
+        Each environment starts a run again connection_retries times when
+        its connection to CARLA fails (see CarlaEnv), then the evaluation
+        fails with TCPConnectionError and is retried on the next idle
+        server, up to max_retries times.
+        Each environment receives the frames of its server into its own
+        tcp.BufferPool.
+        """
+        if adversary_ports is None:
+            if num_servers > 1:
+                raise ValueError('CARLA loads the adversaries from port {}, {} servers need '
+                                 'builds reading one port each, given as adversary_ports'.format(
+                                     CARLA_ADVERSARY_PORT, num_servers))
+            adversary_ports = [CARLA_ADVERSARY_PORT]
+        if len(adversary_ports) != num_servers:
+            raise ValueError('expected {} adversary ports, got {}'.format(
+                num_servers, len(adversary_ports)))
+
+        self.num_servers = num_servers
+        self.max_retries = max_retries
+        self.envs = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._busy_time = [0.0] * num_servers
+        self._evaluations = [0] * num_servers
+        self._failures = [0] * num_servers
+
+        self._executor = ThreadPoolExecutor(max_workers=num_servers)
+
+        def make_env(index, agent):
+            # the baseline of the server is run when its environment is created
+            return CarlaEnv(port=base_port + index * port_step,
+                            adversary_port=adversary_ports[index],
+                            agent=agent, log_prefix='server{}_'.format(index),
+                            connection_retries=connection_retries,
+                            **env_kwargs)
+
+        # the first environment loads the agent if none is given
+        self.envs.append(make_env(0, agent))
+        agent = self.envs[0].agent
+        futures = [self._executor.submit(make_env, index, agent)
+                   for index in range(1, num_servers)]
+        self.envs.extend(future.result() for future in futures)
+        self.inference_server = None
+        if batched_inference:
+            self.inference_server = InferenceServer(agent, max_batch_size=num_servers).start()
+            agent = BatchedAgent(self.inference_server)
+            for env in self.envs:
+                env.agent = agent
+        for index in range(num_servers):
+            self._idle.put(index)
+        self._start_time = time.time()
+
+    def submit(self, adversary_parameters):
+        """
+        Schedules the evaluation of the adversary on the next idle server.
+        Returns a Future of the metrics returned by CarlaEnv.step.
+        """
+        return self._executor.submit(self._evaluate, adversary_parameters)
+
+    def evaluate(self, adversary_parameters_list):
+        """
+        Evaluates a batch of adversaries on the servers of the pool and
+        returns their metrics, in the same order.
+        """
+        futures = [self.submit(params) for params in adversary_parameters_list]
+        return [future.result() for future in futures]
+
+    def stats(self):
+        """
+        Returns a list with the number of evaluations, failures, busy seconds
+        and utilization (fraction of the time the pool has been up that the
+        server was running an evaluation) of each server.
+        """
+        elapsed = time.time() - self._start_time
+        with self._lock:
+            return [{'port': env.port,
+                     'evaluations': self._evaluations[index],
+                     'failures': self._failures[index],
+                     'busy': self._busy_time[index],
+                     'utilization': self._busy_time[index] / elapsed if elapsed > 0 else 0.0}
+                    for index, env in enumerate(self.envs)]
+
+    def close(self):
+        """
+        waits for the evaluations scheduled and closes the environments.
+        """
+        self._executor.shutdown(wait=True)
+        for env in self.envs:
+            env.close()
+        if self.inference_server is not None:
+            self.inference_server.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _evaluate(self, adversary_parameters):
+        attempt = 0
+        while True:
+            index = self._idle.get()
+            start = time.time()
+            try:
+                metrics = self.envs[index].step(adversary_parameters)
+            except TCPConnectionError as error:
+                attempt += 1
+                with self._lock:
+                    self._failures[index] += 1
+                    self._busy_time[index] += time.time() - start
+                logging.error('server %d failed (attempt %d): %s', index, attempt, error)
+                if attempt > self.max_retries:
+                    raise
+                continue
+            finally:
+                self._idle.put(index)
+            with self._lock:
+                self._evaluations[index] += 1
+                self._busy_time[index] += time.time() - start
+            return metrics
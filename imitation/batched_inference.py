@@ -0,0 +1,132 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from carla.agent import Agent
+
+
+class InferenceServer(object):
+    def __init__(self, model, max_batch_size=8, max_latency=0.005):
+        """
+        Runs the model of an agent on the frames of several episodes running
+        at the same time (e.g. the environments of an EvaluationPool), in
+        batches: a thread collects the frames submitted until max_batch_size
+        are waiting or the first one waited max_latency seconds, runs them
+        through model.predict_batch in one forward pass and hands each
+        control back to its episode.
+        The model must have preprocess(image) and
+        predict_batch(image_inputs, speeds, directions), as ImitationLearning.
+        stop() serves the frames already submitted, the frames submitted
+        while the server is not running fail with a RuntimeError.
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.batches = 0
+        self.frames = 0
+        self._requests = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._serve)
+                self._thread.daemon = True
+                self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._requests.put(None)
+        # the frames submitted before are served first
+        thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def submit(self, image, speed, direction):
+        """
+        Returns a Future of the control for the camera image, forward speed
+        and planner command of a frame. The image is preprocessed by the
+        calling thread.
+        """
+        future = Future()
+        image_input = self.model.preprocess(image)
+        with self._lock:
+            if self._thread is None:
+                future.set_exception(RuntimeError('the inference server is not running'))
+            else:
+                self._requests.put((image_input, speed, direction, future))
+        return future
+
+    def stats(self):
+        """
+        Returns the number of batches run, frames served and mean batch size.
+        """
+        return {'batches': self.batches, 'frames': self.frames,
+                'mean_batch_size': self.frames / self.batches if self.batches else 0.0}
+
+    def _serve(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.time() + self.max_latency
+            stop = False
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.time()
+                try:
+                    request = self._requests.get(timeout=timeout) if timeout > 0 \
+                        else self._requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch):
+        image_inputs, speeds, directions, futures = zip(*batch)
+        try:
+            controls = self.model.predict_batch(image_inputs, speeds, directions)
+        except Exception as error:
+            logging.error('batched inference failed: %s', error)
+            for future in futures:
+                future.set_exception(error)
+            return
+        self.batches += 1
+        self.frames += len(batch)
+        for future, control in zip(futures, controls):
+            future.set_result(control)
+
+
+class BatchedAgent(Agent):
+    """
+    Agent running its steps through an InferenceServer, to be shared by the
+    environments whose frames are batched together.
+    """
+
+    def __init__(self, server):
+        super(BatchedAgent, self).__init__()
+        self.server = server
+        # the result cache keys the metrics by the settings of the model
+        self.checkpoint_path = getattr(server.model, 'checkpoint_path', None)
+        self.preprocessing = getattr(server.model, 'preprocessing', None)
+
+    def run_step(self, measurements, sensor_data, directions, target):
+        return self.server.submit(sensor_data['CameraRGB'],
+                                  measurements.player_measurements.forward_speed,
+                                  directions).result()
@@ -0,0 +1,124 @@
+"""
+Inference graph of the imitation learning model, frozen from its checkpoint.
+
+ImitationLearning builds the training graph (batch norms, dropout fed with
+keep probabilities of 1) and restores the checkpoint into it on every start.
+export_frozen_graph writes the restored weights once as constants of a graph
+with the batch norms folded into the convolutions and no dropout, which
+FrozenImitationLearning loads instead (CarlaEnv with frozen_graph=True).
+
+Export from the repository root with:
+    python -m imitation.frozen_graph [--output imitation/model/frozen_inference_graph.pb]
+"""
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import os
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+from carla.agent import Agent
+from imitation.imitation_learning import ImitationLearning, SPEED_BRANCH
+from imitation.imitation_learning_network import fold_batch_norms, load_imitation_learning_network
+
+FROZEN_GRAPH_PATH = os.path.join(os.path.dirname(__file__), 'model', 'frozen_inference_graph.pb')
+
+INPUT_IMAGE = 'input_image'
+INPUT_SPEED = 'input_speed'
+OUTPUT_BRANCH = 'branch_{}'
+
+
+def export_frozen_graph(agent, path=FROZEN_GRAPH_PATH):
+    """
+    Writes the network of an ImitationLearning agent, with the weights of
+    its restored checkpoint, as a frozen inference graph.
+    """
+    weights = fold_batch_norms(agent._sess.run(agent._variables))
+
+    graph = tf.Graph()
+    with graph.as_default():
+        input_images = tf.placeholder(tf.float32, shape=[None] + list(agent._image_size),
+                                      name=INPUT_IMAGE)
+        input_speed = tf.placeholder(tf.float32, shape=[None, 1], name=INPUT_SPEED)
+        # the network does not use the control input
+        branches = load_imitation_learning_network(input_images, [None, input_speed],
+                                                   agent._image_size, None, weights=weights)
+        outputs = [tf.identity(branch, name=OUTPUT_BRANCH.format(index))
+                   for index, branch in enumerate(branches)]
+
+    graph_def = tf.graph_util.extract_sub_graph(graph.as_graph_def(),
+                                                [output.op.name for output in outputs])
+    with tf.gfile.GFile(path, 'wb') as graph_file:
+        graph_file.write(graph_def.SerializeToString())
+    return graph_def
+
+
+class FrozenImitationLearning(ImitationLearning):
+
+    def __init__(self, city_name, avoid_stopping, graph_path=FROZEN_GRAPH_PATH,
+                 gpu_num=0, memory_fraction=0.25, image_cut=[115, 510], preprocessing='pil'):
+        """
+        ImitationLearning running the frozen graph written by
+        export_frozen_graph, with the same inputs and controls.
+        """
+        Agent.__init__(self)
+        self._image_size = (88, 200, 3)
+        self._avoid_stopping = avoid_stopping
+        self._image_cut = image_cut
+        self.preprocessing = preprocessing
+        self._buffers = threading.local()
+
+        with tf.gfile.GFile(graph_path, 'rb') as graph_file:
+            serialized_graph = graph_file.read()
+        graph_def = tf.GraphDef()
+        graph_def.ParseFromString(serialized_graph)
+
+        graph = tf.Graph()
+        self._sess, tf_device = self._create_session(gpu_num, memory_fraction, graph=graph)
+        with graph.as_default(), tf.device(tf_device):
+            tf.import_graph_def(graph_def, name='')
+
+        self._input_images = graph.get_tensor_by_name(INPUT_IMAGE + ':0')
+        self._input_data = [None, graph.get_tensor_by_name(INPUT_SPEED + ':0')]
+        self._dout = None
+        self._network_tensor = [graph.get_tensor_by_name(OUTPUT_BRANCH.format(index) + ':0')
+                                for index in range(SPEED_BRANCH + 1)]
+        # the result cache keys the metrics by the model they were run with,
+        # the digest changes with the checkpoint the graph was exported from
+        self.checkpoint_path = 'frozen_graph:' + hashlib.sha1(serialized_graph).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=FROZEN_GRAPH_PATH)
+    parser.add_argument('--gpu', type=int, default=0)
+    parser.add_argument('--frames', type=int, default=32,
+                        help='random frames the outputs of both graphs are compared on')
+    args = parser.parse_args()
+
+    agent = ImitationLearning('Town01', avoid_stopping=True, gpu_num=args.gpu)
+    if agent.checkpoint_path is None:
+        raise RuntimeError('no checkpoint to export in ' + agent._models_path)
+    graph_def = export_frozen_graph(agent, args.output)
+    print('Wrote {} nodes to {}'.format(len(graph_def.node), args.output))
+
+    frozen = FrozenImitationLearning('Town01', avoid_stopping=True, graph_path=args.output,
+                                     gpu_num=args.gpu)
+    rng = np.random.RandomState(0)
+    images = rng.rand(args.frames, *agent._image_size).astype(np.float32)
+    speeds = rng.uniform(0, 10, (args.frames, 1)) / 25.0
+    outputs = agent._sess.run(agent._network_tensor, feed_dict=agent._feed_dict(images, speeds))
+    frozen_outputs = frozen._sess.run(frozen._network_tensor,
+                                      feed_dict=frozen._feed_dict(images, speeds))
+    print('Largest difference of the outputs: {:g}'.format(
+        max(np.abs(output - frozen_output).max()
+            for output, frozen_output in zip(outputs, frozen_outputs))))
+
+
+if __name__ == '__main__':
+    main()
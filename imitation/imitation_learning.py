@@ -1,8 +1,7 @@
 from __future__ import print_function
 
 import os
-
-import scipy
+import threading
 
 import tensorflow as tf
 import numpy as np
@@ -12,12 +11,23 @@ slim = tf.contrib.slim
 from carla.agent import Agent
 from carla.carla_server_pb2 import Control
 from imitation.imitation_learning_network import load_imitation_learning_network
+from imitation.preprocessing import preprocess_image
+
+# The branch of the network used for each high level command of the planner
+# (0 and 2 follow lane, 3 left, 4 right, 5 straight); any other command
+# uses branch 1, the go straight one. The last branch of the network
+# predicts the speed.
+BRANCH_BY_COMMAND = {0: 0, 2: 0, 3: 2, 4: 3, 5: 1}
+SPEED_BRANCH = 4
 
 class ImitationLearning(Agent):
 
-    def __init__(self, city_name, avoid_stopping, gpu_num=0, memory_fraction=0.25, image_cut=[115, 510]):
+    def __init__(self, city_name, avoid_stopping, gpu_num=0, memory_fraction=0.25, image_cut=[115, 510],
+                 preprocessing='pil'):
         """
         Source: https://github.com/carla-simulator/imitation-learning
+        preprocessing is the resize of the camera images, see
+        imitation/preprocessing.py.
         """
         Agent.__init__(self)
         self._image_size = (88, 200, 3)
@@ -25,18 +35,7 @@ class ImitationLearning(Agent):
 
         self.dropout_vec = [1.0] * 8 + [0.7] * 2 + [0.5] * 2 + [0.5] * 1 + [0.5, 1.] * 5
 
-        config_gpu = tf.ConfigProto()
-
-        if tf.test.is_gpu_available():
-            tf_device = '/gpu:' + str(gpu_num)
-            # GPU to be selected, just take zero , select GPU  with CUDA_VISIBLE_DEVICES
-            # config_gpu.gpu_options.visible_device_list = '0'
-            config_gpu.gpu_options.visible_device_list = str(gpu_num)
-            
-        else:
-            tf_device = '/cpu:0'
-        config_gpu.gpu_options.per_process_gpu_memory_fraction = memory_fraction
-        self._sess = tf.Session(config=config_gpu)
+        self._sess, tf_device = self._create_session(gpu_num, memory_fraction)
 
         with tf.device(tf_device):
             self._input_images = tf.placeholder("float", shape=[None, self._image_size[0],
@@ -54,10 +53,13 @@ class ImitationLearning(Agent):
 
             self._dout = tf.placeholder("float", shape=[len(self.dropout_vec)])
 
+        # the variables of the network by name, see export_frozen_graph
+        self._variables = {}
         with tf.name_scope("Network"):
             self._network_tensor = load_imitation_learning_network(self._input_images,
                                                                    self._input_data,
-                                                                   self._image_size, self._dout)
+                                                                   self._image_size, self._dout,
+                                                                   variables=self._variables)
 
         import os
         dir_path = os.path.dirname(__file__)
@@ -70,6 +72,24 @@ class ImitationLearning(Agent):
         self.load_model()
 
         self._image_cut = image_cut
+        self.preprocessing = preprocessing
+        self._buffers = threading.local()
+
+    @staticmethod
+    def _create_session(gpu_num, memory_fraction, graph=None):
+
+        config_gpu = tf.ConfigProto()
+
+        if tf.test.is_gpu_available():
+            tf_device = '/gpu:' + str(gpu_num)
+            # GPU to be selected, just take zero , select GPU  with CUDA_VISIBLE_DEVICES
+            # config_gpu.gpu_options.visible_device_list = '0'
+            config_gpu.gpu_options.visible_device_list = str(gpu_num)
+
+        else:
+            tf_device = '/cpu:0'
+        config_gpu.gpu_options.per_process_gpu_memory_fraction = memory_fraction
+        return tf.Session(graph=graph, config=config_gpu), tf_device
 
     def load_model(self):
 
@@ -84,30 +104,77 @@ class ImitationLearning(Agent):
         if ckpt:
             print('Restoring from ', ckpt.model_checkpoint_path)
             saver.restore(self._sess, ckpt.model_checkpoint_path)
+            self.checkpoint_path = ckpt.model_checkpoint_path
         else:
             ckpt = 0
+            self.checkpoint_path = None
 
         return ckpt
 
     def run_step(self, measurements, sensor_data, directions, target):
 
-        control = self._compute_action(sensor_data['CameraRGB'].data,
+        control = self._compute_action(sensor_data['CameraRGB'],
                                        measurements.player_measurements.forward_speed, directions)
 
         return control
 
-    def _compute_action(self, rgb_image, speed, direction=None):
-
-        rgb_image = rgb_image[self._image_cut[0]:self._image_cut[1], :]
+    def preprocess(self, image, out=None):
+        """
+        The network input for a camera image (a carla.sensor.Image or an RGB
+        array): cut, resized and scaled to [0, 1], see preprocess_image.
+        """
+        return preprocess_image(image, self._image_cut, self._image_size[:2], out=out,
+                                method=self.preprocessing)
 
-        image_input = scipy.misc.imresize(rgb_image, [self._image_size[0],
-                                                      self._image_size[1]])
+    def predict_batch(self, image_inputs, speeds, directions):
+        """
+        Computes the controls of several frames, e.g. of different episodes,
+        in a single forward pass. Takes the preprocessed images and returns
+        the same controls _compute_action would for each frame.
+        """
+        branches = self._network_tensor
+        speed_inputs = np.array(speeds).reshape((-1, 1)) / 25.0
+        feedDict = self._feed_dict(np.stack(image_inputs), speed_inputs)
 
-        image_input = image_input.astype(np.float32)
-        image_input = np.multiply(image_input, 1.0 / 255.0)
+        # Only the branches of the commands in the batch are computed
+        branch_indices = [BRANCH_BY_COMMAND.get(direction, 1) for direction in directions]
+        fetches = sorted(set(branch_indices))
+        if self._avoid_stopping:
+            fetches.append(SPEED_BRANCH)
+        outputs = dict(zip(fetches, self._sess.run([branches[i] for i in fetches],
+                                                   feed_dict=feedDict)))
+
+        controls = []
+        for row, (branch, speed) in enumerate(zip(branch_indices, speeds)):
+            steer, acc, brake = outputs[branch][row][:3]
+            if self._avoid_stopping:
+                acc, brake = self._avoid_stopping_control(acc, brake, speed_inputs[row][0],
+                                                          outputs[SPEED_BRANCH][row][0])
+            controls.append(self._make_control(steer, acc, brake, speed))
+        return controls
+
+    def _feed_dict(self, image_input, speed):
+        feedDict = {self._input_images: image_input, self._input_data[1]: speed}
+        # the frozen graph has no dropout (see imitation/frozen_graph.py)
+        if self._dout is not None:
+            feedDict[self._dout] = [1] * len(self.dropout_vec)
+        return feedDict
+
+    def _compute_action(self, image, speed, direction=None):
+
+        # the input is written to a buffer of the thread, the agent may be
+        # shared by environments running at the same time
+        image_input = getattr(self._buffers, 'image_input', None)
+        if image_input is None:
+            image_input = self._buffers.image_input = np.empty(self._image_size, dtype=np.float32)
+        image_input = self.preprocess(image, out=image_input)
 
         steer, acc, brake = self._control_function(image_input, speed, direction, self._sess)
 
+        return self._make_control(steer, acc, brake, speed)
+
+    def _make_control(self, steer, acc, brake, speed):
+
         # This a bit biased, but is to avoid fake breaking
         if brake < 0.1:
             brake = 0.0
@@ -132,9 +199,6 @@ class ImitationLearning(Agent):
     def _control_function(self, image_input, speed, control_input, sess):
 
         branches = self._network_tensor
-        x = self._input_images
-        dout = self._dout
-        input_speed = self._input_data[1]
 
         image_input = image_input.reshape(
             (1, self._image_size[0], self._image_size[1], self._image_size[2]))
@@ -144,19 +208,17 @@ class ImitationLearning(Agent):
 
         speed = speed.reshape((1, 1))
 
-        if control_input == 2 or control_input == 0.0:
-            all_net = branches[0]
-        elif control_input == 3:
-            all_net = branches[2]
-        elif control_input == 4:
-            all_net = branches[3]
-        else:
-            all_net = branches[1]
+        all_net = branches[BRANCH_BY_COMMAND.get(control_input, 1)]
 
-        feedDict = {x: image_input, input_speed: speed, dout: [1] * len(self.dropout_vec)}
+        feedDict = self._feed_dict(image_input, speed)
 
-        output_all = sess.run(all_net, feed_dict=feedDict)
-        output_all = output_all
+        # The control and speed predictions are fetched in the same run, so
+        # the shared convolutional layers are only computed once
+        if self._avoid_stopping:
+            output_all, predicted_speed = sess.run([all_net, branches[SPEED_BRANCH]],
+                                                   feed_dict=feedDict)
+        else:
+            output_all = sess.run(all_net, feed_dict=feedDict)
         predicted_steers = (output_all[0][0])
 
         predicted_acc = (output_all[0][1])
@@ -164,19 +226,25 @@ class ImitationLearning(Agent):
         predicted_brake = (output_all[0][2])
 
         if self._avoid_stopping:
-            predicted_speed = sess.run(branches[4], feed_dict=feedDict)
-            predicted_speed = predicted_speed[0][0]
-            real_speed = speed * 25.0
+            predicted_acc, predicted_brake = self._avoid_stopping_control(
+                predicted_acc, predicted_brake, speed[0][0], predicted_speed[0][0])
 
-            real_predicted = predicted_speed * 25.0
-            if real_speed < 2.0 and real_predicted > 3.0:
-                # If (Car Stooped) and
-                #  ( It should not have stopped, use the speed prediction branch for that)
+        return predicted_steers, predicted_acc, predicted_brake
 
-                predicted_acc = 1 * (5.6 / 25.0 - speed) + predicted_acc
+    def _avoid_stopping_control(self, predicted_acc, predicted_brake, speed, predicted_speed):
+        """
+        The acceleration and brake, corrected if the car stopped while the
+        speed branch predicts it should be moving. Speeds are normalized.
+        """
+        real_speed = speed * 25.0
 
-                predicted_brake = 0.0
+        real_predicted = predicted_speed * 25.0
+        if real_speed < 2.0 and real_predicted > 3.0:
+            # If (Car Stooped) and
+            #  ( It should not have stopped, use the speed prediction branch for that)
 
-                predicted_acc = predicted_acc[0][0]
+            predicted_acc = 1 * (5.6 / 25.0 - speed) + predicted_acc
 
-        return predicted_steers, predicted_acc, predicted_brake
+            predicted_brake = 0.0
+
+        return predicted_acc, predicted_brake
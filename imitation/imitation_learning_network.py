@@ -4,6 +4,10 @@ import numpy as np
 
 import tensorflow as tf
 
+# epsilon of tf.contrib.layers.batch_norm, which the network uses with its
+# other defaults (center, no scale)
+BN_EPSILON = 0.001
+
 
 def weight_ones(shape, name):
     initial = tf.constant(1.0, shape=shape, name=name)
@@ -23,9 +27,12 @@ def bias_variable(shape, name):
 
 class Network(object):
 
-    def __init__(self, dropout, image_shape):
+    def __init__(self, dropout, image_shape, variables=None, weights=None):
         """ We put a few counters to see how many times we called each function """
         self._dropout_vec = dropout
+        # the variables of the network by name, see load_imitation_learning_network
+        self._variables = variables if variables is not None else {}
+        self._frozen_weights = weights
         self._image_shape = image_shape
         self._count_conv = 0
         self._count_pool = 0
@@ -48,8 +55,8 @@ class Network(object):
         filters_in = x.get_shape()[-1]
         shape = [kernel_size, kernel_size, filters_in, output_size]
 
-        weights = weight_xavi_init(shape, 'W_c_' + str(self._count_conv))
-        bias = bias_variable([output_size], name='B_c_' + str(self._count_conv))
+        weights = self._weight('W_c_' + str(self._count_conv), weight_xavi_init, shape)
+        bias = self._weight('B_c_' + str(self._count_conv), bias_variable, [output_size])
 
         self._weights['W_conv' + str(self._count_conv)] = weights
         self._conv_kernels.append(kernel_size)
@@ -70,9 +77,16 @@ class Network(object):
 
     def bn(self, x):
         self._count_bn += 1
-        return tf.contrib.layers.batch_norm(x, is_training=False,
-                                            updates_collections=None,
-                                            scope='bn' + str(self._count_bn))
+        scope = 'bn' + str(self._count_bn)
+        if self._frozen_weights is not None:
+            # folded into the convolution before it, see fold_batch_norms
+            return x
+        x = tf.contrib.layers.batch_norm(x, is_training=False,
+                                         updates_collections=None,
+                                         scope=scope)
+        for variable in tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope=scope + '/'):
+            self._variables[scope + '/' + variable.op.name.split('/')[-1]] = variable
+        return x
 
     def activation(self, x):
         self._count_activations += 1
@@ -81,6 +95,9 @@ class Network(object):
     def dropout(self, x):
         # print("Dropout", self._count_dropouts)
         self._count_dropouts += 1
+        if self._frozen_weights is not None:
+            # all the keep probabilities are 1 when driving
+            return x
         output = tf.nn.dropout(x, self._dropout_vec[self._count_dropouts - 1],
                                name='dropout' + str(self._count_dropouts))
 
@@ -91,11 +108,19 @@ class Network(object):
         filters_in = x.get_shape()[-1]
         shape = [filters_in, output_size]
 
-        weights = weight_xavi_init(shape, 'W_f_' + str(self._count_fc))
-        bias = bias_variable([output_size], name='B_f_' + str(self._count_fc))
+        weights = self._weight('W_f_' + str(self._count_fc), weight_xavi_init, shape)
+        bias = self._weight('B_f_' + str(self._count_fc), bias_variable, [output_size])
 
         return tf.nn.xw_plus_b(x, weights, bias, name='fc_' + str(self._count_fc))
 
+    def _weight(self, name, initializer, shape):
+        """ A new variable, or a constant if the network is built from frozen weights """
+        if self._frozen_weights is not None:
+            return tf.constant(self._frozen_weights[name], name=name)
+        variable = initializer(shape, name=name)
+        self._variables[name] = variable
+        return variable
+
     def conv_block(self, x, kernel_size, stride, output_size, padding_in='SAME'):
         # print(" === Conv", self._count_conv, "  :  ", kernel_size, stride, output_size)
         with tf.name_scope("conv_block" + str(self._count_conv)):
@@ -120,12 +145,37 @@ class Network(object):
         return self._features
 
 
-def load_imitation_learning_network(input_image, input_data, input_size, dropout):
+def fold_batch_norms(values, epsilon=BN_EPSILON):
+    """
+    Takes the values of the variables of a network (see
+    load_imitation_learning_network) and returns the weights of the
+    convolutions with the batch norm after each of them folded in.
+    """
+    weights = dict(values)
+    count = 1
+    while 'W_c_' + str(count) in values:
+        bn = 'bn' + str(count) + '/'
+        scale = values.get(bn + 'gamma', 1.0) / np.sqrt(values[bn + 'moving_variance'] + epsilon)
+        weights['W_c_' + str(count)] = values['W_c_' + str(count)] * scale
+        weights['B_c_' + str(count)] = ((values['B_c_' + str(count)] - values[bn + 'moving_mean'])
+                                        * scale + values[bn + 'beta'])
+        count += 1
+    return weights
+
+
+def load_imitation_learning_network(input_image, input_data, input_size, dropout,
+                                    variables=None, weights=None):
+    """
+    If variables is given, the variables of the network are added to it by
+    name (W_c_1, bn1/moving_mean, ...). If weights is given, the network is
+    built for inference from their values instead: constants, with the batch
+    norms already folded into them (see fold_batch_norms) and no dropout.
+    """
     branches = []
 
     x = input_image
 
-    network_manager = Network(dropout, tf.shape(x))
+    network_manager = Network(dropout, tf.shape(x), variables=variables, weights=weights)
 
     """conv1"""  # kernel sz, stride, num feature maps
     xc = network_manager.conv_block(x, 5, 2, 32, padding_in='VALID')
@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+from PIL import Image as PILImage
+
+from carla import sensor
+
+# 'pil' is the bilinear resize of PIL that scipy.misc.imresize did, which the
+# model was run with, and gives the same input. 'cv2' resizes with cv2 area
+# interpolation, faster but about 1.7 levels of 255 away from it on average
+# (see benchmarks/preprocess_benchmark.py)
+METHODS = ('pil', 'cv2')
+
+SCALE = np.float32(1.0 / 255.0)
+
+
+def preprocess_image(image, image_cut=(115, 510), size=(88, 200), out=None, method='pil'):
+    """
+    The network input for a camera frame: the rows image_cut[0] to
+    image_cut[1] resized to size (height, width) with method (see METHODS),
+    in RGB scaled to [0, 1], as float32, written to out if given.
+    image is a carla.sensor.Image, which is resized straight from its BGRA
+    buffer, or an RGB array such as Image.data.
+    """
+    if method not in METHODS:
+        raise ValueError('unknown preprocessing {}, expected one of {}'.format(
+            method, ', '.join(METHODS)))
+    bgra = isinstance(image, sensor.Image)
+    if bgra:
+        array = np.frombuffer(image.raw_data, dtype=np.uint8)
+        array = array.reshape((image.height, image.width, 4))[image_cut[0]:image_cut[1]]
+    else:
+        # neither takes the reversed channels of to_rgb_array
+        array = np.ascontiguousarray(image[image_cut[0]:image_cut[1]])
+
+    if method == 'pil':
+        if bgra:
+            pil_image = PILImage.frombuffer('RGB', (array.shape[1], array.shape[0]), array,
+                                            'raw', 'BGRX', 0, 1)
+        else:
+            pil_image = PILImage.fromarray(array)
+        small = np.asarray(pil_image.resize((size[1], size[0]), PILImage.BILINEAR))
+    else:
+        small = cv2.resize(array, (size[1], size[0]), interpolation=cv2.INTER_AREA)
+        if bgra:
+            small = small[:, :, 2::-1]
+    if out is None:
+        out = np.empty((size[0], size[1], 3), dtype=np.float32)
+    return np.multiply(small, SCALE, out=out)
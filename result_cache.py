@@ -0,0 +1,90 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from adversary_generator import params_key, quantize_params
+
+
+def _numbers_as_floats(key):
+    """
+    Spells every number in key as a float, so that e.g. a rotation of 20 and
+    one of 20.0 give the same description.
+    """
+    if isinstance(key, tuple):
+        return tuple(_numbers_as_floats(value) for value in key)
+    if isinstance(key, (int, float)) and not isinstance(key, bool):
+        return float(key)
+    return key
+
+
+class ResultCache(object):
+    def __init__(self, path='_benchmarks_results/results_cache.sqlite'):
+        """
+        Persistent cache of the metrics returned by CarlaEnv.step, stored in
+        a SQLite database so it survives between optimization runs.
+        Entries are keyed by everything that determines an episode: the
+        town, task, scene, weather, agent settings and the quantized
+        adversary parameters (see 'make_key'). hits and misses count the
+        lookups done by this process.
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, description TEXT, metrics BLOB, created REAL)')
+
+    @staticmethod
+    def make_key(town, task, scene, weather, agent_settings, adversary_params):
+        """
+        Returns the key under which the metrics of an episode are stored,
+        along with a readable description of it. agent_settings is a
+        dictionary of what changes the episodes the agent drives (see
+        CarlaEnv.agent_settings), e.g. its checkpoint.
+        """
+        description = repr(_numbers_as_floats(params_key(quantize_params(
+            (town, task, scene, weather, agent_settings, adversary_params)))))
+        return hashlib.sha1(description.encode()).hexdigest(), description
+
+    def get(self, key):
+        """
+        Returns the metrics stored under key, or None.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT metrics FROM results WHERE key = ?', (key[0],)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def put(self, key, metrics):
+        blob = sqlite3.Binary(pickle.dumps(metrics, protocol=2))
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                (key[0], key[1], blob, time.time()))
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM results')
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
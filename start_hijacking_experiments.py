@@ -1,17 +1,23 @@
 import os
 import json
+import logging
 import time
 import numpy as np
 import pandas as pd
 from carla_env import CarlaEnv
+from carla.driving_benchmark.early_stop import FrameBudget
 from bayes_opt import UtilityFunction
 from bayes_opt import BayesianOptimization
-from carla.driving_benchmark import run_driving_benchmark
+from batch_optimizer import BatchBayesianOptimization
+from evaluation_pool import EvaluationPool
 from carla.driving_benchmark.experiment_suites import AdversarySuite
 
 with open('config/hijacking_params.json') as json_file:
     args = json.load(json_file)
 
+# the batch optimizer logs its iterations
+logging.basicConfig(format='%(message)s', level=logging.INFO)
+
 baseline_task  = args['baseline_task']
 target_task    = args['target_task']
 baseline_scene = args['baseline_scene']
@@ -25,6 +31,18 @@ search_points         = args['search_points']
 acquisition_function = args['acquisition_function']
 
 overwrite_experiment = args['overwrite_experiment']
+cache_results        = args.get('cache_results', False)
+persistent_connection = args.get('persistent_connection', False)
+num_servers          = args.get('num_servers', 1)
+batch_strategy       = args.get('batch_strategy', 'constant_liar')
+prefix_frames        = args.get('prefix_frames', 0)
+batched_inference    = args.get('batched_inference', False)
+action_repeat        = args.get('action_repeat', 1)
+repeat_threshold     = args.get('repeat_threshold', None)
+preprocessing        = args.get('preprocessing', 'pil')
+frozen_graph         = args.get('frozen_graph', False)
+adversary_ports      = args.get('adversary_ports', None)
+early_stop           = args.get('early_stop', False)
 
 directory_to_save = './_benchmarks_results/{}'.format(curr_town)
 if os.path.exists(directory_to_save):
@@ -38,27 +56,61 @@ if os.path.exists(directory_to_save):
 
 os.system("mkdir -p _benchmarks_results")
 print("Loading the Imitition Network and performing one simulation run for the target path..")
-env = CarlaEnv(task=target_task, town=curr_town, scene=target_scene,
-               port=curr_port, save_images=False, gpu_num=curr_gpu)
+if num_servers > 1:
+    # one environment per CARLA server on ports curr_port, curr_port + 3, ...
+    pool = EvaluationPool(num_servers, base_port=curr_port,
+                          adversary_ports=adversary_ports,
+                          task=target_task, town=curr_town, scene=target_scene,
+                          save_images=False, gpu_num=curr_gpu,
+                          cache_results=cache_results,
+                          persistent_connection=persistent_connection,
+                          prefix_frames=prefix_frames,
+                          batched_inference=batched_inference,
+                          action_repeat=action_repeat,
+                          repeat_threshold=repeat_threshold,
+                          preprocessing=preprocessing,
+                          frozen_graph=frozen_graph)
+    env = pool.envs[0]
+    evaluate = lambda dict_params: pool.submit(dict_params).result()
+else:
+    env = CarlaEnv(task=target_task, town=curr_town, scene=target_scene,
+                   port=curr_port, save_images=False, gpu_num=curr_gpu,
+                   cache_results=cache_results,
+                   persistent_connection=persistent_connection,
+                   prefix_frames=prefix_frames,
+                   action_repeat=action_repeat,
+                   repeat_threshold=repeat_threshold,
+                   preprocessing=preprocessing,
+                   frozen_graph=frozen_graph)
+    evaluate = env.step
 print("Complete.")
 
 targetSteer       = env.get_steer()                  # get the steering angles for the target run
 MAX_LEN           = int(len(env.get_steer())*.8)      # set maximum number of frames to 80 percent of target scenario
 targetSteer      = targetSteer[:MAX_LEN]                  # subset steering angles to maximum number of allowed frames
 
-env.task  = baseline_task
-env.scene = baseline_scene
-env.experiment_name = 'baseline'
+# the attacks are run on the baseline task + scene, on every server
+for curr_env in (pool.envs if num_servers > 1 else [env]):
+    curr_env.task  = baseline_task
+    curr_env.scene = baseline_scene
+    curr_env.experiment_name = curr_env.log_prefix + 'baseline'
 
-# reset experiment suite with base task + scene
-env.experiment_suite = AdversarySuite(env.town, env.task, env.weather, env.iterations, env.scene)
+    # reset experiment suite with base task + scene
+    curr_env.experiment_suite = AdversarySuite(curr_env.town, curr_env.task, curr_env.weather,
+                                               curr_env.iterations, curr_env.scene)
 
 # run the baseline simulation
 print("Running the simulation for the baseline path.")
-run_driving_benchmark(env.agent, env.experiment_suite, log_name=env.experiment_name,
-                    city_name=env.town, port=env.port, save_images=False)
+env.run_benchmark()
 print("Complete.")
 baseSteer      = env.get_steer()
+# the attacks replay the prefix of this run, not of the target run
+for curr_env in (pool.envs if num_servers > 1 else [env]):
+    curr_env.baseline_steer = baseSteer
+    curr_env.baseline_controls = env.get_controls()
+    if early_stop:
+        # the frames of the attacks after MAX_LEN are not used by the objective
+        curr_env.early_stop = [FrameBudget(MAX_LEN)]
 MAX_LEN_B      = int(len(baseSteer)*.8)
 baseSteer      = baseSteer[:MAX_LEN_B]
 
@@ -85,7 +137,7 @@ def target(pos1, rot1, pos2=0, rot2=0, width=10, length=200, colorR=0, colorG=0,
     }
 
     # run the simulation with that attack and fetch the data from that run
-    metrics = env.step(dict_params)
+    metrics = evaluate(dict_params)
 
     # calculate the objective function we are trying to maximize
     attackSteer    = metrics['steer'][:MAX_LEN]
@@ -109,5 +161,10 @@ controls = {'pos1': (0, 190),
             'rot2': (0, 179)}
 print("Running the Bayesian Optimizer for {} iterations.".format(str(random_points + search_points)))
 # instantiate the bayesian optimizer
-optimizer = BayesianOptimization(target, controls, random_state=42)
+if num_servers > 1:
+    # the servers of the pool evaluate num_servers points at a time
+    optimizer = BatchBayesianOptimization(target, controls, num_servers,
+                                          strategy=batch_strategy, random_state=42)
+else:
+    optimizer = BayesianOptimization(target, controls, random_state=42)
 optimizer.maximize(init_points=random_points, n_iter=search_points, acq=acquisition_function)
@@ -1,15 +1,22 @@
 import os
 import json
+import logging
 import time
 import numpy as np
 import pandas as pd
 from carla_env import CarlaEnv
+from carla.driving_benchmark.early_stop import FrameBudget
 from bayes_opt import UtilityFunction
 from bayes_opt import BayesianOptimization
+from batch_optimizer import BatchBayesianOptimization
+from evaluation_pool import EvaluationPool
 
 with open('config/infraction_params.json') as json_file:
     args = json.load(json_file)
 
+# the batch optimizer logs its iterations
+logging.basicConfig(format='%(message)s', level=logging.INFO)
+
 # CARLA parameters
 curr_task  = args['task']
 curr_scene = args['scene']
@@ -23,6 +30,18 @@ search_points         = args['search_points']
 acquisition_function = args['acquisition_function']
 
 overwrite_experiment = args['overwrite_experiment']
+cache_results        = args.get('cache_results', False)
+persistent_connection = args.get('persistent_connection', False)
+num_servers          = args.get('num_servers', 1)
+batch_strategy       = args.get('batch_strategy', 'constant_liar')
+prefix_frames        = args.get('prefix_frames', 0)
+batched_inference    = args.get('batched_inference', False)
+action_repeat        = args.get('action_repeat', 1)
+repeat_threshold     = args.get('repeat_threshold', None)
+preprocessing        = args.get('preprocessing', 'pil')
+frozen_graph         = args.get('frozen_graph', False)
+adversary_ports      = args.get('adversary_ports', None)
+early_stop           = args.get('early_stop', False)
 
 directory_to_save = './_benchmarks_results/{}'.format(curr_town)
 if os.path.exists(directory_to_save):
@@ -38,8 +57,33 @@ if os.path.exists(directory_to_save):
 now = time.time()
 print("Loading the Imitition Network and performing one simulation run for the baseline path..")
 os.system("mkdir -p _benchmarks_results")
-env = CarlaEnv(task=curr_task, town='Town01_nemesisA', scene=curr_scene,
-               port=curr_port, save_images=False, gpu_num=curr_gpu)
+if num_servers > 1:
+    # one environment per CARLA server on ports curr_port, curr_port + 3, ...
+    pool = EvaluationPool(num_servers, base_port=curr_port,
+                          adversary_ports=adversary_ports,
+                          task=curr_task, town='Town01_nemesisA', scene=curr_scene,
+                          save_images=False, gpu_num=curr_gpu,
+                          cache_results=cache_results,
+                          persistent_connection=persistent_connection,
+                          prefix_frames=prefix_frames,
+                          batched_inference=batched_inference,
+                          action_repeat=action_repeat,
+                          repeat_threshold=repeat_threshold,
+                          preprocessing=preprocessing,
+                          frozen_graph=frozen_graph)
+    env = pool.envs[0]
+    evaluate = lambda dict_params: pool.submit(dict_params).result()
+else:
+    env = CarlaEnv(task=curr_task, town='Town01_nemesisA', scene=curr_scene,
+                   port=curr_port, save_images=False, gpu_num=curr_gpu,
+                   cache_results=cache_results,
+                   persistent_connection=persistent_connection,
+                   prefix_frames=prefix_frames,
+                   action_repeat=action_repeat,
+                   repeat_threshold=repeat_threshold,
+                   preprocessing=preprocessing,
+                   frozen_graph=frozen_graph)
+    evaluate = env.step
 print("Complete.")
 
 baseSteer     = env.baseline_steer                   # get the steering angles for the baseline run
@@ -47,6 +91,11 @@ MAX_LEN       = int(len(env.baseline_steer)*.8)      # set maximum number of fra
 
 baseSteer     = baseSteer[:MAX_LEN]                  # subset steering angles to maximum number of allowed frames
 
+if early_stop:
+    # the frames of the attacks after MAX_LEN are not used by the objective
+    for curr_env in (pool.envs if num_servers > 1 else [env]):
+        curr_env.early_stop = [FrameBudget(MAX_LEN)]
+
 
 def target(pos1, rot1, pos2=0, rot2=0, width=10, length=200, colorR=0, colorG=0, colorB=0):
     # specify our attack (in this case double black lines) as a dictionary to pass to the CarlaEnv object.
@@ -70,7 +119,7 @@ def target(pos1, rot1, pos2=0, rot2=0, width=10, length=200, colorR=0, colorG=0,
     }
 
     # run the simulation with that attack and fetch the data from that run
-    metrics = env.step(dict_params)
+    metrics = evaluate(dict_params)
 
     # calculate the objective function we are trying to maximize
     attackSteer    = metrics['steer'][:MAX_LEN]
@@ -91,5 +140,10 @@ controls = {'pos1': (0, 190),
 
 print("Running the Bayesian Optimizer for {} iterations.".format(str(random_points + search_points)))
 # instantiate the bayesian optimizer
-optimizer = BayesianOptimization(target, controls, random_state=42)
+if num_servers > 1:
+    # the servers of the pool evaluate num_servers points at a time
+    optimizer = BatchBayesianOptimization(target, controls, num_servers,
+                                          strategy=batch_strategy, random_state=42)
+else:
+    optimizer = BayesianOptimization(target, controls, random_state=42)
 optimizer.maximize(init_points=random_points, n_iter=search_points, acq=acquisition_function)
@@ -0,0 +1,86 @@
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from carla.agent import Agent
+from carla.client import VehicleControl
+from carla.fake_server import FakeCarlaServer
+
+# a two line attack for CarlaEnv.step
+ADVERSARY = {0: {'pos': 100, 'rot': 60, 'width': 10, 'length': 100, 'color': (0, 0, 0, 255)},
+             1: {'pos': 40, 'rot': 20, 'width': 20, 'length': 150, 'color': (0, 0, 0, 255)}}
+
+
+class WobbleAgent(Agent):
+    """Drives ahead, steering with the position, and counts its steps."""
+
+    checkpoint_path = 'wobble'
+
+    def __init__(self):
+        super(WobbleAgent, self).__init__()
+        self.steps = 0
+
+    def run_step(self, measurements, sensor_data, directions, target):
+        self.steps += 1
+        control = VehicleControl()
+        control.throttle = 0.5
+        control.steer = 0.05 * math.sin(measurements.player_measurements.transform.location.x / 5.0)
+        return control
+
+
+@pytest.fixture
+def fake_server():
+    """A FakeCarlaServer of Town01_nemesisA on free ports."""
+    server = FakeCarlaServer('Town01_nemesisA', port=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def fake_servers():
+    """
+    Starts FakeCarlaServers of Town01_nemesisA on consecutive ports, server
+    i on servers[0].port + 3 * i, as EvaluationPool expects.
+    """
+    servers = []
+
+    def start(count):
+        for _ in range(20):
+            started = [FakeCarlaServer('Town01_nemesisA', port=0).start()]
+            try:
+                for index in range(1, count):
+                    started.append(FakeCarlaServer('Town01_nemesisA',
+                                                   port=started[0].port + 3 * index).start())
+            except OSError:
+                for server in started:
+                    server.stop()
+                continue
+            servers.extend(started)
+            return started
+        raise RuntimeError('no free ports for {} fake servers'.format(count))
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def make_env(fake_server, tmp_path, monkeypatch):
+    """Makes CarlaEnvs driven by a WobbleAgent on the fake server, logging to tmp_path."""
+    from carla_env import CarlaEnv
+
+    monkeypatch.chdir(tmp_path)
+    envs = []
+
+    def make_env(**kwargs):
+        kwargs.setdefault('agent', WobbleAgent())
+        envs.append(CarlaEnv(port=fake_server.port, adversary_port=0, **kwargs))
+        return envs[-1]
+
+    yield make_env
+    for env in envs:
+        env.close()
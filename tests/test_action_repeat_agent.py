@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+import carla_env
+from carla.agent import ActionRepeatAgent
+from conftest import ADVERSARY
+
+
+class RecordingRepeatAgent(ActionRepeatAgent):
+    """Records the thumbnail, command and control of every frame it gets."""
+
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        super(RecordingRepeatAgent, self).__init__(*args, **kwargs)
+        self.instances.append(self)
+
+    def reset(self):
+        super(RecordingRepeatAgent, self).reset()
+        self.frames = []
+
+    def run_step(self, measurements, sensor_data, directions, target):
+        control = super(RecordingRepeatAgent, self).run_step(measurements, sensor_data,
+                                                             directions, target)
+        self.frames.append((self._make_thumbnail(sensor_data[self.sensor]), directions,
+                            control.steer))
+        return control
+
+
+@pytest.fixture
+def make_repeat_env(make_env, monkeypatch):
+    monkeypatch.setattr(RecordingRepeatAgent, 'instances', [])
+    monkeypatch.setattr(carla_env, 'ActionRepeatAgent', RecordingRepeatAgent)
+    return make_env
+
+
+def test_control_is_held_for_repeat_frames(make_repeat_env):
+    env = make_repeat_env(action_repeat=4, save_measurements=False)
+    repeat_agent = RecordingRepeatAgent.instances[-1]
+    inferred, frames = repeat_agent.inferred, repeat_agent.frames
+    assert env.agent.steps == sum(inferred) < len(inferred)
+
+    held = 0
+    for index, (_, directions, steer) in enumerate(frames):
+        if index == 0 or directions != frames[index - 1][1]:
+            assert inferred[index]
+        if inferred[index]:
+            held = 0
+        else:
+            held += 1
+            assert held < 4
+            assert steer == frames[index - 1][2]
+
+    # the inferred flags line up with the frames the metrics are read from
+    assert env.inferred == inferred
+    assert len(env.measurements) == len(inferred)
+    np.testing.assert_allclose(env.get_steer(), [steer for _, _, steer in frames], atol=1e-6)
+
+
+def test_image_change_forces_inference(make_repeat_env):
+    threshold = 1.0
+    make_repeat_env(action_repeat=1000, repeat_threshold=threshold, save_measurements=False)
+    repeat_agent = RecordingRepeatAgent.instances[-1]
+    inferred, frames = repeat_agent.inferred, repeat_agent.frames
+
+    forced = 0
+    last = None
+    for index, (thumbnail, directions, _) in enumerate(frames):
+        if index == 0 or directions != frames[index - 1][1]:
+            assert inferred[index]
+        else:
+            changed = np.abs(thumbnail - last).mean() > threshold
+            assert inferred[index] == changed
+            forced += changed
+        if inferred[index]:
+            last = thumbnail
+    assert forced > 0 and not all(inferred)
+
+
+def test_replayed_prefix_is_not_inferred(make_repeat_env):
+    env = make_repeat_env(action_repeat=3, prefix_frames=50, save_measurements=False)
+    env.agent.steps = 0
+    env.step(ADVERSARY)
+    repeat_agent = RecordingRepeatAgent.instances[-1]
+
+    assert len(env.inferred) == len(env.measurements) == 50 + len(repeat_agent.inferred)
+    assert not any(env.inferred[:50])
+    assert env.inferred[50:] == repeat_agent.inferred
+    assert env.agent.steps == sum(env.inferred)
+    np.testing.assert_allclose(env.get_steer()[50:],
+                               [steer for _, _, steer in repeat_agent.frames], atol=1e-6)
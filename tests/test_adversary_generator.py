@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import adversary_generator
+from adversary_generator import AdversaryGenerator
+
+
+def _random_candidates(rng, count, num_lines):
+    return [{line_id: {'pos': int(rng.randint(0, 200)),
+                       'rot': float(rng.uniform(0, 180)),
+                       'width': int(rng.randint(0, 50)),
+                       'length': int(rng.randint(0, 200)),
+                       'color': tuple(int(value) for value in rng.randint(0, 256, 4))}
+             for line_id in range(num_lines)}
+            for _ in range(count)]
+
+
+@pytest.fixture
+def generator(tmp_path):
+    return AdversaryGenerator('test', path=str(tmp_path) + '/', cache_size=0)
+
+
+@pytest.mark.skipif(not adversary_generator.FIXED_POINT_WARP,
+                    reason='the rotations of OpenCV {} are not rasterized in batches, see '
+                           'FIXED_POINT_WARP'.format(adversary_generator.cv2.__version__))
+@pytest.mark.parametrize('seed', range(3))
+def test_batch_multi_lines_equals_multi_lines(generator, seed):
+    candidates = _random_candidates(np.random.RandomState(seed), 100, 2)
+    canvases = generator.batch_multi_lines(generator.lines_to_array(candidates))
+    for adversary_params, canvas in zip(candidates, canvases):
+        generator.multi_lines(adversary_params)
+        np.testing.assert_array_equal(canvas, generator.canvas)
+
+
+def test_batch_rasterizer_on_right_angles(generator, monkeypatch):
+    # right angle rotations move whole pixels, so every version of OpenCV
+    # rotates them exactly and the batch rasterizer runs whatever the version
+    monkeypatch.setattr(adversary_generator, 'FIXED_POINT_WARP', True)
+    rng = np.random.RandomState(0)
+    candidates = _random_candidates(rng, 40, 3)
+    for adversary_params in candidates:
+        for line in adversary_params.values():
+            line['rot'] = float(rng.choice([0, 90, 180, 270]))
+    canvases = generator.batch_multi_lines(generator.lines_to_array(candidates))
+    for adversary_params, canvas in zip(candidates, canvases):
+        expected = np.zeros_like(canvas)
+        for line_id in sorted(adversary_params):
+            line = adversary_params[line_id]
+            expected = generator._draw_line(expected, line['pos'], line['rot'], line['width'],
+                                            line['length'], line['color'])
+        np.testing.assert_array_equal(canvas, expected)
+
+
+def test_batch_multi_lines_fallback(generator, monkeypatch):
+    monkeypatch.setattr(adversary_generator, 'FIXED_POINT_WARP', False)
+    candidates = _random_candidates(np.random.RandomState(0), 10, 3)
+    canvases = generator.batch_multi_lines(generator.lines_to_array(candidates))
+    for adversary_params, canvas in zip(candidates, canvases):
+        generator.multi_lines(adversary_params)
+        np.testing.assert_array_equal(canvas, generator.canvas)
@@ -0,0 +1,73 @@
+import http.client
+
+import cv2
+import numpy as np
+import pytest
+
+from adversary_server import AdversaryServer
+
+PATH = 'adversary/adversary_Town01_nemesisA.png'
+
+
+@pytest.fixture
+def server():
+    server = AdversaryServer(host='127.0.0.1', port=0).start()
+    yield server
+    server.stop()
+
+
+def _get(server, path, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=5)
+    try:
+        connection.request('GET', path, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+def _canvas(value):
+    return np.full((20, 30, 4), value, dtype=np.uint8)
+
+
+def test_published_canvas_is_served(server):
+    canvas = _canvas(100)
+    assert server.publish(PATH, canvas) == 1
+
+    status, headers, body = _get(server, '/' + PATH)
+    assert status == 200
+    assert headers['Content-Type'] == 'image/png'
+    assert headers['ETag'] == server.get(PATH)[1]
+    assert headers['X-Adversary-Version'] == '1'
+    np.testing.assert_array_equal(
+        cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_UNCHANGED), canvas)
+
+
+def test_matching_etag_is_not_modified(server):
+    server.publish(PATH, _canvas(100))
+    _, headers, _ = _get(server, '/' + PATH)
+
+    status, not_modified, body = _get(server, '/./' + PATH, {'If-None-Match': headers['ETag']})
+    assert status == 304 and body == b''
+    assert not_modified['ETag'] == headers['ETag']
+    assert not_modified['X-Adversary-Version'] == '1'
+
+
+def test_publish_changes_the_etag_and_version(server):
+    server.publish(PATH, _canvas(100))
+    _, first, _ = _get(server, '/' + PATH)
+
+    # the same content keeps its version
+    assert server.publish(PATH, _canvas(100)) == 1
+    assert server.publish(PATH, _canvas(200)) == 2
+    status, second, _ = _get(server, '/' + PATH, {'If-None-Match': first['ETag']})
+    assert status == 200
+    assert second['ETag'] != first['ETag']
+    assert second['X-Adversary-Version'] == '2'
+    assert server.version(PATH) == 2
+
+
+def test_unknown_path_is_not_found(server):
+    server.publish(PATH, _canvas(100))
+    assert _get(server, '/adversary/adversary_Town02.png')[0] == 404
+    assert server.version('adversary/adversary_Town02.png') == 0
@@ -0,0 +1,96 @@
+import asyncio
+import socket
+
+import pytest
+
+from carla.async_client import AsyncCarlaClient
+from carla.client import CarlaClient
+from carla.sensor import Camera
+from carla.settings import CarlaSettings
+from carla.tcp import TCPConnectionError
+
+FRAMES = 30
+
+
+def _settings():
+    settings = CarlaSettings()
+    settings.set(SynchronousMode=True, SendNonPlayerAgentsInfo=False,
+                 NumberOfVehicles=0, NumberOfPedestrians=0)
+    camera = Camera('CameraRGB')
+    camera.set_image_size(200, 150)
+    settings.add_sensor(camera)
+    return settings
+
+
+def _control(frame):
+    return {'steer': 0.3 if (frame // 10) % 2 else -0.2, 'throttle': 0.6}
+
+
+def _record(measurements, sensor_data):
+    player = measurements.player_measurements
+    return (player.transform.location.x, player.transform.location.y,
+            player.transform.rotation.yaw, player.forward_speed,
+            bytes(sensor_data['CameraRGB'].raw_data))
+
+
+def _drive(port):
+    client = CarlaClient('127.0.0.1', port)
+    client.connect()
+    try:
+        scene = client.load_settings(_settings())
+        client.start_episode(1)
+        frames = []
+        for frame in range(FRAMES):
+            frames.append(_record(*client.read_data()))
+            client.send_control(**_control(frame))
+    finally:
+        client.disconnect()
+    return len(scene.player_start_spots), frames
+
+
+async def _drive_async(port):
+    async with AsyncCarlaClient('127.0.0.1', port) as client:
+        scene = await client.load_settings(_settings())
+        await client.start_episode(1)
+        frames = []
+        for frame in range(FRAMES):
+            frames.append(_record(*await client.read_data()))
+            await client.send_control(**_control(frame))
+    return len(scene.player_start_spots), frames
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_async_episode_equals_carla_client(fake_server):
+    expected = _drive(fake_server.port)
+    assert _run(_drive_async(fake_server.port)) == expected
+    # the vehicle moved and the camera followed it
+    frames = expected[1]
+    assert frames[0][:3] != frames[-1][:3] and frames[0][4] != frames[-1][4]
+
+
+def test_one_loop_drives_several_servers(fake_servers):
+    servers = fake_servers(2)
+    expected = [_drive(server.port) for server in servers]
+
+    async def drive_all():
+        return await asyncio.gather(*[_drive_async(server.port) for server in servers])
+
+    assert _run(drive_all()) == expected
+    assert all(server.episodes == 2 for server in servers)
+
+
+def test_connection_error():
+    with socket.socket() as unused:
+        unused.bind(('127.0.0.1', 0))
+        port = unused.getsockname()[1]
+    client = AsyncCarlaClient('127.0.0.1', port, timeout=1)
+    with pytest.raises(TCPConnectionError):
+        _run(client.connect(connection_attempts=1))
+    assert not client.connected()
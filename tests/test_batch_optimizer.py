@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip('bayes_opt')
+
+from bayes_opt import UtilityFunction
+
+from batch_optimizer import BatchBayesianOptimization
+
+PBOUNDS = {'x': (-2, 2), 'y': (-2, 2)}
+
+
+def _target(x, y):
+    return -(x - 1) ** 2 - (y + 0.5) ** 2
+
+
+def _batch(strategy, size=3):
+    """The points proposed while size evaluations are running."""
+    optimizer = BatchBayesianOptimization(_target, PBOUNDS, size, strategy=strategy,
+                                          random_state=1)
+    for x, y in [(-1.5, -1.5), (0.0, 0.0), (1.5, 1.5), (-1.0, 1.0), (1.0, -1.0)]:
+        optimizer.register({'x': x, 'y': y}, _target(x, y))
+    utility = UtilityFunction(kind='ucb', kappa=2.576, xi=0.0)
+    pending = []
+    for _ in range(size):
+        pending.append(optimizer.suggest(utility, pending))
+    return optimizer, [(round(params['x'], 3), round(params['y'], 3)) for params in pending]
+
+
+def test_pending_points_spread_the_batch():
+    batches = []
+    for strategy in ['constant_liar', 'kriging_believer']:
+        optimizer, batch = _batch(strategy)
+        assert len(set(batch)) == len(batch), strategy
+        # the made up targets are never registered
+        assert len(optimizer.res) == 5
+        batches.append(batch)
+    assert batches[0] != batches[1]
+
+
+@pytest.mark.parametrize('strategy', ['constant_liar', 'kriging_believer'])
+def test_only_real_targets_are_registered(strategy):
+    optimizer = BatchBayesianOptimization(_target, PBOUNDS, 3, strategy=strategy,
+                                          random_state=0)
+    best = optimizer.maximize(init_points=3, n_iter=4)
+    assert 3 < len(optimizer.res) <= 7
+    for result in optimizer.res:
+        assert result['target'] == pytest.approx(_target(**result['params']))
+    assert best['target'] == max(result['target'] for result in optimizer.res)
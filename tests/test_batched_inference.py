@@ -0,0 +1,121 @@
+import threading
+
+import numpy as np
+import pytest
+
+from carla.client import VehicleControl
+from imitation.batched_inference import InferenceServer
+from imitation.preprocessing import preprocess_image
+
+COMMANDS = [2.0, 3.0, 4.0, 5.0]
+
+
+class SyntheticModel(object):
+    """Five dense heads of 3 outputs over a hidden layer of the image."""
+
+    def __init__(self, hidden=256, seed=0):
+        rng = np.random.RandomState(seed)
+        self._hidden = rng.randn(88 * 200 * 3, hidden).astype(np.float32) * 1e-3
+        self._heads = rng.randn(5, hidden, 3).astype(np.float32) * 1e-2
+
+    def preprocess(self, image):
+        return preprocess_image(image)
+
+    def predict_batch(self, image_inputs, speeds, directions):
+        features = np.tanh(np.stack(image_inputs).reshape(len(image_inputs), -1).dot(self._hidden))
+        controls = []
+        for row, direction in enumerate(directions):
+            steer, acc, brake = features[row].dot(self._heads[int(direction) % 5])
+            control = VehicleControl()
+            control.steer, control.throttle, control.brake = steer, acc, brake
+            controls.append(control)
+        return controls
+
+
+class FailingModel(SyntheticModel):
+
+    def predict_batch(self, image_inputs, speeds, directions):
+        raise ValueError('the model failed')
+
+
+class BlockingModel(SyntheticModel):
+    """Holds the first batch until release is set."""
+
+    def __init__(self, **kwargs):
+        super(BlockingModel, self).__init__(**kwargs)
+        self.running = threading.Event()
+        self.release = threading.Event()
+
+    def predict_batch(self, image_inputs, speeds, directions):
+        self.running.set()
+        self.release.wait(5)
+        return super(BlockingModel, self).predict_batch(image_inputs, speeds, directions)
+
+
+def _images(count):
+    rng = np.random.RandomState(1)
+    return [rng.randint(0, 256, (600, 800, 3)).astype(np.uint8) for _ in range(count)]
+
+
+def _submit_together(server, frames):
+    """Submits the frames from a thread each, released at the same time."""
+    futures = [None] * len(frames)
+    barrier = threading.Barrier(len(frames))
+
+    def submit(index):
+        barrier.wait()
+        futures[index] = server.submit(*frames[index])
+
+    threads = [threading.Thread(target=submit, args=(index,)) for index in range(len(frames))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return futures
+
+
+def test_frames_are_batched_and_get_their_own_control():
+    model = SyntheticModel(hidden=16)
+    frames = [(image, float(index), COMMANDS[index % len(COMMANDS)])
+              for index, image in enumerate(_images(8))]
+    with InferenceServer(model, max_batch_size=4, max_latency=0.5) as server:
+        futures = _submit_together(server, frames)
+        controls = [future.result(5) for future in futures]
+        assert server.stats()['frames'] == 8
+        assert server.stats()['mean_batch_size'] > 1
+
+    for (image, speed, direction), control in zip(frames, controls):
+        expected = model.predict_batch([model.preprocess(image)], [speed], [direction])[0]
+        assert control.steer == pytest.approx(expected.steer, rel=1e-4, abs=1e-6)
+        assert control.throttle == pytest.approx(expected.throttle, rel=1e-4, abs=1e-6)
+        assert control.brake == pytest.approx(expected.brake, rel=1e-4, abs=1e-6)
+
+
+def test_model_error_reaches_every_frame_of_the_batch():
+    frames = [(image, 5.0, 2.0) for image in _images(3)]
+    with InferenceServer(FailingModel(hidden=16), max_batch_size=3, max_latency=0.5) as server:
+        futures = _submit_together(server, frames)
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result(5)
+        assert server.stats()['batches'] == 0
+
+
+def test_stop_releases_the_waiting_frames():
+    model = BlockingModel(hidden=16)
+    server = InferenceServer(model, max_batch_size=1, max_latency=0).start()
+    images = _images(2)
+    running = server.submit(images[0], 5.0, 2.0)
+    assert model.running.wait(5)
+    waiting = server.submit(images[1], 5.0, 2.0)
+
+    stopper = threading.Thread(target=server.stop)
+    stopper.start()
+    model.release.set()
+    stopper.join(5)
+    assert not stopper.is_alive()
+    assert running.done() and waiting.done()
+    assert isinstance(running.result(), VehicleControl)
+
+    with pytest.raises(RuntimeError):
+        server.submit(images[0], 5.0, 2.0).result(5)
@@ -0,0 +1,63 @@
+import pytest
+
+from conftest import ADVERSARY, WobbleAgent
+from evaluation_pool import EvaluationPool
+
+
+def _adversaries(count):
+    return [{line_id: dict(line, pos=line['pos'] + 10 * index)
+             for line_id, line in ADVERSARY.items()}
+            for index in range(count)]
+
+
+@pytest.fixture
+def make_pool(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pools = []
+
+    def make_pool(servers, **kwargs):
+        pools.append(EvaluationPool(len(servers), base_port=servers[0].port,
+                                    adversary_ports=[0] * len(servers), agent=WobbleAgent(),
+                                    save_measurements=False, **kwargs))
+        return pools[-1]
+
+    yield make_pool
+    for pool in pools:
+        pool.close()
+
+
+def test_evaluations_are_spread_over_the_servers(fake_servers, make_pool):
+    servers = fake_servers(2)
+    pool = make_pool(servers)
+    baseline_episodes = [server.episodes for server in servers]
+
+    results = pool.evaluate(_adversaries(4))
+    assert len(results) == 4 and all(len(metrics['steer']) > 0 for metrics in results)
+
+    stats = pool.stats()
+    assert [server['port'] for server in stats] == [server.port for server in servers]
+    assert sum(server['evaluations'] for server in stats) == 4
+    for server, episodes, server_stats in zip(servers, baseline_episodes, stats):
+        assert server_stats['evaluations'] >= 1
+        assert server_stats['failures'] == 0
+        assert server.episodes > episodes
+        assert server_stats['busy'] > 0
+        assert 0 < server_stats['utilization'] <= 1
+
+
+def test_failed_server_is_skipped(fake_servers, make_pool):
+    servers = fake_servers(2)
+    pool = make_pool(servers, max_retries=1, connection_retries=0)
+    servers[1].stop()
+
+    results = pool.evaluate(_adversaries(3))
+    assert len(results) == 3
+
+    stats = pool.stats()
+    assert stats[0]['evaluations'] == 3 and stats[0]['failures'] == 0
+    assert stats[1]['evaluations'] == 0 and stats[1]['failures'] >= 1
+
+
+def test_several_servers_need_their_adversary_ports():
+    with pytest.raises(ValueError):
+        EvaluationPool(2, agent=WobbleAgent())
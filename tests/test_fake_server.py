@@ -0,0 +1,53 @@
+from carla import carla_server_pb2 as carla_protocol
+from carla.client import make_carla_client
+from carla.settings import CarlaSettings
+from carla.tcp import TCPClient
+
+
+def _request(client, message, reply_type):
+    client.write(message.SerializeToString())
+    reply = reply_type()
+    reply.ParseFromString(bytes(client.read()))
+    return reply
+
+
+def test_episode_start_before_settings_is_refused(fake_server):
+    client = TCPClient('127.0.0.1', fake_server.port, 5)
+    client.connect()
+    try:
+        start = carla_protocol.EpisodeStart()
+        start.player_start_spot_index = 5
+        assert not _request(client, start, carla_protocol.EpisodeReady).ready
+
+        # the server is still answering
+        scene = _request(client, carla_protocol.RequestNewEpisode(),
+                         carla_protocol.SceneDescription)
+        assert len(scene.player_start_spots) > 0
+    finally:
+        client.disconnect()
+
+
+def test_empty_messages_follow_the_protocol(fake_server):
+    # an empty ini and start index 0 both serialize to nothing
+    client = TCPClient('127.0.0.1', fake_server.port, 5)
+    client.connect()
+    try:
+        assert carla_protocol.RequestNewEpisode().SerializeToString() == b''
+        _request(client, carla_protocol.RequestNewEpisode(), carla_protocol.SceneDescription)
+        assert _request(client, carla_protocol.EpisodeStart(), carla_protocol.EpisodeReady).ready
+    finally:
+        client.disconnect()
+
+
+def test_runs_episodes(fake_server):
+    with make_carla_client('127.0.0.1', fake_server.port) as client:
+        settings = CarlaSettings()
+        settings.set(SynchronousMode=True)
+        client.load_settings(settings)
+        for index in (0, 3):
+            client.start_episode(index)
+            for _ in range(5):
+                measurements, _ = client.read_data()
+                client.send_control(steer=0.0, throttle=0.5)
+    assert fake_server.episodes == 2
+    assert measurements.frame_number > 0
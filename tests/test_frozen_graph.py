@@ -0,0 +1,45 @@
+import glob
+import hashlib
+import os
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'imitation', 'model')
+
+pytestmark = pytest.mark.skipif(not glob.glob(os.path.join(MODEL, '*.data-*')),
+                                reason='the weights of the model checkpoint are not downloaded')
+
+
+@pytest.fixture(scope='module')
+def agents(tmp_path_factory):
+    from imitation.frozen_graph import FrozenImitationLearning, export_frozen_graph
+    from imitation.imitation_learning import ImitationLearning
+
+    graph_path = str(tmp_path_factory.mktemp('frozen_graph') / 'frozen_inference_graph.pb')
+    agent = ImitationLearning('Town01', avoid_stopping=True)
+    export_frozen_graph(agent, graph_path)
+    frozen = FrozenImitationLearning('Town01', avoid_stopping=True, graph_path=graph_path)
+    return agent, frozen, graph_path
+
+
+def test_frozen_outputs_match_the_checkpoint(agents):
+    agent, frozen, _ = agents
+    rng = np.random.RandomState(0)
+    images = rng.rand(16, 88, 200, 3).astype(np.float32)
+    speeds = rng.uniform(0, 10, (16, 1)) / 25.0
+    outputs = agent._sess.run(agent._network_tensor, feed_dict=agent._feed_dict(images, speeds))
+    frozen_outputs = frozen._sess.run(frozen._network_tensor,
+                                      feed_dict=frozen._feed_dict(images, speeds))
+    for output, frozen_output in zip(outputs, frozen_outputs):
+        np.testing.assert_allclose(frozen_output, output, rtol=1e-3, atol=1e-4)
+
+
+def test_frozen_model_is_keyed_by_its_graph(agents):
+    agent, frozen, graph_path = agents
+    with open(graph_path, 'rb') as graph_file:
+        digest = hashlib.sha1(graph_file.read()).hexdigest()
+    assert frozen.checkpoint_path == 'frozen_graph:' + digest
+    assert frozen.checkpoint_path != agent.checkpoint_path
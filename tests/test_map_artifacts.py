@@ -0,0 +1,37 @@
+import os
+import stat
+
+import numpy as np
+
+from carla.planner import map_artifacts
+
+
+def _arrays():
+    return {'graph': np.arange(12, dtype=np.float64).reshape(3, 4),
+            'map': np.zeros((4, 5, 4), dtype=np.uint8)}
+
+
+def test_artifacts_are_readable_by_other_users(tmp_path, monkeypatch):
+    path = str(tmp_path / 'Town01.artifacts')
+    monkeypatch.setattr(map_artifacts, 'artifacts_path', lambda city: path)
+    map_artifacts.save_artifacts('Town01', _arrays())
+
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o755 & ~umask
+    artifacts = map_artifacts.load_artifacts('Town01')
+    for name, array in _arrays().items():
+        np.testing.assert_array_equal(artifacts[name], array)
+
+
+def test_read_only_install_is_not_an_error(tmp_path, monkeypatch):
+    path = str(tmp_path / 'Town01.artifacts')
+    monkeypatch.setattr(map_artifacts, 'artifacts_path', lambda city: path)
+
+    def mkdtemp(*args, **kwargs):
+        raise OSError(13, 'Permission denied')
+
+    monkeypatch.setattr(map_artifacts.tempfile, 'mkdtemp', mkdtemp)
+    map_artifacts.save_artifacts('Town01', _arrays())
+    assert not os.path.exists(path)
+    assert map_artifacts.load_artifacts('Town01') is None
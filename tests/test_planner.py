@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from carla.planner.astar import AStar, ArrayAStar
+from carla.planner.map import get_city_map
+
+ORIENTATIONS = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+
+
+def _solve(astar_class, width, height, walls, source, target):
+    astar = astar_class()
+    astar.init_grid(width, height, walls, source, target)
+    return astar.solve()
+
+
+@pytest.mark.parametrize('city', ['Town01', 'Town02', 'Town01_nemesisA'])
+def test_array_astar_finds_the_routes_of_astar(city):
+    city_map = get_city_map(city, 0.1643, 50.0)
+    width, height = city_map.get_graph_resolution()
+    base_walls = city_map.get_walls()
+    free = [(x, y) for x in range(width) for y in range(height) if (x, y) not in base_walls]
+
+    rng = random.Random(0)
+    for _ in range(200):
+        source, target = rng.sample(free, 2)
+        # the walls as used by CityTrack.compute_route
+        walls = city_map.get_walls_directed(source, rng.choice(ORIENTATIONS),
+                                            target, rng.choice(ORIENTATIONS))
+        route = _solve(AStar, width, height, walls, source, target)
+        assert _solve(ArrayAStar, width, height, walls, source, target) == route
+
+
+def test_array_astar_without_a_route():
+    # the target is walled in
+    walls = {(3, 2), (3, 4), (2, 3), (4, 3)}
+    assert _solve(AStar, 6, 6, walls, (0, 0), (3, 3)) is None
+    assert _solve(ArrayAStar, 6, 6, walls, (0, 0), (3, 3)) is None
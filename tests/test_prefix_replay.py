@@ -0,0 +1,24 @@
+import numpy as np
+
+from conftest import ADVERSARY
+
+
+def test_prefix_replay_equals_the_full_run(make_env):
+    env = make_env(prefix_frames=100, save_measurements=False)
+    check = env.check_prefix_replay(ADVERSARY)
+    assert check['steer'] == 0 and check['pos_x'] == 0 and check['pos_y'] == 0
+    assert check['frames'][0] == check['frames'][1]
+    assert check['divergence'] >= 100
+
+
+def test_prefix_is_not_run_by_the_agent(make_env):
+    env = make_env(save_measurements=False)
+    full = env.step(ADVERSARY)
+
+    replayed_env = make_env(prefix_frames=100, save_measurements=False)
+    agent = replayed_env.agent
+    agent.steps = 0
+    replayed = replayed_env.step(ADVERSARY)
+    assert agent.steps == len(replayed['steer']) - 100
+    np.testing.assert_array_equal(replayed['steer'], full['steer'])
+    np.testing.assert_array_equal(replayed['positions'], full['positions'])
@@ -0,0 +1,76 @@
+import glob
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from carla import sensor
+from imitation.preprocessing import preprocess_image
+
+MEDIA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'media')
+IMAGE_CUT = (115, 510)
+SIZE = (88, 200)
+
+try:
+    # removed from scipy 1.3
+    from scipy.misc import imresize
+except ImportError:
+    imresize = None
+
+
+def _reference(image):
+    """The preprocessing the model was run with, through scipy.misc.imresize."""
+    rgb_image = image.data[IMAGE_CUT[0]:IMAGE_CUT[1], :]
+    return np.multiply(imresize(rgb_image, SIZE).astype(np.float32), 1.0 / 255.0)
+
+
+def _frame(array):
+    return sensor.Image(0, 800, 600, 'SceneFinal', 90, array.tobytes())
+
+
+def _media_frames():
+    # the images of media/ at the 800x600 of the camera
+    return [_frame(cv2.cvtColor(cv2.resize(cv2.imread(path), (800, 600),
+                                           interpolation=cv2.INTER_AREA),
+                                cv2.COLOR_BGR2BGRA))
+            for path in sorted(glob.glob(os.path.join(MEDIA, '*')))]
+
+
+def _random_frames():
+    rng = np.random.RandomState(0)
+    return [_frame(rng.randint(0, 256, (600, 800, 4)).astype(np.uint8)) for _ in range(2)]
+
+
+@pytest.mark.skipif(imresize is None, reason='scipy.misc.imresize, the reference, needs '
+                                             'scipy < 1.3 (requirements.txt pins 1.2.1)')
+@pytest.mark.parametrize('frames', [_media_frames, _random_frames])
+def test_pil_is_the_reference(frames):
+    for frame in frames():
+        np.testing.assert_array_equal(preprocess_image(frame, IMAGE_CUT, SIZE), _reference(frame))
+
+
+@pytest.mark.parametrize('frames', [_media_frames, _random_frames])
+def test_frame_buffer_and_rgb_array_give_the_same_input(frames):
+    out = np.empty(SIZE + (3,), dtype=np.float32)
+    for frame in frames():
+        for method in ('pil', 'cv2'):
+            image_input = preprocess_image(frame, IMAGE_CUT, SIZE, method=method)
+            assert image_input.shape == SIZE + (3,) and image_input.dtype == np.float32
+            np.testing.assert_array_equal(
+                preprocess_image(frame.data, IMAGE_CUT, SIZE, method=method), image_input)
+            assert preprocess_image(frame, IMAGE_CUT, SIZE, out=out, method=method) is out
+            np.testing.assert_array_equal(out, image_input)
+
+
+def test_cv2_is_close_to_pil():
+    for frame in _media_frames():
+        # the input of scipy.misc.imresize, see test_pil_is_the_reference
+        reference = preprocess_image(frame, IMAGE_CUT, SIZE)
+        image_input = preprocess_image(frame, IMAGE_CUT, SIZE, method='cv2')
+        assert np.abs(image_input - reference).mean() * 255.0 < 2.5
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        preprocess_image(_random_frames()[0], method='bicubic')
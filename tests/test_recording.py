@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+
+from carla.driving_benchmark import DrivingBenchmarkSession
+from carla.driving_benchmark.driving_benchmark import DrivingBenchmark
+from carla.driving_benchmark.episode_result import MEASUREMENT_COLUMNS, EpisodeResult
+from carla.driving_benchmark.experiment_suites import AdversarySuite
+from conftest import WobbleAgent
+
+
+def _benchmark(session, measurements_format):
+    suite = AdversarySuite('Town01_nemesisA', 'turn-right', 1, 1, 1)
+    for experiment in suite.get_experiments():
+        experiment.Repetitions = 2
+    benchmark = DrivingBenchmark('Town01_nemesisA', measurements_format,
+                                 measurements_format=measurements_format)
+    metrics = benchmark.benchmark_agent(suite, WobbleAgent(), session)
+    return benchmark, metrics
+
+
+def test_csv_and_npz_logs_give_the_same_metrics(fake_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with DrivingBenchmarkSession('Town01_nemesisA', port=fake_server.port) as session:
+        csv_benchmark, csv_metrics = _benchmark(session, 'csv')
+        npz_benchmark, npz_metrics = _benchmark(session, 'npz')
+
+    episodes = csv_benchmark.get_episode_result()
+    csv_columns = EpisodeResult.from_csv(
+        os.path.join(csv_benchmark.get_path(), 'measurements.csv')).columns
+    npz_columns = EpisodeResult.from_npz(
+        os.path.join(npz_benchmark.get_path(), 'measurements.npz')).columns
+    assert len(episodes['steer']) > 0
+    for name in MEASUREMENT_COLUMNS:
+        np.testing.assert_array_equal(csv_columns[name], episodes[name])
+        np.testing.assert_array_equal(npz_columns[name], episodes[name])
+
+    assert csv_metrics == npz_metrics
@@ -0,0 +1,40 @@
+from conftest import ADVERSARY
+from result_cache import ResultCache
+
+SETTINGS = {'checkpoint': 'model.ckpt-450000', 'prefix_frames': 0, 'action_repeat': 1,
+            'repeat_threshold': None, 'preprocessing': 'pil'}
+
+
+def _key(**settings):
+    agent_settings = dict(SETTINGS, **settings)
+    return ResultCache.make_key('Town01_nemesisA', 'turn-right', 1, 1, agent_settings, ADVERSARY)
+
+
+def test_every_agent_setting_is_in_the_key():
+    keys = {_key()[0]}
+    for name, value in [('checkpoint', 'model.ckpt-500000'), ('prefix_frames', 50),
+                        ('action_repeat', 3), ('repeat_threshold', 2.0),
+                        ('preprocessing', 'cv2')]:
+        key = _key(**{name: value})[0]
+        assert key not in keys, name
+        keys.add(key)
+
+
+def test_key_ignores_the_order_of_the_settings():
+    reordered = dict(reversed(list(SETTINGS.items())))
+    assert ResultCache.make_key('Town01_nemesisA', 'turn-right', 1, 1, reordered,
+                                ADVERSARY) == _key()
+
+
+def test_step_is_cached_by_the_agent_settings(fake_server, make_env):
+    env = make_env(cache_results=True, save_measurements=False)
+    metrics = env.step(ADVERSARY)
+    episodes = fake_server.episodes
+    assert env.step(ADVERSARY)['steer_sum'] == metrics['steer_sum']
+    assert fake_server.episodes == episodes
+    assert env.result_cache.hits == 1
+    assert env.measurements is None
+
+    env.prefix_frames = 20
+    env.step(ADVERSARY)
+    assert fake_server.episodes > episodes